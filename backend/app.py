@@ -1,3 +1,4 @@
+import os
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import config
@@ -9,7 +10,7 @@ def create_app(config_name='default'):
     app.config.from_object(config[config_name])
     
     # Включаем CORS для фронтенда
-    CORS(app)
+    CORS(app, expose_headers=['ETag', 'X-Menu-Version'])
     
     # Инициализация расширений
     init_db(app)
@@ -31,7 +32,8 @@ def create_app(config_name='default'):
                 'employees': '/api/employees/*',
                 'suppliers': '/api/suppliers/*',
                 'halls': '/api/halls/*',
-                'reports': '/api/reports/*'
+                'reports': '/api/reports/*',
+                'pdf_jobs': '/api/pdf-jobs/*'
             }
         })
     
@@ -50,6 +52,7 @@ def create_app(config_name='default'):
     from routes.reports import reports_bp
     from routes.receipts import receipts_bp
     from routes.chef import chef_bp
+    from routes.pdf_jobs import pdf_jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(bookings_bp, url_prefix='/api/bookings')
@@ -61,6 +64,37 @@ def create_app(config_name='default'):
     app.register_blueprint(reports_bp, url_prefix='/api/reports')
     app.register_blueprint(receipts_bp, url_prefix='/api/receipts')
     app.register_blueprint(chef_bp, url_prefix='/api/chef')
+    app.register_blueprint(pdf_jobs_bp, url_prefix='/api/pdf-jobs')
+    
+    # Команды обслуживания: flask rebuild-sales-rollup
+    from sales_rollup import rebuild_sales_rollup_command
+    app.cli.add_command(rebuild_sales_rollup_command)
+    
+    # Пул рендеринга PDF; файлы фоновых задач - в PDF_FOLDER/jobs
+    from pdf_jobs import pdf_job_queue
+    pdf_job_queue.configure(
+        os.path.join(app.root_path, app.config['PDF_FOLDER'], 'jobs'),
+        workers=app.config['PDF_WORKERS'],
+        max_pending=app.config['PDF_MAX_PENDING'],
+        ttl=app.config['PDF_JOB_TTL_SECONDS'],
+        font_paths=app.config['PDF_FONT_PATHS']
+    )
+    from receipt_cache import receipt_cache
+    receipt_cache.configure(
+        os.path.join(app.root_path, app.config['PDF_FOLDER'], 'receipts'),
+        max_bytes=app.config['RECEIPT_CACHE_MAX_BYTES'],
+        max_age=app.config['RECEIPT_CACHE_MAX_AGE_SECONDS']
+    )
+    
+    # Очередь кухни и справочники загружаются из БД при первом обращении, а не при старте:
+    # create_app вызывается и на пустой БД (create_all_tables.py, flask db upgrade)
+    from kitchen import kitchen_queue
+    from reference_cache import reference_cache
+    from menu_snapshot import menu_snapshot
+    reference_cache.ttl = app.config['REFERENCE_CACHE_TTL_SECONDS']
+    menu_snapshot.ttl = app.config['MENU_SNAPSHOT_TTL_SECONDS']
+    kitchen_queue.reset()
+    reference_cache.invalidate()
     
     return app
 
@@ -0,0 +1,270 @@
+from bisect import bisect_right, insort
+import base64
+from datetime import timedelta
+
+from flask import current_app
+
+from database import db
+import reference_cache
+from models import Booking, Table
+from routes.utils import day_window, parse_datetime
+
+# Брони в этом статусе стол не занимают
+CANCELLED_STATUS = 'Отменен'
+
+
+def cancelled_status_ids():
+    return [status_id for status_id, name in reference_cache.booking_statuses().items()
+            if name == CANCELLED_STATUS]
+
+
+def seating_duration():
+    """Сколько стол занят одной бронью"""
+    return timedelta(minutes=current_app.config['BOOKING_DURATION_MINUTES'])
+
+
+class AvailabilityIndex:
+    """Отсортированные времена начала броней по столам.
+
+    Каждая бронь занимает стол на [start, start + duration). Бронь пересекается
+    с интервалом [from, to), если её начало лежит в (from - duration, to),
+    поэтому проверка стола - один bisect по отсортированному списку.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self._starts = {}  # table_id -> [start, ...] по возрастанию
+
+    def add(self, table_id, start):
+        insort(self._starts.setdefault(table_id, []), start)
+
+    def starts(self, table_id):
+        return self._starts.get(table_id, [])
+
+    def first_conflict(self, table_id, start, end):
+        """Начало первой брони, пересекающей [start, end), или None. O(log n)"""
+        starts = self._starts.get(table_id)
+        if not starts:
+            return None
+        i = bisect_right(starts, start - self.duration)
+        if i < len(starts) and starts[i] < end:
+            return starts[i]
+        return None
+
+    def is_free(self, table_id, start, end=None):
+        return self.first_conflict(table_id, start, end or start + self.duration) is None
+
+    def next_free(self, table_id, start, until=None):
+        """Ближайшее время >= start, с которого стол свободен на duration (не позже until)"""
+        starts = self._starts.get(table_id, [])
+        candidate = start
+        while True:
+            i = bisect_right(starts, candidate - self.duration)
+            if i == len(starts) or starts[i] >= candidate + self.duration:
+                return candidate
+            # Сдвигаемся на конец пересекающей брони и проверяем снова
+            candidate = starts[i] + self.duration
+            if until is not None and candidate > until:
+                return None
+
+
+def load_index(start, end, duration, table_ids=None):
+    """Индекс по броням, которые могут пересечь [start, end), одним запросом"""
+    query = db.session.query(Booking.table_id, Booking.datetime)\
+        .filter(
+            Booking.datetime > start - duration,
+            Booking.datetime < end,
+            Booking.status_id.notin_(cancelled_status_ids())
+        )
+
+    if table_ids is not None:
+        query = query.filter(Booking.table_id.in_(table_ids))
+
+    index = AvailabilityIndex(duration)
+    for table_id, booking_start in query.order_by(Booking.datetime):
+        index.add(table_id, booking_start)
+    return index
+
+
+def query_window(value):
+    """Разобрать параметр date: дата без времени - весь день, дата со временем - одна посадка.
+
+    Возвращает (start, end, search_until); end=None означает start + длительность посадки.
+    Бросает ValueError при неверном формате.
+    """
+    moment = parse_datetime(value)
+    day_start, day_end = day_window(moment.date())
+    if len(value) == 10:
+        return day_start, day_end, day_end
+    return moment, None, day_end
+
+
+def find_tables(start, end=None, people_count=None, hall_id=None, include_busy=False, search_until=None):
+    """Столы, свободные на [start, end) (по умолчанию на одну посадку).
+
+    С include_busy=True занятые столы тоже возвращаются с available=False и
+    next_free_at - ближайшим временем посадки не позже search_until.
+    """
+    duration = seating_duration()
+    end = end or start + duration
+    search_until = search_until or end
+
+    query = db.session.query(Table.id, Table.hall_id, Table.capacity)
+
+    if hall_id:
+        query = query.filter(Table.hall_id == hall_id)
+
+    if people_count:
+        query = query.filter(Table.capacity >= people_count)
+
+    tables = query.order_by(Table.id).all()
+    index = load_index(start, max(end, search_until + duration), duration,
+                       [table.id for table in tables])
+
+    hall_names = reference_cache.halls()
+    result = []
+    for table_id, table_hall_id, capacity in tables:
+        available = index.first_conflict(table_id, start, end) is None
+        if not available and not include_busy:
+            continue
+
+        item = {
+            'id': table_id,
+            'hall_id': table_hall_id,
+            'hall_name': hall_names.get(table_hall_id),
+            'capacity': capacity
+        }
+        if include_busy:
+            next_free = start if available else index.next_free(table_id, start, search_until)
+            item['available'] = available
+            item['next_free_at'] = next_free.isoformat() if next_free else None
+        result.append(item)
+
+    return result
+
+
+def best_fit_table(start, people_count, hall_id=None, horizon=timedelta(hours=4)):
+    """Выбрать стол для брони: наименьший подходящий по вместимости, среди равных -
+    тот, где бронь плотнее примыкает к соседним (меньше "дыр" в расписании стола).
+
+    Возвращает (id, hall_id, capacity) или None, если свободных столов нет.
+    """
+    duration = seating_duration()
+
+    query = db.session.query(Table.id, Table.hall_id, Table.capacity)\
+        .filter(Table.capacity >= people_count)
+    if hall_id:
+        query = query.filter(Table.hall_id == hall_id)
+    tables = query.order_by(Table.capacity, Table.id).all()
+
+    index = load_index(start - horizon, start + duration + horizon, duration,
+                       [table.id for table in tables])
+
+    best, best_score = None, None
+    for table in tables:
+        if not index.is_free(table.id, start):
+            continue
+
+        # Зазор до конца предыдущей и до начала следующей брони этого стола
+        starts = index.starts(table.id)
+        i = bisect_right(starts, start)
+        gap_before = start - (starts[i - 1] + duration) if i > 0 else horizon
+        gap_after = starts[i] - (start + duration) if i < len(starts) else horizon
+
+        score = (table.capacity - people_count, min(gap_before, gap_after, horizon))
+        if best_score is None or score < best_score:
+            best, best_score = table, score
+
+    return best
+
+def lock_table(table_id):
+    """Заблокировать строку стола до конца транзакции (SELECT ... FOR UPDATE).
+
+    Все создания и изменения броней стола проходят через эту блокировку, поэтому
+    проверка пересечений и вставка выполняются без гонок между администраторами.
+    """
+    return Table.query.filter_by(id=table_id).with_for_update().first()
+
+
+def find_conflict(table_id, start, exclude_booking_id=None):
+    """Действующая бронь стола, пересекающая посадку в start, или None.
+
+    Чтение блокирующее (FOR UPDATE): в InnoDB оно видит последние
+    подтвержденные брони, а не снимок, снятый до ожидания lock_table.
+    """
+    duration = seating_duration()
+    query = Booking.query\
+        .filter(
+            Booking.table_id == table_id,
+            Booking.datetime > start - duration,
+            Booking.datetime < start + duration,
+            Booking.status_id.notin_(cancelled_status_ids())
+        )
+
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+
+    return query.with_for_update().first()
+
+def parse_slot(value):
+    """Шаг сетки: '30m', '1h' или число минут. Бросает ValueError"""
+    value = value.strip().lower()
+    if value.endswith('h'):
+        minutes = int(value[:-1]) * 60
+    elif value.endswith('m'):
+        minutes = int(value[:-1])
+    else:
+        minutes = int(value)
+    if minutes < 5:
+        raise ValueError('Шаг сетки не меньше 5 минут')
+    return timedelta(minutes=minutes)
+
+
+def availability_grid(start, end, slot, people_count=None, hall_id=None):
+    """Сетка стол x слот за период [start, end) одним проходом по броням.
+
+    Для каждого стола - битовая маска: бит i установлен, если посадка в
+    start + i * slot возможна (стол свободен на всю длительность посадки).
+    Маска отдается в base64 от little-endian байтов: слот i - это
+    бит (i % 8) байта i // 8.
+    """
+    duration = seating_duration()
+    slot_count = -(-(end - start) // slot)
+    full_mask = (1 << slot_count) - 1
+
+    query = db.session.query(Table.id, Table.hall_id, Table.capacity)
+    if hall_id:
+        query = query.filter(Table.hall_id == hall_id)
+    if people_count:
+        query = query.filter(Table.capacity >= people_count)
+    tables = query.order_by(Table.id).all()
+
+    # Слот t заблокирован бронью s, если s - duration < t < s + duration
+    index = load_index(start, end + duration, duration, [table.id for table in tables])
+
+    result = []
+    for table_id, table_hall_id, capacity in tables:
+        busy = 0
+        for booking_start in index.starts(table_id):
+            first = max(0, (booking_start - duration - start) // slot + 1)
+            last = min(slot_count - 1, -(-(booking_start + duration - start) // slot) - 1)
+            if first <= last:
+                busy |= ((1 << (last - first + 1)) - 1) << first
+
+        free = full_mask & ~busy
+        result.append({
+            'id': table_id,
+            'hall_id': table_hall_id,
+            'capacity': capacity,
+            'free': base64.b64encode(free.to_bytes((slot_count + 7) // 8, 'little')).decode(),
+            'free_count': bin(free).count('1')
+        })
+
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'slot_minutes': int(slot.total_seconds() // 60),
+        'slot_count': slot_count,
+        'seating_minutes': int(duration.total_seconds() // 60),
+        'tables': result
+    }
@@ -0,0 +1,105 @@
+# bench_booking_assignment.py
+# Прогон синтетического вечера бронирований: автоподбор стола (best fit)
+# против "первого свободного" стола, как его выбирает администратор вручную.
+#
+#   python bench_booking_assignment.py [количество_запросов] [seed]
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app import create_app
+from availability import best_fit_table, find_tables
+from database import db
+import reference_cache
+from models import Booking, BookingStatus, Hall, Table
+
+TABLE_CAPACITIES = [2] * 8 + [4] * 8 + [6] * 4 + [8] * 2
+PARTY_SIZES = [1, 2, 2, 2, 3, 4, 4, 5, 6, 7, 8]
+
+
+def make_requests(count, seed):
+    rng = random.Random(seed)
+    evening = datetime(2025, 6, 6, 17, 0)
+    return [
+        (evening + timedelta(minutes=15 * rng.randrange(0, 20)), rng.choice(PARTY_SIZES))
+        for _ in range(count)
+    ]
+
+
+def first_free(start, people_count):
+    tables = find_tables(start, people_count=people_count)
+    return tables[0]['id'] if tables else None
+
+
+def best_fit(start, people_count):
+    table = best_fit_table(start, people_count)
+    return table.id if table else None
+
+
+def replay(strategy, requests):
+    Booking.query.delete()
+    db.session.commit()
+    capacities = {table.id: table.capacity for table in Table.query}
+
+    latencies, seated_guests, used_seats, rejected = [], 0, 0, []
+    for start, people_count in requests:
+        started = time.perf_counter()
+        table_id = strategy(start, people_count)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        if table_id is None:
+            rejected.append(people_count)
+            continue
+
+        db.session.add(Booking(table_id=table_id, status_id=1, datetime=start, guest_name='Гость',
+                               guest_phone='+70000000000', people_count=people_count))
+        db.session.commit()
+        seated_guests += people_count
+        used_seats += capacities[table_id]
+
+    latencies.sort()
+    return {
+        'accepted': len(requests) - len(rejected),
+        'rejected': len(rejected),
+        'rejected_guests': sum(rejected),
+        'seated_guests': seated_guests,
+        'seat_utilization': seated_guests / used_seats if used_seats else 0.0,
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1]
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+
+    app = create_app('testing')
+    with app.app_context():
+        db.session.add(BookingStatus(name='Новый'))
+        hall = Hall(name='Основной', table_count=len(TABLE_CAPACITIES))
+        db.session.add(hall)
+        db.session.flush()
+        # Столы в зале вперемешку по вместимости, как в реальной рассадке
+        capacities = list(TABLE_CAPACITIES)
+        random.Random(seed).shuffle(capacities)
+        db.session.add_all([Table(hall_id=hall.id, capacity=capacity) for capacity in capacities])
+        db.session.commit()
+        reference_cache.invalidate()
+
+        requests = make_requests(count, seed)
+        print(f"=== Вечер: {count} запросов, {len(TABLE_CAPACITIES)} столов, "
+              f"{sum(TABLE_CAPACITIES)} мест ===")
+        for name, strategy in [('Первый свободный', first_free), ('Автоподбор', best_fit)]:
+            stats = replay(strategy, requests)
+            print(f"\n{name}:")
+            print(f"  принято броней:     {stats['accepted']} (отказов: {stats['rejected']}, "
+                  f"гостей без стола: {stats['rejected_guests']})")
+            print(f"  рассажено гостей:   {stats['seated_guests']}")
+            print(f"  загрузка мест:      {stats['seat_utilization']:.1%}")
+            print(f"  время решения p50:  {stats['p50_ms']:.2f} мс, p99: {stats['p99_ms']:.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# bench_menu_search.py
+# Время поиска блюд (/api/menu/dishes/search) на синтетическом каталоге:
+# запросы по мере набора (префиксы), целые слова и слова с опечатками.
+#
+#   python bench_menu_search.py [количество_блюд] [seed]
+import random
+import statistics
+import sys
+import time
+
+from dish_search import DishSearchIndex
+
+BASES = ['борщ', 'солянка', 'уха', 'щи', 'рассольник', 'салат', 'стейк', 'котлета', 'плов',
+         'паста', 'ризотто', 'пицца', 'блины', 'пельмени', 'вареники', 'шашлык', 'суп',
+         'жаркое', 'гуляш', 'тартар', 'карпаччо', 'чизкейк', 'тирамису', 'морс', 'лимонад']
+ADJECTIVES = ['домашний', 'фирменный', 'острый', 'сливочный', 'летний', 'деревенский',
+              'пикантный', 'нежный', 'классический', 'авторский', 'сезонный', 'копченый']
+INGREDIENTS = ['говядина', 'свинина', 'курица', 'лосось', 'треска', 'креветки', 'грибы',
+               'картофель', 'морковь', 'свекла', 'капуста', 'лук', 'чеснок', 'сметана',
+               'сливки', 'сыр', 'томаты', 'огурцы', 'оливки', 'лимон', 'укроп', 'петрушка',
+               'базилик', 'рис', 'гречка', 'мука', 'яйцо', 'масло', 'перец', 'паприка']
+
+
+def make_dishes(count, rng):
+    return [{
+        'id': dish_id,
+        'name': f'{rng.choice(ADJECTIVES)} {rng.choice(BASES)} №{dish_id}',
+        'composition': ', '.join(rng.sample(INGREDIENTS, rng.randint(3, 7)))
+    } for dish_id in range(1, count + 1)]
+
+
+def with_typo(word, rng):
+    i = rng.randrange(1, len(word))
+    return word[:i] + rng.choice('абвгдеклмнопрст') + word[i + 1:]
+
+
+def make_queries(count, rng):
+    words = BASES + ADJECTIVES + INGREDIENTS
+    queries = []
+    for _ in range(count):
+        word = rng.choice(words)
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(word[:rng.randint(2, len(word))])
+        elif kind < 0.7:
+            queries.append(with_typo(word, rng) if len(word) >= 4 else word)
+        else:
+            queries.append(f'{rng.choice(BASES)} {rng.choice(INGREDIENTS)[:4]}')
+    return queries
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 42
+    rng = random.Random(seed)
+
+    dishes = make_dishes(count, rng)
+    started = time.perf_counter()
+    index = DishSearchIndex(dishes)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    queries = make_queries(5000, rng)
+    latencies, found = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        result = index.search(query, limit=20)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found += bool(result)
+
+    latencies.sort()
+    print(f"=== Каталог: {count} блюд, {len(index)} слов в индексе ===")
+    print(f"  построение индекса: {build_ms:.1f} мс")
+    print(f"  запросов: {len(queries)}, с результатом: {found}")
+    print(f"  p50: {statistics.median(latencies):.3f} мс, "
+          f"p99: {latencies[int(len(latencies) * 0.99) - 1]:.3f} мс, "
+          f"max: {latencies[-1]:.3f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# bench_pdf_render.py
+# Стоимость подготовки и рендера PDF: регистрация шрифтов и сборка стилей
+# (раньше - на каждый запрос, теперь - один раз на процесс) против
+# построения самих документов; для сравнения - чек для термопринтера.
+#
+#   python bench_pdf_render.py [количество_повторов] [строк_в_отчете]
+import statistics
+import sys
+import time
+
+import pdf_render
+from pdf_render import PdfTheme, load_theme, register_russian_fonts, render_receipt, render_sales_report
+from thermal_receipt import render_text, render_escpos
+
+RECEIPT = {
+    'order_id': 1024,
+    'table_number': 7,
+    'employee_name': 'Иван Петров',
+    'order_datetime': '2026-10-18T19:45:00',
+    'total_amount': 3251.7,
+    'items': [
+        {'name': 'Борщ', 'quantity': 2, 'price': 350.5, 'subtotal': 701.0},
+        {'name': 'Солянка сборная мясная', 'quantity': 3, 'price': 420.1, 'subtotal': 1260.3},
+        {'name': 'Пельмени домашние', 'quantity': 2, 'price': 390.2, 'subtotal': 780.4},
+        {'name': 'Морс клюквенный', 'quantity': 4, 'price': 127.5, 'subtotal': 510.0},
+    ]
+}
+
+
+def sales_report(rows):
+    data = [[f'Блюдо №{i}', i % 17 + 1, float(1000 + i * 7)] for i in range(rows)]
+    return {
+        'start_date': '2026-10-01',
+        'end_date': '2026-10-18',
+        'total_period_revenue': sum(row[2] for row in data),
+        'rows': data
+    }
+
+
+def measure(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.99) - 1)]
+
+
+def report(title, fn, repeat):
+    p50, p99 = measure(fn, repeat)
+    print(f"  {title}: p50 {p50:.3f} мс, p99 {p99:.3f} мс")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    started = time.perf_counter()
+    styles = load_theme()
+    print(f"=== Шрифт: {styles.font_path} ===")
+    print(f"  старт процесса (шрифты + стили): {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    print("=== Подготовка на документ ===")
+    report('регистрация шрифтов заново', lambda: register_russian_fonts(), min(repeat, 20))
+    report('сборка стилей заново', lambda: PdfTheme(styles.font_path), repeat)
+    report('готовые стили (theme())', pdf_render.theme, repeat)
+
+    print("=== Рендер ===")
+    report('чек PDF', lambda: render_receipt(RECEIPT), repeat)
+    report(f'отчет PDF, {rows} строк', lambda: render_sales_report(sales_report(rows)), max(1, repeat // 10))
+    report('чек текстом', lambda: render_text(RECEIPT), repeat)
+    report('чек ESC/POS', lambda: render_escpos(RECEIPT), repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -20,10 +21,37 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-me'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     
+    # Бронирование: сколько минут стол занят одной бронью
+    BOOKING_DURATION_MINUTES = 120
+    
+    # Справочники в памяти: как часто перечитывать изменения других воркеров (сек.)
+    REFERENCE_CACHE_TTL_SECONDS = 300
+    
+    # Снимок меню для /api/menu (ETag): как часто перестраивать ради других воркеров (сек.)
+    MENU_SNAPSHOT_TTL_SECONDS = 60
+    
+    # Кухня: сверка очереди в памяти с БД (сек.) и keepalive для SSE
+    KITCHEN_RECONCILE_SECONDS = 60
+    SSE_KEEPALIVE_SECONDS = 15
+    
     # Пути для сохранения файлов
     UPLOAD_FOLDER = 'static/uploads'
     PDF_FOLDER = 'static/pdf'
     
+    # PDF: процессы рендеринга, предел задач в очереди, ожидание синхронного
+    # рендера и срок хранения файлов фоновых задач (сек.)
+    PDF_WORKERS = 2
+    PDF_MAX_PENDING = 20
+    PDF_RENDER_TIMEOUT_SECONDS = 60
+    PDF_JOB_TTL_SECONDS = 3600
+    # Файлы TTF с кириллицей по порядку предпочтения (через os.pathsep);
+    # пусто - стандартные пути Linux/Windows, запасной - backend/fonts/DejaVuSans.ttf
+    PDF_FONT_PATHS = [path for path in os.environ.get('PDF_FONT_PATHS', '').split(os.pathsep) if path]
+    
+    # Кэш чеков закрытых заказов (PDF_FOLDER/receipts): предел размера и возраста
+    RECEIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+    RECEIPT_CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+    
     # Создаем папки, если их нет
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(PDF_FOLDER, exist_ok=True)
@@ -34,8 +62,16 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
 
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+    JWT_SECRET_KEY = 'testing-jwt-secret-key-long-enough-for-hs256'
+    PDF_FOLDER = os.path.join(tempfile.gettempdir(), 'restaurant-test-pdf')
+    PDF_WORKERS = 1
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
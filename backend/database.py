@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -9,4 +10,18 @@ def init_db(app):
     migrate.init_app(app, db)
     
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        # Файловая SQLite (в памяти одно соединение на всех, гонок нет)
+        if db.engine.dialect.name == 'sqlite' and db.engine.url.database not in (None, '', ':memory:'):
+            enable_sqlite_write_locks(db.engine)
+        db.create_all()
+
+def enable_sqlite_write_locks(engine):
+    """В SQLite нет SELECT ... FOR UPDATE: берем блокировку записи в начале транзакции,
+    чтобы проверка и вставка брони шли без гонок (используется в тестах)"""
+    @event.listens_for(engine, 'connect')
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, 'begin')
+    def begin_immediate(connection):
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
@@ -0,0 +1,155 @@
+from bisect import bisect_left
+import heapq
+import re
+
+WORD_RE = re.compile(r'\w+')
+
+# Вес совпадения по полю и по типу совпадения
+FIELD_WEIGHTS = {'name': 2.0, 'composition': 1.0}
+PREFIX_SCORE = 1.0
+FUZZY_SCORE = 0.5
+
+
+def normalize(text):
+    return (text or '').lower().replace('ё', 'е')
+
+
+def tokenize(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def trigrams(word):
+    """Триграммы слова с меткой начала: опечатка в начале тоже ломает совпадение"""
+    padded = '^' + word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(term):
+    if len(term) < 3:
+        return 0
+    return 1 if len(term) < 6 else 2
+
+
+def edit_distance(a, b, limit):
+    """Расстояние Левенштейна; как только оно заведомо больше limit - limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class DishSearchIndex:
+    """Инвертированный индекс блюд по словам названия и состава.
+
+    Каждое слово запроса ищется как префикс слов индекса (bisect по
+    отсортированному словарю), а если совпадений нет - как префикс с
+    опечатками: кандидаты берутся по общим триграммам и проверяются
+    расстоянием Левенштейна до префикса слова той же длины.
+    Блюдо попадает в выдачу, только если совпали все слова запроса.
+
+    Списки блюд хранятся множествами по полям, поэтому объединения и
+    пересечения для частых слов выполняются без цикла по блюдам в Python.
+    """
+
+    def __init__(self, dishes):
+        postings = {}  # слово -> {поле: {dish_id, ...}}
+        for dish in dishes:
+            for field in FIELD_WEIGHTS:
+                for word in tokenize(dish.get(field)):
+                    postings.setdefault(word, {}).setdefault(field, set()).add(dish['id'])
+
+        self._postings = {
+            word: {field: frozenset(ids) for field, ids in fields.items()}
+            for word, fields in postings.items()
+        }
+        self._words = sorted(self._postings)
+        self._trigrams = {}  # триграмма -> [слово, ...]
+        for word in self._words:
+            for trigram in trigrams(word):
+                self._trigrams.setdefault(trigram, []).append(word)
+
+    def __len__(self):
+        return len(self._words)
+
+    def _prefix_words(self, term):
+        i = bisect_left(self._words, term)
+        while i < len(self._words) and self._words[i].startswith(term):
+            yield self._words[i]
+            i += 1
+
+    def _fuzzy_words(self, term):
+        limit = max_typos(term)
+        if not limit:
+            return
+
+        # Одна опечатка портит не больше трех триграмм термина
+        term_trigrams = trigrams(term)
+        required = max(1, len(term_trigrams) - 3 * limit)
+        shared = {}
+        for trigram in term_trigrams:
+            for word in self._trigrams.get(trigram, ()):
+                shared[word] = shared.get(word, 0) + 1
+
+        for word, count in shared.items():
+            if count < required:
+                continue
+            # Слово может быть длиннее: сравниваем с префиксами близкой длины
+            lengths = range(max(1, len(term) - limit), min(len(word), len(term) + limit) + 1)
+            distance = min((edit_distance(term, word[:length], limit) for length in lengths),
+                           default=limit + 1)
+            if distance <= limit:
+                yield word
+
+    def _collect(self, words, match_score):
+        """[(оценка, множество блюд)] по полям для списка слов"""
+        levels = []
+        for field, weight in FIELD_WEIGHTS.items():
+            ids = frozenset().union(*(self._postings[word].get(field, ()) for word in words))
+            if ids:
+                levels.append((weight * match_score, ids))
+        return levels
+
+    def _match_term(self, term):
+        """Уровни совпадения для одного слова запроса: [(оценка, множество блюд)]"""
+        levels = self._collect(list(self._prefix_words(term)), PREFIX_SCORE)
+        if not levels:
+            levels = self._collect(list(self._fuzzy_words(term)), FUZZY_SCORE)
+        return sorted(levels, key=lambda level: -level[0])
+
+    def search(self, query, limit=20):
+        """id блюд по убыванию релевантности (при равенстве - по id)"""
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return []
+
+        matches = [self._match_term(term) for term in terms]
+        if len(matches) == 1:
+            # Одно слово: уровни уже упорядочены по оценке, добираем сверху
+            result, seen = [], set()
+            for score, ids in matches[0]:
+                result.extend(sorted(ids - seen)[:limit - len(result)])
+                if len(result) >= limit:
+                    break
+                seen |= ids
+            return result
+
+        candidates = None
+        for levels in matches:
+            ids = frozenset().union(*(ids for score, ids in levels))
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+
+        # Оценка блюда по слову - лучший уровень, в который оно попало
+        scores = {dish_id: sum(next(score for score, ids in levels if dish_id in ids)
+                               for levels in matches)
+                  for dish_id in candidates}
+        return heapq.nsmallest(limit, scores, key=lambda dish_id: (-scores[dish_id], dish_id))
@@ -0,0 +1,71 @@
+import queue
+import threading
+
+
+class Subscription:
+    """Очередь событий одного слушателя (например, одного SSE-соединения)"""
+
+    def __init__(self, channel, maxsize):
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def get(self, timeout=None):
+        """Следующее событие (event, data) или None, если за timeout ничего не пришло"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class InProcessBroker:
+    """Pub/sub внутри одного процесса.
+
+    Работает только в рамках одного воркера. Для нескольких воркеров его заменяют
+    через set_broker() объектом с теми же методами publish/subscribe/unsubscribe
+    (например, поверх Redis pub/sub).
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.maxsize)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.get(subscription.channel, set()).discard(subscription)
+        subscription.closed = True
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                # Слушатель не успевает: отключаем, клиент переподключится и получит снимок заново
+                self.unsubscribe(subscription)
+
+
+_broker = InProcessBroker()
+
+
+def get_broker():
+    return _broker
+
+
+def set_broker(broker):
+    """Подменить брокер (для нескольких воркеров или в тестах)"""
+    global _broker
+    _broker = broker
+
+
+def publish(channel, event, data):
+    _broker.publish(channel, event, data)
@@ -0,0 +1,188 @@
+from models import Sale, Dish, Order, Table
+import events
+import threading
+import time
+
+KITCHEN_CHANNEL = 'kitchen'
+
+
+def pending_kitchen_items(order_id=None):
+    """Неготовые блюда из активных заказов (опционально одного заказа)"""
+    query = Sale.query\
+        .join(Dish, Sale.dish_id == Dish.id)\
+        .join(Order, Sale.order_id == Order.id)\
+        .join(Table, Order.table_id == Table.id)\
+        .filter(
+            Sale.is_ready == False,
+            Order.is_active == True
+        )
+
+    if order_id is not None:
+        query = query.filter(Sale.order_id == order_id)
+
+    sales = query\
+        .with_entities(
+            Sale.id,
+            Sale.order_id,
+            Sale.dish_id,
+            Sale.quantity,
+            Sale.is_ready,
+            Dish.name.label('dish_name'),
+            Dish.composition,
+            Dish.weight_grams,
+            Table.id.label('table_number')
+        )\
+        .order_by(Sale.order_id, Sale.id)\
+        .all()
+
+    return [{
+        'id': sale.id,
+        'order_id': sale.order_id,
+        'dish_id': sale.dish_id,
+        'dish_name': sale.dish_name,
+        'composition': sale.composition,
+        'weight_grams': sale.weight_grams,
+        'quantity': sale.quantity,
+        'is_ready': bool(sale.is_ready),
+        'table_number': sale.table_number
+    } for sale in sales]
+
+
+class KitchenQueue:
+    """Материализованная очередь кухни в памяти.
+
+    Загружается из БД при первом обращении кухни и дальше обновляется
+    записывающими маршрутами (через publish_* ниже). Периодическая сверка с БД ловит расхождения,
+    например изменения, сделанные другим воркером.
+    """
+
+    def __init__(self):
+        self._orders = {}  # order_id -> [блюдо, ...]
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self.reconciled_at = None
+        self.updated_at = None
+        self.drift_count = 0
+
+    def load(self):
+        items = pending_kitchen_items()
+        orders = {}
+        for item in items:
+            orders.setdefault(item['order_id'], []).append(item)
+
+        now = time.time()
+        with self._lock:
+            self._orders = orders
+            self.loaded_at = self.reconciled_at = self.updated_at = now
+
+    def reset(self):
+        """Забыть содержимое: очередь перечитается из БД при следующем обращении"""
+        with self._lock:
+            self._orders = {}
+            self.loaded_at = self.reconciled_at = self.updated_at = None
+            self.drift_count = 0
+
+    def ensure_loaded(self):
+        """Загрузить очередь, если это еще не сделано. Возвращает True, если загрузка была"""
+        if self.loaded_at is not None:
+            return False
+        self.load()
+        return True
+
+    def reconcile(self):
+        """Сверить с БД; при расхождении заменить содержимое. Возвращает True, если был дрейф"""
+        if self.ensure_loaded():
+            return False
+        expected = {(item['id'], item['quantity']) for item in pending_kitchen_items()}
+        with self._lock:
+            actual = {(item['id'], item['quantity']) for items in self._orders.values() for item in items}
+        drifted = expected != actual
+
+        if drifted:
+            self.load()
+            self.drift_count += 1
+        else:
+            self.reconciled_at = time.time()
+        return drifted
+
+    def reconcile_if_stale(self, max_age):
+        if self.reconciled_at is None or time.time() - self.reconciled_at >= max_age:
+            self.reconcile()
+
+    def set_order_items(self, order_id, items):
+        with self._lock:
+            if items:
+                self._orders[order_id] = list(items)
+            else:
+                self._orders.pop(order_id, None)
+            self.updated_at = time.time()
+
+    def mark_sale_ready(self, order_id, sale_id):
+        with self._lock:
+            items = [item for item in self._orders.get(order_id, []) if item['id'] != sale_id]
+            if items:
+                self._orders[order_id] = items
+            else:
+                self._orders.pop(order_id, None)
+            self.updated_at = time.time()
+
+    def remove_order(self, order_id):
+        with self._lock:
+            self._orders.pop(order_id, None)
+            self.updated_at = time.time()
+
+    def snapshot(self):
+        """Все неготовые блюда по порядку заказов, без обращения к БД"""
+        with self._lock:
+            return [item for order_id in sorted(self._orders) for item in self._orders[order_id]]
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            pending_items = sum(len(items) for items in self._orders.values())
+            pending_orders = len(self._orders)
+        return {
+            'pending_items': pending_items,
+            'pending_orders': pending_orders,
+            'seconds_since_reconcile': round(now - self.reconciled_at, 3) if self.reconciled_at else None,
+            'seconds_since_update': round(now - self.updated_at, 3) if self.updated_at else None,
+            'drift_count': self.drift_count
+        }
+
+
+kitchen_queue = KitchenQueue()
+
+
+# ===================== События для кухни =====================
+# Вызываются после commit в маршрутах заказов и повара
+
+def publish_order_items(order_id):
+    """Актуальный список неготовых блюд заказа (заменяет прежний у слушателя)"""
+    items = pending_kitchen_items(order_id)
+    kitchen_queue.set_order_items(order_id, items)
+    events.publish(KITCHEN_CHANNEL, 'order_items', {
+        'order_id': order_id,
+        'items': items
+    })
+
+
+def publish_sale_ready(order_id, sale_id):
+    kitchen_queue.mark_sale_ready(order_id, sale_id)
+    events.publish(KITCHEN_CHANNEL, 'sale_ready', {
+        'order_id': order_id,
+        'sale_id': sale_id
+    })
+
+
+def publish_order_ready(order_id):
+    kitchen_queue.remove_order(order_id)
+    events.publish(KITCHEN_CHANNEL, 'order_ready', {
+        'order_id': order_id
+    })
+
+
+def publish_order_closed(order_id):
+    kitchen_queue.remove_order(order_id)
+    events.publish(KITCHEN_CHANNEL, 'order_closed', {
+        'order_id': order_id
+    })
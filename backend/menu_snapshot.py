@@ -0,0 +1,172 @@
+from hashlib import sha1
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from dish_search import DishSearchIndex
+from models import Dish, DishCategory, MenuChange, MenuVersion
+import reference_cache
+
+
+def serialize_dish(dish, category_names):
+    return {
+        'id': dish.id,
+        'name': dish.name,
+        'composition': dish.composition,
+        'price': float(dish.price) if dish.price else 0,
+        'category_id': dish.category_id,
+        'category_name': category_names.get(dish.category_id),
+        'weight_grams': dish.weight_grams,
+        'is_available': dish.is_available
+    }
+
+
+def current_menu_version():
+    """Последняя подтвержденная версия меню (0, если меню не менялось).
+
+    Все изменения с версией не больше этой уже подтверждены: следующую версию
+    нельзя получить, пока не завершится транзакция, взявшая предыдущую.
+    """
+    return db.session.query(MenuVersion.version).filter(MenuVersion.id == 1).scalar() or 0
+
+
+def bump_menu_version():
+    """Выдать следующую версию меню в текущей транзакции.
+
+    UPDATE блокирует строку счетчика до commit/rollback, так что параллельные
+    изменения меню получают версии в порядке подтверждения.
+    """
+    table = MenuVersion.__table__
+    increment = table.update().where(table.c.id == 1).values(version=table.c.version + 1)
+    if not db.session.execute(increment).rowcount:
+        # База без строки счетчика (create_all): продолжаем нумерацию журнала
+        last = db.session.query(func.max(MenuChange.version)).scalar() or 0
+        try:
+            with db.session.begin_nested():
+                db.session.add(MenuVersion(id=1, version=last + 1))
+        except IntegrityError:
+            # Параллельный первый bump уже вставил строку - увеличиваем её
+            db.session.execute(increment)
+    return db.session.query(MenuVersion.version).filter(MenuVersion.id == 1).scalar()
+
+
+def menu_changes(since, version):
+    """Блюда и категории, изменившиеся в версиях (since, version].
+
+    Несколько изменений одной записи схлопываются в одно: если запись есть в
+    таблице - отдается её текущее состояние, если нет - её id попадает в deleted.
+    """
+    changed = db.session.query(MenuChange.entity, MenuChange.entity_id)\
+        .filter(MenuChange.version > since, MenuChange.version <= version)\
+        .distinct()\
+        .all()
+
+    dish_ids = {entity_id for entity, entity_id in changed if entity == 'dish'}
+    category_ids = {entity_id for entity, entity_id in changed if entity == 'category'}
+
+    dishes = Dish.query.filter(Dish.id.in_(dish_ids)).order_by(Dish.id).all() if dish_ids else []
+    categories = DishCategory.query.filter(DishCategory.id.in_(category_ids))\
+        .order_by(DishCategory.id).all() if category_ids else []
+
+    category_names = reference_cache.categories()
+    return {
+        'version': version,
+        'dishes': [serialize_dish(dish, category_names) for dish in dishes],
+        'categories': [{'id': category.id, 'name': category.name} for category in categories],
+        'deleted_dishes': sorted(dish_ids - {dish.id for dish in dishes}),
+        'deleted_categories': sorted(category_ids - {category.id for category in categories})
+    }
+
+
+class MenuPayload:
+    """Готовое тело ответа и его ETag"""
+
+    def __init__(self, data, menu_version):
+        self.menu_version = menu_version
+        self.body = current_app.json.dumps(data).encode('utf-8')
+        # Хэш содержимого, а не номер версии: у разных воркеров версии свои,
+        # а одинаковое меню должно давать одинаковый ETag
+        self.etag = sha1(self.body).hexdigest()
+
+
+class MenuSnapshot:
+    """Меню, заранее сериализованное в байты, с монотонной версией.
+
+    Маршруты, меняющие блюда или категории, вызывают invalidate() после commit;
+    снимок строится заново при следующем запросе. Пока версия не менялась,
+    ответы (и 304 по If-None-Match) отдаются без обращения к БД. Изменения
+    из других воркеров подхватываются не позже чем через ttl секунд.
+    Вместе со снимком строится поисковый индекс блюд (dish_search).
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.version = 0
+        self._built_version = None
+        self._built_at = 0
+        self._snapshot = ([], {}, 0)  # (блюда, {ключ: MenuPayload}, версия журнала)
+        self._search = (DishSearchIndex([]), {})  # (индекс, {id: блюдо})
+        self._lock = threading.Lock()
+
+    def build(self):
+        with self._lock:
+            version = self.version
+        # Версию журнала читаем до блюд: изменение, попавшее между запросами,
+        # клиент получит еще раз через /changes, а не потеряет
+        menu_version = current_menu_version()
+        category_names = reference_cache.categories()
+        dishes = [serialize_dish(dish, category_names) for dish in Dish.query.order_by(Dish.id)]
+        payloads = {
+            'dishes': MenuPayload(dishes, menu_version),
+            'categories': MenuPayload([{'id': category_id, 'name': name}
+                                       for category_id, name in category_names.items()], menu_version)
+        }
+        search = (DishSearchIndex(dishes), {dish['id']: dish for dish in dishes})
+        with self._lock:
+            self._snapshot = (dishes, payloads, menu_version)
+            self._search = search
+            self._built_version = version
+            self._built_at = time.time()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def _fresh(self):
+        if self._built_version != self.version or time.time() - self._built_at >= self.ttl:
+            self.build()
+
+    def categories(self):
+        self._fresh()
+        return self._snapshot[1]['categories']
+
+    def dishes(self, category_id=None):
+        """Все блюда или блюда одной категории (собираются один раз на версию)"""
+        self._fresh()
+        dishes, payloads, menu_version = self._snapshot
+        if not category_id:
+            return payloads['dishes']
+        if category_id not in reference_cache.categories():
+            # Несуществующие категории не кэшируем, чтобы не раздувать словарь
+            return MenuPayload([], menu_version)
+
+        key = ('dishes', category_id)
+        payload = payloads.get(key)
+        if payload is None:
+            payload = MenuPayload([dish for dish in dishes if dish['category_id'] == category_id],
+                                  menu_version)
+            payloads[key] = payload
+        return payload
+
+    def search(self, query, limit=20):
+        """Поиск блюд по названию и составу в индексе текущей версии меню"""
+        self._fresh()
+        index, dishes = self._search
+        return [dishes[dish_id] for dish_id in index.search(query, limit)]
+
+
+menu_snapshot = MenuSnapshot()
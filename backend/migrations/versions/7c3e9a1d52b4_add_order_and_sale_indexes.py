@@ -0,0 +1,34 @@
+"""Add composite indexes for active order and sale queries
+
+Revision ID: 7c3e9a1d52b4
+Revises: 446f23a2b564
+Create Date: 2026-10-18 10:12:40.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e9a1d52b4'
+down_revision = '446f23a2b564'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('restaurant_order', schema=None) as batch_op:
+        batch_op.create_index('ix_restaurant_order_active_employee_datetime', ['is_active', 'employee_id', 'order_datetime'], unique=False)
+        batch_op.create_index('ix_restaurant_order_order_datetime', ['order_datetime'], unique=False)
+
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.create_index('ix_sale_order_id_is_ready', ['order_id', 'is_ready'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_order_id_is_ready')
+
+    with op.batch_alter_table('restaurant_order', schema=None) as batch_op:
+        batch_op.drop_index('ix_restaurant_order_order_datetime')
+        batch_op.drop_index('ix_restaurant_order_active_employee_datetime')
@@ -0,0 +1,40 @@
+"""Add commit-ordered menu version counter
+
+Revision ID: a7d3f09b5e12
+Revises: f3b8d2e61c94
+Create Date: 2026-10-19 10:04:31.517204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f09b5e12'
+down_revision = 'f3b8d2e61c94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('menu_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Уже выданные версии (id журнала) сохраняются, чтобы клиенты продолжили синхронизацию
+    op.add_column('menu_change', sa.Column('version', sa.Integer(), nullable=True))
+    op.execute('UPDATE menu_change SET version = id')
+    with op.batch_alter_table('menu_change') as batch_op:
+        batch_op.alter_column('version', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_index('ix_menu_change_version', ['version'])
+
+    op.execute('INSERT INTO menu_version (id, version) SELECT 1, COALESCE(MAX(id), 0) FROM menu_change')
+
+
+def downgrade():
+    with op.batch_alter_table('menu_change') as batch_op:
+        batch_op.drop_index('ix_menu_change_version')
+        batch_op.drop_column('version')
+    op.drop_table('menu_version')
@@ -0,0 +1,28 @@
+"""Add booking datetime indexes
+
+Revision ID: b41f08d6e2a7
+Revises: 7c3e9a1d52b4
+Create Date: 2026-10-18 15:40:02.671945
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41f08d6e2a7'
+down_revision = '7c3e9a1d52b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_datetime', ['datetime'], unique=False)
+        batch_op.create_index('ix_booking_table_id_datetime', ['table_id', 'datetime'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_table_id_datetime')
+        batch_op.drop_index('ix_booking_datetime')
@@ -0,0 +1,31 @@
+"""Add menu change table
+
+Revision ID: d5a91c3e7f20
+Revises: b41f08d6e2a7
+Create Date: 2026-10-18 17:12:45.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a91c3e7f20'
+down_revision = 'b41f08d6e2a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('menu_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('entity', sa.String(length=10), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(length=10), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('menu_change')
@@ -0,0 +1,32 @@
+"""Add daily dish sales table
+
+Revision ID: e2c47b9a0d15
+Revises: d5a91c3e7f20
+Create Date: 2026-10-18 18:05:31.774102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c47b9a0d15'
+down_revision = 'd5a91c3e7f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_dish_sales',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('dish_id', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['dish_id'], ['dish.id'], ),
+        sa.PrimaryKeyConstraint('date', 'dish_id')
+    )
+    # Заполнение по уже закрытым заказам: flask rebuild-sales-rollup
+
+
+def downgrade():
+    op.drop_table('daily_dish_sales')
@@ -0,0 +1,42 @@
+"""Add sale unit price and line total
+
+Revision ID: f3b8d2e61c94
+Revises: e2c47b9a0d15
+Create Date: 2026-10-18 18:52:10.419336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2e61c94'
+down_revision = 'e2c47b9a0d15'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unit_price', sa.Numeric(precision=10, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('line_total', sa.Numeric(precision=12, scale=2), nullable=True))
+
+    # Старые продажи заполняем текущей ценой блюда - исторической цены нет.
+    # Пачками по id, чтобы не держать блокировку на всей таблице sale
+    connection = op.get_bind()
+    max_id = connection.execute(sa.text('SELECT MAX(id) FROM sale')).scalar() or 0
+    for first_id in range(1, max_id + 1, BATCH_SIZE):
+        connection.execute(sa.text("""
+            UPDATE sale
+            SET unit_price = (SELECT d.price FROM dish d WHERE d.id = sale.dish_id),
+                line_total = quantity * (SELECT d.price FROM dish d WHERE d.id = sale.dish_id)
+            WHERE id >= :first_id AND id < :last_id AND unit_price IS NULL
+        """), {'first_id': first_id, 'last_id': first_id + BATCH_SIZE})
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_column('line_total')
+        batch_op.drop_column('unit_price')
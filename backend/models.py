@@ -57,6 +57,11 @@ class Table(db.Model):
 # Table: Booking
 class Booking(db.Model):
     __tablename__ = 'booking'
+    __table_args__ = (
+        # Список броней по периоду и проверка пересечений по столу
+        db.Index('ix_booking_datetime', 'datetime'),
+        db.Index('ix_booking_table_id_datetime', 'table_id', 'datetime'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     table_id = db.Column(db.Integer, db.ForeignKey('restaurant_table.id'), nullable=False)
@@ -205,6 +210,11 @@ class Dish(db.Model):
 # Table: Order (Заказ)
 class Order(db.Model):
     __tablename__ = 'restaurant_order'
+    __table_args__ = (
+        # Активные заказы официанта за день и отчеты по периоду
+        db.Index('ix_restaurant_order_active_employee_datetime', 'is_active', 'employee_id', 'order_datetime'),
+        db.Index('ix_restaurant_order_order_datetime', 'order_datetime'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     table_id = db.Column(db.Integer, db.ForeignKey('restaurant_table.id'), nullable=False)
@@ -229,12 +239,19 @@ class Order(db.Model):
 # Table: Sale (Продажа)
 class Sale(db.Model):
     __tablename__ = 'sale'
+    __table_args__ = (
+        # Неготовые блюда заказа (кухня)
+        db.Index('ix_sale_order_id_is_ready', 'order_id', 'is_ready'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('restaurant_order.id'), nullable=False)
     dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     is_ready = db.Column(db.Boolean, default=False)
+    # Цена блюда на момент заказа и сумма строки: отчеты и чеки не зависят от dish.price
+    unit_price = db.Column(db.Numeric(10, 2))
+    line_total = db.Column(db.Numeric(12, 2))
     
     def to_dict(self):
         return {
@@ -242,9 +259,45 @@ class Sale(db.Model):
             'order_id': self.order_id,
             'dish_id': self.dish_id,
             'quantity': self.quantity,
-            'is_ready': self.is_ready
+            'is_ready': self.is_ready,
+            'unit_price': float(self.unit_price) if self.unit_price is not None else None,
+            'line_total': float(self.line_total) if self.line_total is not None else None
         }
 
+# Table: Daily Dish Sales (продажи блюд по дням, для отчетов)
+# Пополняется при закрытии заказа; пересчет - flask rebuild-sales-rollup
+class DailyDishSales(db.Model):
+    __tablename__ = 'daily_dish_sales'
+
+    date = db.Column(db.Date, primary_key=True)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dish.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+# Table: Menu Change (журнал изменений меню)
+# id - версия меню: клиенты синхронизируются через /api/menu/changes?since=<id>
+class MenuChange(db.Model):
+    __tablename__ = 'menu_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Версия меню в порядке commit (см. MenuVersion); id выдается при INSERT и для этого не годится
+    version = db.Column(db.Integer, nullable=False, index=True)
+    entity = db.Column(db.String(10), nullable=False)  # 'dish' / 'category'
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'create' / 'update' / 'delete'
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class MenuVersion(db.Model):
+    """Счетчик версий меню - одна строка (id = 1).
+
+    Увеличивается в транзакции изменения меню и держит блокировку строки до
+    commit, поэтому версии подтверждаются строго по возрастанию.
+    """
+    __tablename__ = 'menu_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 # Initial Data Functions
 def create_initial_data():
     """Создание начальных данных для базы данных"""
@@ -291,5 +344,10 @@ def create_initial_data():
             category = DishCategory(**category_data)
             db.session.add(category)
     
+    # Строка счетчика версий меню, как в миграции
+    if not db.session.get(MenuVersion, 1):
+        last = db.session.query(db.func.max(MenuChange.version)).scalar() or 0
+        db.session.add(MenuVersion(id=1, version=last))
+    
     db.session.commit()
     print("✅ Initial data created successfully!")
\ No newline at end of file
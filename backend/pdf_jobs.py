@@ -0,0 +1,218 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+from pdf_render import load_theme, render_pdf
+
+
+class QueueFull(Exception):
+    """В очереди рендеринга слишком много задач - клиенту стоит повторить позже"""
+
+
+def render_pdf_to_file(kind, data, path):
+    """Выполняется в процессе пула: рендер и атомарная запись в PDF_FOLDER"""
+    content = render_pdf(kind, data)
+    # Свой временный файл у каждого процесса: один документ могут рендерить параллельно
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return len(content)
+
+
+class PdfJobQueue:
+    """Рендеринг PDF в ограниченном пуле процессов.
+
+    ReportLab нагружает процессор и держит GIL, поэтому документы строятся
+    не в потоке запроса, а в отдельных процессах. Число задач в работе и в
+    очереди ограничено max_pending: сверх него submit/render бросают QueueFull.
+
+    Состояние задачи хранится рядом с файлом (<id>.json в PDF_FOLDER/jobs), поэтому
+    статус и файл доступны из любого воркера, а не только из принявшего задачу.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.workers = 2
+        self.max_pending = 20
+        self.ttl = 3600
+        self.font_paths = None
+        self._executor = None
+        self._futures = {}  # job_id -> Future (задачи этого процесса)
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def configure(self, folder, workers, max_pending, ttl, font_paths=None):
+        self.folder = folder
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.font_paths = font_paths
+        os.makedirs(folder, exist_ok=True)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: дочерние процессы не наследуют соединения с БД и потоки Flask.
+                # Шрифты и стили каждый процесс готовит один раз при старте
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=load_theme,
+                                                     initargs=(self.font_paths,))
+            return self._executor
+
+    def _drop_pool(self, executor):
+        """Забыть пул с умершим процессом (OOM, сигнал): следующая задача создаст новый.
+
+        Сломанный ProcessPoolExecutor уже не принимает задач, а его незавершенные
+        future получают BrokenProcessPool - задачи из них помечаются failed.
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._inflight >= self.max_pending:
+                raise QueueFull()
+            self._inflight += 1
+        try:
+            executor = self._pool()
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # Пул сломался раньше, чем это заметил колбэк: один повтор в новом пуле
+                self._drop_pool(executor)
+                executor = self._pool()
+                future = executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda f: self._done(executor, f))
+        return future
+
+    def _done(self, executor, future):
+        self._release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._drop_pool(executor)
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+    def pending(self):
+        return self._inflight
+
+    def start(self, kind, data, path=None):
+        """Запустить рендер в пуле; Future вернет байты PDF или, если задан path, размер файла"""
+        if path is None:
+            return self._submit(render_pdf, kind, data)
+        return self._submit(render_pdf_to_file, kind, data, path)
+
+    def render(self, kind, data, timeout):
+        """Синхронный рендер в пуле: поток запроса ждет, но не занимает процессор"""
+        return self.start(kind, data).result(timeout=timeout)
+
+    def render_to_file(self, kind, data, path, timeout):
+        """Синхронный рендер в пуле сразу в файл (байты не передаются между процессами)"""
+        return self.start(kind, data, path).result(timeout=timeout)
+
+    # ---------- Фоновые задачи ----------
+
+    def _meta_path(self, job_id):
+        return os.path.join(self.folder, f'{job_id}.json')
+
+    def file_path(self, job_id):
+        return os.path.join(self.folder, f'{job_id}.pdf')
+
+    def _write_meta(self, job_id, meta):
+        tmp_path = self._meta_path(job_id) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path(job_id))
+
+    def submit(self, kind, data, filename, owner_id):
+        """Поставить документ в очередь; возвращает описание задачи"""
+        self.sweep()
+
+        job_id = uuid.uuid4().hex
+        meta = {
+            'id': job_id,
+            'kind': kind,
+            'owner_id': owner_id,
+            'filename': filename,
+            'status': 'queued',
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        future = self._submit(render_pdf_to_file, kind, data, self.file_path(job_id))
+        self._write_meta(job_id, meta)
+        self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._finish(job_id, meta, f))
+        return dict(meta)
+
+    def _finish(self, job_id, meta, future):
+        meta = dict(meta, finished_at=time.time())
+        error = future.exception()
+        if error is None:
+            meta['status'] = 'done'
+        else:
+            meta['status'] = 'failed'
+            meta['error'] = str(error) or error.__class__.__name__
+        self._write_meta(job_id, meta)
+        self._futures.pop(job_id, None)
+
+    def get(self, job_id, wait=0):
+        """Описание задачи или None; wait - сколько секунд ждать завершения"""
+        future = self._futures.get(job_id)
+        if future is not None and wait:
+            try:
+                future.exception(timeout=wait)
+            except FutureTimeoutError:
+                pass
+            # Колбэк завершения мог еще не дописать <id>.json
+            meta = self._read_meta(job_id)
+            if future.done() and meta:
+                self._finish(job_id, meta, future)
+
+        meta = self._read_meta(job_id)
+        if meta and meta['status'] == 'queued' and future is not None and future.running():
+            meta['status'] = 'running'
+        return meta
+
+    def _read_meta(self, job_id):
+        # id приходит из URL: пускаем только hex, чтобы не выйти за пределы папки
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def sweep(self):
+        """Удалить задачи и файлы старше ttl"""
+        if not self.folder:
+            return
+        expire_before = time.time() - self.ttl
+        for name in os.listdir(self.folder):
+            job_id, ext = os.path.splitext(name)
+            if ext not in ('.json', '.pdf') or job_id in self._futures:
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                if os.path.getmtime(path) < expire_before:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+pdf_job_queue = PdfJobQueue()
@@ -0,0 +1,373 @@
+# pdf_render.py
+# Сборка PDF отчетов и чеков из готовых данных (без Flask и БД), чтобы
+# рендеринг можно было выполнять в отдельных процессах (см. pdf_jobs.py).
+from datetime import datetime
+import io
+import os
+
+from reportlab.lib import colors
+from reportlab.lib.fonts import addMapping
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+# Шрифты с кириллицей: первый найденный файл из списка. Список задается
+# PDF_FONT_PATHS, в конце всегда стоит DejaVu Sans из backend/fonts.
+BUNDLED_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts', 'DejaVuSans.ttf')
+DEFAULT_FONT_PATHS = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Debian, Ubuntu
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',  # Fedora, CentOS
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',  # Arch
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    'C:/Windows/Fonts/arial.ttf',
+    'C:/Windows/Fonts/tahoma.ttf',
+)
+FONT, FONT_BOLD = 'Russian', 'Russian-Bold'
+
+
+def bold_variant(font_path):
+    """Жирное начертание рядом с обычным: arialbd.ttf, DejaVuSans-Bold.ttf, ...-Bold.ttf"""
+    base, ext = os.path.splitext(font_path)
+    candidates = [base + 'bd' + ext, base + '-Bold' + ext]
+    if base.endswith('-Regular'):
+        candidates.append(base[:-len('-Regular')] + '-Bold' + ext)
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return font_path
+
+
+def register_russian_fonts(font_paths=None):
+    """Зарегистрировать FONT / FONT_BOLD; возвращает путь к использованному файлу"""
+    for font_path in [*(font_paths or DEFAULT_FONT_PATHS), BUNDLED_FONT]:
+        if not os.path.exists(font_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont(FONT, font_path))
+            pdfmetrics.registerFont(TTFont(FONT_BOLD, bold_variant(font_path)))
+        except Exception:
+            continue
+        addMapping(FONT, 0, 0, FONT)
+        addMapping(FONT, 1, 0, FONT_BOLD)
+        return font_path
+    raise RuntimeError('Не найден шрифт с кириллицей для PDF')
+
+
+class PdfTheme:
+    """Стили абзацев и таблиц отчета и чека.
+
+    Строятся один раз на процесс и дальше только читаются: Paragraph и
+    Table не меняют переданные им стили, поэтому объекты общие для всех
+    документов.
+    """
+
+    def __init__(self, font_path):
+        self.font_path = font_path
+        sample = getSampleStyleSheet()
+
+        # Отчет по продажам
+        self.report_title = ParagraphStyle(
+            name='ReportTitle',
+            parent=sample['Title'],
+            fontName=FONT_BOLD,
+            fontSize=18,
+            alignment=1,  # центрирование
+            spaceAfter=30
+        )
+        self.report_heading = ParagraphStyle(
+            name='ReportHeading',
+            parent=sample['Heading2'],
+            fontName=FONT_BOLD,
+            fontSize=14,
+            textColor=colors.HexColor('#2C3E50')
+        )
+        self.report_normal = ParagraphStyle(
+            name='ReportNormal',
+            parent=sample['Normal'],
+            fontName=FONT,
+            fontSize=10
+        )
+        self.report_no_data = ParagraphStyle(
+            name='NoData',
+            fontName=FONT,
+            fontSize=12,
+            textColor=colors.HexColor('#E74C3C'),
+            alignment=1
+        )
+        self.report_footer = ParagraphStyle(
+            name='Footer',
+            fontName=FONT,
+            fontSize=8,
+            textColor=colors.HexColor('#7F8C8D'),
+            alignment=1
+        )
+        self.report_table = TableStyle([
+            # Заголовок
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+            # Тело таблицы
+            ('FONTNAME', (0, 1), (-1, -2), FONT),
+            ('FONTSIZE', (0, 1), (-1, -2), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -2), 'LEFT'),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#F8F9FA')),
+            ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#DDDDDD')),
+
+            # Итоговая строка
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#2C3E50')),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+            ('FONTNAME', (0, -1), (-1, -1), FONT_BOLD),
+            ('FONTSIZE', (0, -1), (-1, -1), 10),
+
+            # Границы
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('LINEABOVE', (0, -1), (-1, -1), 1, colors.white),
+        ])
+
+        # Кассовый чек
+        self.receipt_title = ParagraphStyle(
+            name='ReceiptTitle',
+            parent=sample['Title'],
+            fontName=FONT_BOLD,
+            fontSize=16,
+            alignment=1,  # center
+            spaceAfter=20
+        )
+        self.receipt_normal = ParagraphStyle(
+            name='ReceiptNormal',
+            parent=sample['Normal'],
+            fontName=FONT,
+            fontSize=10,
+            spaceAfter=5
+        )
+        self.receipt_footer = ParagraphStyle(
+            name='ReceiptFooter',
+            parent=sample['Normal'],
+            fontName=FONT,
+            fontSize=8,
+            alignment=1,  # center
+            textColor=colors.grey
+        )
+        self.receipt_table = TableStyle([
+            # Заголовок
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), FONT_BOLD),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+            # Данные
+            ('ALIGN', (0, 1), (-1, -2), 'CENTER'),
+            ('ALIGN', (1, 1), (1, -2), 'LEFT'),
+            ('FONTNAME', (0, 1), (-1, -2), FONT),
+            ('FONTSIZE', (0, 1), (-1, -2), 9),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#F8F9FA')),
+
+            # Итог
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#2C3E50')),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
+            ('FONTNAME', (0, -1), (-1, -1), FONT_BOLD),
+            ('FONTSIZE', (0, -1), (-1, -1), 11),
+
+            # Границы
+            ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#DDDDDD')),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+        ])
+
+
+_theme = None
+
+
+def load_theme(font_paths=None):
+    """Зарегистрировать шрифты и построить стили; вызывается при старте процесса пула"""
+    global _theme
+    _theme = PdfTheme(register_russian_fonts(font_paths))
+    return _theme
+
+
+def theme():
+    return _theme or load_theme()
+
+
+def render_sales_report(data):
+    """PDF отчета по продажам.
+
+    data: start_date, end_date (YYYY-MM-DD), total_period_revenue,
+    rows - [[dish_name, quantity_sold, total_revenue], ...]
+    """
+    start_date = datetime.strptime(data['start_date'], '%Y-%m-%d')
+    end_date = datetime.strptime(data['end_date'], '%Y-%m-%d')
+    total_period_revenue = data['total_period_revenue']
+    result = data['rows']
+
+    styles = theme()
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+
+    # Заголовок
+    elements.append(Paragraph("ОТЧЕТ О ПРОДАЖАХ", styles.report_title))
+
+    # Период
+    elements.append(Paragraph(
+        f"Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}",
+        styles.report_heading
+    ))
+
+    elements.append(Spacer(1, 12))
+
+    # Информация о отчете
+    elements.append(Paragraph(
+        f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}<br/>"
+        f"Общая выручка: {total_period_revenue:.2f} руб.<br/>"
+        f"Количество позиций: {len(result)}",
+        styles.report_normal
+    ))
+
+    elements.append(Spacer(1, 20))
+
+    # Таблица с данными
+    if result:
+        # Заголовки таблицы
+        table_data = [
+            ['№', 'Наименование блюда', 'Количество', 'Выручка, руб.', 'Доля, %']
+        ]
+
+        total_quantity = 0
+        for i, (dish_name, quantity_sold, total_revenue) in enumerate(result, 1):
+            total_quantity += quantity_sold
+            revenue_share = (total_revenue / total_period_revenue * 100) if total_period_revenue > 0 else 0
+
+            table_data.append([
+                str(i),
+                dish_name,
+                str(quantity_sold),
+                f"{total_revenue:.2f}",
+                f"{revenue_share:.2f}"
+            ])
+
+        # Итоговая строка
+        table_data.append([
+            "   ИТОГО",
+            "",
+            str(total_quantity),
+            f"{total_period_revenue:.2f}",
+            "100.00"
+        ])
+
+        pdf_table = Table(table_data, colWidths=[30, 200, 60, 70, 50])
+        pdf_table.setStyle(styles.report_table)
+
+        elements.append(pdf_table)
+    else:
+        # Сообщение об отсутствии данных
+        elements.append(Paragraph(
+            "НЕТ ДАННЫХ ДЛЯ ОТЧЕТА<br/><br/>"
+            f"За период с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')} "
+            "продажи отсутствуют.",
+            styles.report_no_data
+        ))
+
+    # Подпись
+    elements.append(Spacer(1, 30))
+
+    elements.append(Paragraph(
+        "Отчет сформирован автоматически системой управления рестораном<br/>"
+        f"© {datetime.now().year} Ресторан",
+        styles.report_footer
+    ))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def render_receipt(data):
+    """PDF кассового чека.
+
+    data: order_id, table_number, employee_name, order_datetime (ISO),
+    total_amount, items - [{name, quantity, price, subtotal}, ...]
+    """
+    order_datetime = datetime.fromisoformat(data['order_datetime'])
+    order_items = data['items']
+
+    styles = theme()
+    buffer = io.BytesIO()
+
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=40,
+        rightMargin=40,
+        topMargin=40,
+        bottomMargin=40
+    )
+
+    elements = []
+
+    # Заголовок
+    elements.append(Paragraph("РЕСТОРАН", styles.receipt_title))
+    elements.append(Paragraph("КАССОВЫЙ ЧЕК", styles.receipt_title))
+
+    elements.append(Spacer(1, 20))
+
+    # Информация о заказе
+    elements.append(Paragraph(f"Чек №: {data['order_id']}", styles.receipt_normal))
+    elements.append(Paragraph(f"Стол: {data['table_number'] or 'N/A'}", styles.receipt_normal))
+    elements.append(Paragraph(f"Официант: {data['employee_name'] or 'N/A'}", styles.receipt_normal))
+    elements.append(Paragraph(f"Дата: {order_datetime.strftime('%d.%m.%Y %H:%M')}", styles.receipt_normal))
+
+    elements.append(Spacer(1, 20))
+
+    # Таблица с блюдами
+    if order_items:
+        table_data = [['№', 'Наименование', 'Кол-во', 'Цена', 'Сумма']]
+
+        for i, item in enumerate(order_items, 1):
+            table_data.append([
+                str(i),
+                item['name'],
+                str(item['quantity']),
+                f"{item['price']:.2f}",
+                f"{item['subtotal']:.2f}"
+            ])
+
+        # Итоговая строка
+        table_data.append(['', '', '', 'ИТОГО:', f"{data['total_amount']:.2f} руб."])
+
+        pdf_table = Table(table_data, colWidths=[30, 220, 50, 60, 70])
+        pdf_table.setStyle(styles.receipt_table)
+        elements.append(pdf_table)
+    else:
+        # Если нет блюд в заказе
+        elements.append(Paragraph("Заказ пуст", styles.receipt_normal))
+
+    elements.append(Spacer(1, 30))
+
+    # Подпись
+    elements.append(Paragraph("Спасибо за посещение!", styles.receipt_footer))
+    elements.append(Paragraph("Чек действителен для налоговой отчетности", styles.receipt_footer))
+    elements.append(Paragraph(f"© Ресторан {datetime.now().year}", styles.receipt_footer))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    'sales_report': render_sales_report,
+    'receipt': render_receipt
+}
+
+
+def render_pdf(kind, data):
+    """Точка входа для процессов пула: вид документа и данные -> байты PDF"""
+    return RENDERERS[kind](data)
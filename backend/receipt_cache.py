@@ -0,0 +1,109 @@
+from hashlib import sha1
+import json
+import os
+import threading
+import time
+
+
+# Увеличивается при изменении вида чека (шрифты, верстка), чтобы старые файлы не отдавались
+LAYOUT_VERSION = 2
+
+
+def receipt_digest(data):
+    """Хеш содержимого чека: меняется вместе с данными, по которым он рендерится"""
+    body = json.dumps([LAYOUT_VERSION, data], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return sha1(body.encode('utf-8')).hexdigest()
+
+
+class ReceiptCache:
+    """Готовые PDF чеков закрытых заказов на диске.
+
+    Закрытый заказ не меняется, поэтому чек рендерится один раз и дальше
+    отдается с диска. Имя файла - <order_id>-<хеш данных>.pdf: если данные
+    все же изменились (например, переименовали официанта), хеш не совпадет
+    и чек будет построен заново, а старая версия удалена.
+
+    Вытеснение - по возрасту (max_age) и по суммарному размеру (max_bytes),
+    первыми удаляются файлы, к которым дольше всего не обращались.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.max_bytes = 200 * 1024 * 1024
+        self.max_age = 30 * 24 * 3600
+        self._lock = threading.Lock()
+
+    def configure(self, folder, max_bytes, max_age):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, order_id, digest):
+        return os.path.join(self.folder, f'{order_id}-{digest}.pdf')
+
+    def open(self, order_id, digest):
+        """Открытый на чтение файл готового чека или None.
+
+        Отдавать нужно открытый файл, а не путь: параллельный evict может
+        удалить файл в любой момент, а уже открытый дескриптор остается читаемым.
+        """
+        path = self.path(order_id, digest)
+        try:
+            cached = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            # mtime - время последнего обращения, по нему идет вытеснение
+            os.utime(path)
+        except OSError:
+            pass
+        return cached
+
+    def stored(self, order_id, digest):
+        """Чек записан на диск: убрать устаревшие версии и лишнее"""
+        self.stored_many([(order_id, digest)])
+
+    def stored_many(self, keys):
+        """То же для нескольких чеков [(order_id, digest)] за один проход по папке"""
+        if not keys:
+            return
+        current = {os.path.basename(self.path(order_id, digest)) for order_id, digest in keys}
+        prefixes = tuple(f'{order_id}-' for order_id, digest in keys)
+        for name in os.listdir(self.folder):
+            if name.startswith(prefixes) and name.endswith('.pdf') and name not in current:
+                self._remove(name)
+        self.evict()
+
+    def evict(self):
+        """Удалить чеки старше max_age, затем самые давние - пока не уложимся в max_bytes"""
+        with self._lock:
+            expire_before = time.time() - self.max_age
+            files = []
+            for entry in os.scandir(self.folder):
+                if not entry.name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if stat.st_mtime < expire_before:
+                    self._remove(entry.name)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.name))
+
+            total = sum(size for mtime, size, name in files)
+            for mtime, size, name in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                self._remove(name)
+                total -= size
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.folder, name))
+        except OSError:
+            pass
+
+
+receipt_cache = ReceiptCache()
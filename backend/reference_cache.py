@@ -0,0 +1,76 @@
+from types import MappingProxyType
+import threading
+import time
+
+from models import BookingStatus, Position, DishCategory, Hall
+
+# Маленькие справочники, которые почти не меняются: {вид: модель}
+REFERENCE_MODELS = {
+    'booking_statuses': BookingStatus,
+    'positions': Position,
+    'categories': DishCategory,
+    'halls': Hall
+}
+
+
+class ReferenceCache:
+    """Справочники в памяти процесса в виде неизменяемых словарей {id: name}.
+
+    Данные читаются из БД при первом обращении. Маршруты, меняющие справочники,
+    вызывают invalidate() после commit: версия увеличивается, и при следующем
+    обращении данные перечитываются. Изменения из других воркеров подхватываются
+    не позже чем через ttl секунд, поэтому кэш служит только для названий в
+    ответах; проверки при записи идут по БД.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.version = 0
+        self._loaded_version = None
+        self._loaded_at = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            version = self.version
+        data = {
+            kind: MappingProxyType({row.id: row.name for row in model.query.all()})
+            for kind, model in REFERENCE_MODELS.items()
+        }
+        with self._lock:
+            self._data = data
+            self._loaded_version = version
+            self._loaded_at = time.time()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+
+    def get(self, kind):
+        if self._loaded_version != self.version or time.time() - self._loaded_at >= self.ttl:
+            self.load()
+        return self._data[kind]
+
+
+reference_cache = ReferenceCache()
+
+
+def booking_statuses():
+    return reference_cache.get('booking_statuses')
+
+
+def positions():
+    return reference_cache.get('positions')
+
+
+def categories():
+    return reference_cache.get('categories')
+
+
+def halls():
+    return reference_cache.get('halls')
+
+
+def invalidate():
+    reference_cache.invalidate()
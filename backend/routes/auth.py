@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from models import Employee, Position
 from database import db
+import reference_cache
 import hashlib
 
 auth_bp = Blueprint('auth', __name__)
@@ -27,8 +28,9 @@ def login():
     if employee.password != password_hash:
         return jsonify({'error': 'Неверный пароль'}), 401
     
-    # Получаем информацию о должности
+    # Должность попадает в токен и определяет права - берем из БД, а не из кэша
     position = Position.query.get(employee.position_id)
+    position_name = position.name if position else 'unknown'
     
     # Создаем JWT токен с CORRECT identity и additional_claims
     # Identity должен быть простым значением (например, ID пользователя)
@@ -38,7 +40,7 @@ def login():
     additional_claims = {
         'login': employee.login,
         'full_name': employee.full_name,
-        'position': position.name if position else 'unknown',
+        'position': position_name,
         'position_id': employee.position_id
     }
     
@@ -53,7 +55,7 @@ def login():
             'id': employee.id,
             'login': employee.login,
             'full_name': employee.full_name,
-            'position': position.name if position else 'unknown',
+            'position': position_name,
             'position_id': employee.position_id,
             'phone': employee.phone
         }
@@ -71,13 +73,11 @@ def get_current_user():
     if not employee:
         return jsonify({'error': 'Пользователь не найден'}), 404
     
-    position = Position.query.get(employee.position_id)
-    
     return jsonify({
         'id': employee.id,
         'login': employee.login,
         'full_name': employee.full_name,
-        'position': position.name if position else 'unknown',
+        'position': reference_cache.positions().get(employee.position_id, 'unknown'),
         'position_id': employee.position_id,
         'phone': employee.phone
     }), 200
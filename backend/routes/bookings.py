@@ -1,38 +1,101 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Booking, Table, BookingStatus, Hall
+from models import Booking, Table
 from database import db
-from datetime import datetime
+import reference_cache
+from availability import (find_tables, query_window, availability_grid, parse_slot, best_fit_table,
+                          lock_table, find_conflict, CANCELLED_STATUS)
+from datetime import datetime, timedelta
+from routes.utils import parse_datetime, encode_cursor, decode_cursor, get_page_limit
 
 bookings_bp = Blueprint('bookings', __name__)
 
+# Сколько раз перевыбирать стол при автоподборе, если его заняли параллельно
+AUTO_ASSIGN_ATTEMPTS = 3
+
+def booking_rows():
+    """Брони вместе со столом одним запросом (зал и статус - из справочников в памяти)"""
+    return db.session.query(
+        Booking,
+        Table.id.label('table_number'),
+        Table.hall_id
+    )\
+        .outerjoin(Table, Booking.table_id == Table.id)
+
+def serialize_booking(row, hall_names=None, status_names=None):
+    booking, table_number, hall_id = row
+    hall_names = hall_names if hall_names is not None else reference_cache.halls()
+    status_names = status_names if status_names is not None else reference_cache.booking_statuses()
+    return {
+        'id': booking.id,
+        'table_id': booking.table_id,
+        'table_number': table_number,
+        'hall_id': hall_id,
+        'hall_name': hall_names.get(hall_id),
+        'status_id': booking.status_id,
+        'status_name': status_names.get(booking.status_id),
+        'datetime': booking.datetime.isoformat() if booking.datetime else None,
+        'guest_name': booking.guest_name,
+        'guest_phone': booking.guest_phone,
+        'people_count': booking.people_count
+    }
+
 @bookings_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_bookings():
-    """Получить список всех бронирований"""
-    bookings = Booking.query.all()
+    """Получить бронирования с фильтрами (from, to, status_id, hall_id) постранично"""
+    limit = get_page_limit()
+    query = booking_rows()
     
-    result = []
-    for booking in bookings:
-        table = Table.query.get(booking.table_id)
-        hall = Hall.query.get(table.hall_id) if table else None
-        status = BookingStatus.query.get(booking.status_id)
-        
-        result.append({
-            'id': booking.id,
-            'table_id': booking.table_id,
-            'table_number': table.id if table else None,
-            'hall_id': table.hall_id if table else None,
-            'hall_name': hall.name if hall else None,
-            'status_id': booking.status_id,
-            'status_name': status.name if status else None,
-            'datetime': booking.datetime.isoformat() if booking.datetime else None,
-            'guest_name': booking.guest_name,
-            'guest_phone': booking.guest_phone,
-            'people_count': booking.people_count
-        })
+    try:
+        if request.args.get('from'):
+            query = query.filter(Booking.datetime >= parse_datetime(request.args['from']))
+        if request.args.get('to'):
+            to_str = request.args['to']
+            end = parse_datetime(to_str)
+            # Дата без времени в to включает весь день
+            if len(to_str) == 10:
+                end += timedelta(days=1)
+            query = query.filter(Booking.datetime < end)
+    except ValueError:
+        return jsonify({'error': 'Неверный формат даты'}), 400
     
-    return jsonify(result), 200
+    status_id = request.args.get('status_id', type=int)
+    if status_id:
+        query = query.filter(Booking.status_id == status_id)
+    
+    hall_id = request.args.get('hall_id', type=int)
+    if hall_id:
+        query = query.filter(Table.hall_id == hall_id)
+    
+    # Keyset-пагинация по (datetime, id) по возрастанию
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_datetime, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Неверный курсор'}), 400
+        query = query.filter(db.or_(
+            Booking.datetime > cursor_datetime,
+            db.and_(Booking.datetime == cursor_datetime, Booking.id > cursor_id)
+        ))
+    
+    rows = query.order_by(Booking.datetime, Booking.id).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    hall_names = reference_cache.halls()
+    status_names = reference_cache.booking_statuses()
+    
+    next_cursor = None
+    if has_more:
+        last_booking = rows[-1][0]
+        next_cursor = encode_cursor(last_booking.datetime, last_booking.id)
+    
+    return jsonify({
+        'bookings': [serialize_booking(row, hall_names, status_names) for row in rows],
+        'next_cursor': next_cursor
+    }), 200
 
 @bookings_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -40,30 +103,62 @@ def create_booking():
     """Создать новое бронирование"""
     data = request.get_json()
     
-    # Проверка обязательных полей
-    required_fields = ['table_id', 'guest_name', 'guest_phone', 'people_count', 'datetime']
+    # Проверка обязательных полей (при auto_assign стол подбирается автоматически)
+    auto_assign = bool(data.get('auto_assign'))
+    required_fields = ['guest_name', 'guest_phone', 'people_count', 'datetime']
+    if not auto_assign:
+        required_fields.insert(0, 'table_id')
     for field in required_fields:
         if field not in data:
             return jsonify({'error': f'Поле {field} обязательно'}), 400
     
-    # Проверка существования стола
-    table = Table.query.get(data['table_id'])
-    if not table:
-        return jsonify({'error': 'Стол не найден'}), 404
-    
-    # Проверка вместимости
-    if int(data['people_count']) > table.capacity:
-        return jsonify({'error': f'Вместимость стола: {table.capacity} человек'}), 400
-    
     try:
         # Парсим дату
-        booking_datetime = datetime.fromisoformat(data['datetime'].replace('Z', '+00:00'))
+        booking_datetime = parse_datetime(data['datetime'])
     except ValueError:
         return jsonify({'error': 'Неверный формат даты. Используйте ISO формат'}), 400
     
+    if auto_assign:
+        table = None
+        for _ in range(AUTO_ASSIGN_ATTEMPTS):
+            candidate = best_fit_table(booking_datetime, int(data['people_count']), hall_id=data.get('hall_id'))
+            if not candidate:
+                break
+            
+            # Стол подобран по снимку данных: завершаем чтение, блокируем стол
+            # и перепроверяем, не заняли ли его параллельно
+            db.session.rollback()
+            table = lock_table(candidate.id)
+            if table and not find_conflict(table.id, booking_datetime):
+                break
+            db.session.rollback()
+            table = None
+        
+        if not table:
+            return jsonify({'error': 'Нет свободных столов на это время'}), 409
+    else:
+        # Проверка существования стола (строка блокируется до commit)
+        table = lock_table(data['table_id'])
+        if not table:
+            return jsonify({'error': 'Стол не найден'}), 404
+        
+        # Проверка вместимости
+        if int(data['people_count']) > table.capacity:
+            return jsonify({'error': f'Вместимость стола: {table.capacity} человек'}), 400
+        
+        # Проверка пересечения с другими бронями стола
+        conflict = find_conflict(table.id, booking_datetime)
+        if conflict:
+            return jsonify({
+                'error': 'Стол уже забронирован на это время',
+                'conflict_booking_id': conflict.id
+            }), 409
+    
+    table_id = table.id
+    
     # Создание брони
     new_booking = Booking(
-        table_id=data['table_id'],
+        table_id=table_id,
         status_id=data.get('status_id', 1),
         datetime=booking_datetime,
         guest_name=data['guest_name'],
@@ -76,46 +171,53 @@ def create_booking():
     
     return jsonify({
         'message': 'Бронь создана успешно',
-        'booking_id': new_booking.id
+        'booking_id': new_booking.id,
+        'table_id': table_id
     }), 201
 
 @bookings_bp.route('/<int:booking_id>', methods=['GET'])
 @jwt_required()
 def get_booking(booking_id):
     """Получить информацию о конкретном бронировании"""
-    booking = Booking.query.get(booking_id)
+    row = booking_rows().filter(Booking.id == booking_id).first()
     
-    if not booking:
+    if not row:
         return jsonify({'error': 'Бронь не найдена'}), 404
     
-    table = Table.query.get(booking.table_id)
-    hall = Hall.query.get(table.hall_id) if table else None
-    status = BookingStatus.query.get(booking.status_id)
-    
-    return jsonify({
-        'id': booking.id,
-        'table_id': booking.table_id,
-        'table_number': table.id if table else None,
-        'hall_id': table.hall_id if table else None,
-        'hall_name': hall.name if hall else None,
-        'status_id': booking.status_id,
-        'status_name': status.name if status else None,
-        'datetime': booking.datetime.isoformat() if booking.datetime else None,
-        'guest_name': booking.guest_name,
-        'guest_phone': booking.guest_phone,
-        'people_count': booking.people_count
-    }), 200
+    return jsonify(serialize_booking(row)), 200
 
 @bookings_bp.route('/<int:booking_id>', methods=['PUT'])
 @jwt_required()
 def update_booking(booking_id):
     """Обновить бронирование"""
-    data = request.get_json()
-    booking = Booking.query.get(booking_id)
+    data = request.get_json() or {}
+    
+    booking_datetime = None
+    if 'datetime' in data:
+        try:
+            booking_datetime = parse_datetime(data['datetime'])
+        except ValueError:
+            return jsonify({'error': 'Неверный формат даты'}), 400
     
+    booking = db.session.get(Booking, booking_id)
     if not booking:
         return jsonify({'error': 'Бронь не найдена'}), 404
     
+    # Стол, время или статус меняются - проверяем пересечения под блокировкой стола.
+    # Блокировка берется до остальных чтений: откатываем транзакцию с уже снятым
+    # снимком (REPEATABLE READ) и перечитываем бронь после блокировки
+    check_conflicts = bool({'table_id', 'datetime', 'status_id'} & set(data))
+    if check_conflicts:
+        table_id = data.get('table_id', booking.table_id)
+        db.session.rollback()
+        if not lock_table(table_id):
+            db.session.rollback()
+            return jsonify({'error': 'Стол не найден'}), 404
+        booking = db.session.get(Booking, booking_id)
+        if not booking:
+            db.session.rollback()
+            return jsonify({'error': 'Бронь не найдена'}), 404
+    
     # Обновление полей
     if 'table_id' in data:
         booking.table_id = data['table_id']
@@ -127,11 +229,17 @@ def update_booking(booking_id):
         booking.guest_phone = data['guest_phone']
     if 'people_count' in data:
         booking.people_count = data['people_count']
-    if 'datetime' in data:
-        try:
-            booking.datetime = datetime.fromisoformat(data['datetime'].replace('Z', '+00:00'))
-        except ValueError:
-            return jsonify({'error': 'Неверный формат даты'}), 400
+    if booking_datetime is not None:
+        booking.datetime = booking_datetime
+    
+    if check_conflicts and reference_cache.booking_statuses().get(booking.status_id) != CANCELLED_STATUS:
+        conflict = find_conflict(booking.table_id, booking.datetime, exclude_booking_id=booking.id)
+        if conflict:
+            db.session.rollback()
+            return jsonify({
+                'error': 'Стол уже забронирован на это время',
+                'conflict_booking_id': conflict.id
+            }), 409
     
     db.session.commit()
     
@@ -155,13 +263,11 @@ def delete_booking(booking_id):
 @jwt_required()
 def get_booking_statuses():
     """Получить список статусов бронирования"""
-    statuses = BookingStatus.query.all()
-    
     result = []
-    for status in statuses:
+    for status_id, name in reference_cache.booking_statuses().items():
         result.append({
-            'id': status.id,
-            'name': status.name
+            'id': status_id,
+            'name': name
         })
     
     return jsonify(result), 200
@@ -169,42 +275,63 @@ def get_booking_statuses():
 @bookings_bp.route('/available-tables', methods=['GET'])
 @jwt_required()
 def get_available_tables():
-    """Получить свободные столы на определенную дату"""
+    """Получить свободные столы на дату (весь день) или время (одна посадка)"""
     date_str = request.args.get('date')
     people_count = request.args.get('people_count', type=int)
+    hall_id = request.args.get('hall_id', type=int)
     
     if not date_str:
         return jsonify({'error': 'Параметр date обязателен'}), 400
     
     try:
-        target_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        start, end, search_until = query_window(date_str)
     except ValueError:
         return jsonify({'error': 'Неверный формат даты'}), 400
     
-    # Находим все столы
-    all_tables = Table.query.all()
-    
-    # Находим забронированные столы на эту дату
-    booked_tables = Booking.query.filter(
-        db.func.DATE(Booking.datetime) == target_date.date()
-    ).all()
-    
-    booked_table_ids = [bt.table_id for bt in booked_tables]
-    
-    # Фильтруем столы
-    available_tables = []
-    for table in all_tables:
-        if table.id not in booked_table_ids:
-            # Фильтр по вместимости, если указан
-            if people_count and table.capacity < people_count:
-                continue
-                
-            hall = Hall.query.get(table.hall_id)
-            available_tables.append({
-                'id': table.id,
-                'hall_id': table.hall_id,
-                'hall_name': hall.name if hall else None,
-                'capacity': table.capacity
-            })
-    
-    return jsonify(available_tables), 200
\ No newline at end of file
+    available_tables = find_tables(
+        start,
+        end,
+        people_count=people_count,
+        hall_id=hall_id,
+        include_busy=request.args.get('include_busy', '').lower() in ('1', 'true'),
+        search_until=search_until
+    )
+    
+    return jsonify(available_tables), 200
+
+
+@bookings_bp.route('/availability-grid', methods=['GET'])
+@jwt_required()
+def get_availability_grid():
+    """Сетка свободных столов по слотам за период (например, на неделю) одним ответом"""
+    from_str = request.args.get('from')
+    to_str = request.args.get('to')
+    people_count = request.args.get('people_count', type=int)
+    hall_id = request.args.get('hall_id', type=int)
+    
+    if not from_str or not to_str:
+        return jsonify({'error': 'Параметры from и to обязательны'}), 400
+    
+    try:
+        start = parse_datetime(from_str)
+        end = parse_datetime(to_str)
+        # Дата без времени в to включает весь день
+        if len(to_str) == 10:
+            end += timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'Неверный формат даты'}), 400
+    
+    try:
+        slot = parse_slot(request.args.get('slot', '30m'))
+    except ValueError:
+        return jsonify({'error': 'Неверный шаг сетки. Пример: 30m, 1h'}), 400
+    
+    if end <= start:
+        return jsonify({'error': 'Дата to должна быть позже from'}), 400
+    
+    if end - start > timedelta(days=31):
+        return jsonify({'error': 'Период не может превышать 31 день'}), 400
+    
+    grid = availability_grid(start, end, slot, people_count=people_count, hall_id=hall_id)
+    
+    return jsonify(grid), 200
@@ -1,10 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, current_app
 from flask_jwt_extended import jwt_required, get_jwt
 from models import Sale, Dish, Order, Table
 from database import db
+from kitchen import KITCHEN_CHANNEL, kitchen_queue, publish_sale_ready, publish_order_ready
+import events
+import json
 
 chef_bp = Blueprint('chef', __name__)
 
+def id_list(value):
+    """Список целых идентификаторов (bool в JSON - не число)"""
+    return isinstance(value, list) and all(
+        isinstance(item, int) and not isinstance(item, bool) for item in value)
+
 @chef_bp.route('/orders', methods=['GET'])
 @jwt_required()
 def get_chef_orders():
@@ -17,42 +25,9 @@ def get_chef_orders():
         if user_position not in ['Повар', 'Администратор']:
             return jsonify({'error': 'Доступ запрещен. Только для поваров и администраторов.'}), 403
         
-        # Получаем все неготовые блюда из активных заказов
-        sales = Sale.query\
-            .join(Dish, Sale.dish_id == Dish.id)\
-            .join(Order, Sale.order_id == Order.id)\
-            .join(Table, Order.table_id == Table.id)\
-            .filter(
-                Sale.is_ready == False,
-                Order.is_active == True
-            )\
-            .add_columns(
-                Sale.id,
-                Sale.order_id,
-                Sale.dish_id,
-                Sale.quantity,
-                Sale.is_ready,
-                Dish.name.label('dish_name'),
-                Dish.composition,
-                Dish.weight_grams,
-                Table.id.label('table_number')
-            )\
-            .order_by(Sale.order_id)\
-            .all()
-        
-        result = []
-        for sale in sales:
-            result.append({
-                'id': sale.id,
-                'order_id': sale.order_id,
-                'dish_id': sale.dish_id,
-                'dish_name': sale.dish_name,
-                'composition': sale.composition,
-                'weight_grams': sale.weight_grams,
-                'quantity': sale.quantity,
-                'is_ready': sale.is_ready,
-                'table_number': sale.table_number
-            })
+        # Неготовые блюда из активных заказов берем из очереди в памяти
+        kitchen_queue.reconcile_if_stale(current_app.config['KITCHEN_RECONCILE_SECONDS'])
+        result = kitchen_queue.snapshot()
         
         return jsonify(result), 200
         
@@ -85,6 +60,8 @@ def mark_dish_as_ready(sale_id):
         sale.is_ready = True
         db.session.commit()
         
+        publish_sale_ready(sale.order_id, sale.id)
+        
         # Получаем информацию о блюде для ответа
         dish = Dish.query.get(sale.dish_id)
         
@@ -117,29 +94,149 @@ def mark_all_dishes_ready(order_id):
         if not order or not order.is_active:
             return jsonify({'error': 'Заказ не найден или уже закрыт'}), 404
         
-        # Находим все неготовые блюда в заказе
-        pending_sales = Sale.query.filter_by(
-            order_id=order_id,
-            is_ready=False
-        ).all()
+        # Отмечаем все неготовые блюда одним UPDATE
+        marked_count = Sale.query\
+            .filter(Sale.order_id == order_id, Sale.is_ready == False)\
+            .update({Sale.is_ready: True}, synchronize_session=False)
         
-        if not pending_sales:
+        if not marked_count:
+            db.session.rollback()
             return jsonify({'error': 'Нет неготовых блюд в заказе'}), 400
         
-        # Отмечаем все как готовые
-        for sale in pending_sales:
-            sale.is_ready = True
-        
         db.session.commit()
         
+        publish_order_ready(order_id)
+        
         return jsonify({
             'success': True,
             'message': f'Все блюда в заказе #{order_id} отмечены как готовые',
             'order_id': order_id,
-            'marked_count': len(pending_sales)
+            'marked_count': marked_count
         }), 200
         
     except Exception as e:
         db.session.rollback()
         print(f"Ошибка при массовом обновлении статуса блюд: {e}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@chef_bp.route('/orders/ready', methods=['POST'])
+@jwt_required()
+def mark_many_ready():
+    """Отметить готовыми блюда нескольких заказов (order_ids) или отдельные блюда (sale_ids)"""
+    try:
+        claims = get_jwt()
+        user_position = claims.get('position', 'unknown')
+        
+        if user_position not in ['Повар', 'Администратор']:
+            return jsonify({'error': 'Доступ запрещен. Только для поваров и администраторов.'}), 403
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Тело запроса должно быть объектом JSON'}), 400
+        
+        order_ids = data.get('order_ids') or []
+        sale_ids = data.get('sale_ids') or []
+        
+        # Строка "12" иначе превратилась бы в заказы 1 и 2
+        if not id_list(order_ids) or not id_list(sale_ids):
+            return jsonify({'error': 'order_ids и sale_ids - списки целых чисел'}), 400
+        
+        if not order_ids and not sale_ids:
+            return jsonify({'error': 'Укажите order_ids или sale_ids'}), 400
+        
+        active_orders = db.select(Order.id).where(Order.is_active == True)
+        
+        # Отдельные блюда: нужны их заказы для событий кухни
+        ready_sales = []
+        if sale_ids:
+            ready_sales = db.session.query(Sale.id, Sale.order_id).filter(
+                Sale.id.in_(sale_ids),
+                Sale.is_ready == False,
+                Sale.order_id.in_(active_orders)
+            ).all()
+        
+        conditions = []
+        if order_ids:
+            conditions.append(Sale.order_id.in_(order_ids))
+        if ready_sales:
+            conditions.append(Sale.id.in_([sale.id for sale in ready_sales]))
+        
+        marked_count = 0
+        if conditions:
+            marked_count = Sale.query\
+                .filter(
+                    db.or_(*conditions),
+                    Sale.is_ready == False,
+                    Sale.order_id.in_(active_orders)
+                )\
+                .update({Sale.is_ready: True}, synchronize_session=False)
+        
+        db.session.commit()
+        
+        for order_id in order_ids:
+            publish_order_ready(order_id)
+        for sale in ready_sales:
+            if sale.order_id not in order_ids:
+                publish_sale_ready(sale.order_id, sale.id)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Отмечено готовыми блюд: {marked_count}',
+            'marked_count': marked_count
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Ошибка при массовом обновлении статуса блюд: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@chef_bp.route('/orders/metrics', methods=['GET'])
+@jwt_required()
+def get_kitchen_queue_metrics():
+    """Размер и свежесть очереди кухни в памяти"""
+    claims = get_jwt()
+    user_position = claims.get('position', 'unknown')
+    
+    if user_position not in ['Повар', 'Администратор']:
+        return jsonify({'error': 'Доступ запрещен. Только для поваров и администраторов.'}), 403
+    
+    kitchen_queue.ensure_loaded()
+    return jsonify(kitchen_queue.metrics()), 200
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@chef_bp.route('/orders/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_chef_orders():
+    """SSE-поток для экрана кухни: сначала текущая очередь, затем изменения"""
+    claims = get_jwt()
+    user_position = claims.get('position', 'unknown')
+    
+    if user_position not in ['Повар', 'Администратор']:
+        return jsonify({'error': 'Доступ запрещен. Только для поваров и администраторов.'}), 403
+    
+    # Подписываемся до чтения снимка, чтобы не потерять события между ними
+    broker = events.get_broker()
+    subscription = broker.subscribe(KITCHEN_CHANNEL)
+    kitchen_queue.ensure_loaded()
+    snapshot = kitchen_queue.snapshot()
+    keepalive = current_app.config['SSE_KEEPALIVE_SECONDS']
+    
+    def generate():
+        try:
+            yield format_sse('snapshot', snapshot)
+            while not subscription.closed:
+                message = subscription.get(timeout=keepalive)
+                if message is None:
+                    # Комментарий держит соединение открытым через прокси
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(*message)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Employee, Position
 from database import db
+import reference_cache
 import hashlib
 
 employees_bp = Blueprint('employees', __name__)
@@ -11,17 +12,16 @@ employees_bp = Blueprint('employees', __name__)
 def get_employees():
     
     employees = Employee.query.all()
+    position_names = reference_cache.positions()
     
     result = []
     for employee in employees:
-        position = Position.query.get(employee.position_id)
-        
         result.append({
             'id': employee.id,
             'full_name': employee.full_name,
             'login': employee.login,
             'position_id': employee.position_id,
-            'position_name': position.name if position else None,
+            'position_name': position_names.get(employee.position_id),
             'phone': employee.phone,
             'address': employee.address,
             'passport_data': employee.passport_data,
@@ -47,7 +47,7 @@ def create_employee():
     if existing_employee:
         return jsonify({'error': 'Сотрудник с таким логином уже существует'}), 400
     
-    # Проверка существования должности
+    # Проверка существования должности (по БД: кэш другого воркера может отставать)
     position = Position.query.get(data['position_id'])
     if not position:
         return jsonify({'error': 'Должность не найдена'}), 404
@@ -84,14 +84,12 @@ def get_employee(employee_id):
     if not employee:
         return jsonify({'error': 'Сотрудник не найден'}), 404
     
-    position = Position.query.get(employee.position_id)
-    
     return jsonify({
         'id': employee.id,
         'full_name': employee.full_name,
         'login': employee.login,
         'position_id': employee.position_id,
-        'position_name': position.name if position else None,
+        'position_name': reference_cache.positions().get(employee.position_id),
         'phone': employee.phone,
         'address': employee.address,
         'passport_data': employee.passport_data,
@@ -154,13 +152,11 @@ def delete_employee(employee_id):
 @jwt_required()
 def get_positions():
     """Получить список всех должностей"""
-    positions = Position.query.all()
-    
     result = []
-    for position in positions:
+    for position_id, name in reference_cache.positions().items():
         result.append({
-            'id': position.id,
-            'name': position.name
+            'id': position_id,
+            'name': name
         })
     
     return jsonify(result), 200
@@ -183,6 +179,7 @@ def create_position():
     
     db.session.add(new_position)
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({
         'message': 'Должность создана успешно',
@@ -214,6 +211,7 @@ def update_position(position_id):
     
     position.name = data['name']
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({'message': 'Должность обновлена успешно'}), 200
 
@@ -235,5 +233,6 @@ def delete_position(position_id):
     
     db.session.delete(position)
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({'message': 'Должность удалена успешно'}), 200
\ No newline at end of file
@@ -2,7 +2,8 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from models import Hall, Table, Booking
 from database import db
-from datetime import datetime
+import reference_cache
+from availability import find_tables, query_window
 
 halls_bp = Blueprint('halls', __name__)
 
@@ -13,10 +14,13 @@ def get_halls():
     """Получить список всех залов"""
     halls = Hall.query.all()
     
+    # Столы всех залов одним запросом
+    tables_by_hall = {}
+    for table in Table.query.order_by(Table.id):
+        tables_by_hall.setdefault(table.hall_id, []).append(table)
+    
     result = []
     for hall in halls:
-        tables = Table.query.filter_by(hall_id=hall.id).all()
-        
         result.append({
             'id': hall.id,
             'name': hall.name,
@@ -24,7 +28,7 @@ def get_halls():
             'tables': [{
                 'id': table.id,
                 'capacity': table.capacity
-            } for table in tables]
+            } for table in tables_by_hall.get(hall.id, [])]
         })
     
     return jsonify(result), 200
@@ -53,6 +57,7 @@ def create_hall():
     
     db.session.add(new_hall)
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({
         'message': 'Зал создан успешно',
@@ -104,6 +109,7 @@ def update_hall(hall_id):
         hall.table_count = data['table_count']
     
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({'message': 'Информация о зале обновлена успешно'}), 200
 
@@ -130,6 +136,7 @@ def delete_hall(hall_id):
     
     db.session.delete(hall)
     db.session.commit()
+    reference_cache.invalidate()
     
     return jsonify({'message': 'Зал удален успешно'}), 200
 
@@ -146,15 +153,14 @@ def get_tables():
         query = query.filter_by(hall_id=hall_id)
     
     tables = query.all()
+    hall_names = reference_cache.halls()
     
     result = []
     for table in tables:
-        hall = Hall.query.get(table.hall_id)
-        
         result.append({
             'id': table.id,
             'hall_id': table.hall_id,
-            'hall_name': hall.name if hall else None,
+            'hall_name': hall_names.get(table.hall_id),
             'capacity': table.capacity
         })
     
@@ -207,12 +213,10 @@ def get_table(table_id):
     if not table:
         return jsonify({'error': 'Стол не найден'}), 404
     
-    hall = Hall.query.get(table.hall_id)
-    
     return jsonify({
         'id': table.id,
         'hall_id': table.hall_id,
-        'hall_name': hall.name if hall else None,
+        'hall_name': reference_cache.halls().get(table.hall_id),
         'capacity': table.capacity
     }), 200
 
@@ -301,7 +305,7 @@ def delete_table(table_id):
 
 @halls_bp.route('/tables/available', methods=['GET'])
 def get_available_tables():
-    """Получить доступные столы на определенную дату"""
+    """Получить доступные столы на дату (весь день) или время (одна посадка)"""
     date_str = request.args.get('date')
     people_count = request.args.get('people_count', type=int)
     hall_id = request.args.get('hall_id', type=int)
@@ -310,35 +314,17 @@ def get_available_tables():
         return jsonify({'error': 'Параметр date обязателен'}), 400
     
     try:
-        target_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        start, end, search_until = query_window(date_str)
     except ValueError:
         return jsonify({'error': 'Неверный формат даты'}), 400
     
-    query = Table.query
-    
-    if hall_id:
-        query = query.filter_by(hall_id=hall_id)
-    
-    if people_count:
-        query = query.filter(Table.capacity >= people_count)
-    
-    all_tables = query.all()
-    
-    booked_tables = Booking.query.filter(
-        db.func.DATE(Booking.datetime) == target_date.date()
-    ).all()
-    
-    booked_table_ids = [bt.table_id for bt in booked_tables]
-    
-    available_tables = []
-    for table in all_tables:
-        if table.id not in booked_table_ids:
-            hall = Hall.query.get(table.hall_id)
-            available_tables.append({
-                'id': table.id,
-                'hall_id': table.hall_id,
-                'hall_name': hall.name if hall else None,
-                'capacity': table.capacity
-            })
+    available_tables = find_tables(
+        start,
+        end,
+        people_count=people_count,
+        hall_id=hall_id,
+        include_busy=request.args.get('include_busy', '').lower() in ('1', 'true'),
+        search_until=search_until
+    )
     
-    return jsonify(available_tables), 200
\ No newline at end of file
+    return jsonify(available_tables), 200
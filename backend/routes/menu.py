@@ -1,10 +1,34 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from models import Dish, DishCategory
+from models import Dish, DishCategory, MenuChange
 from database import db
+import reference_cache
+from routes.utils import get_page_limit
+from menu_snapshot import menu_snapshot, serialize_dish, current_menu_version, bump_menu_version, menu_changes
 
 menu_bp = Blueprint('menu', __name__)
 
+
+def snapshot_response(payload):
+    """Готовые байты снимка меню с ETag; 304, если у клиента та же версия"""
+    response = current_app.response_class(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    # С этой версии клиент дальше синхронизируется через /changes
+    response.headers['X-Menu-Version'] = str(payload.menu_version)
+    # Клиент хранит ответ, но каждый раз сверяет ETag с сервером
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def log_menu_change(entity, entity_id, action):
+    """Запись в журнал изменений меню в той же транзакции, что и само изменение"""
+    db.session.add(MenuChange(version=bump_menu_version(), entity=entity, entity_id=entity_id, action=action))
+
+
+def menu_changed():
+    """Вызывается после commit в маршрутах, меняющих блюда или категории"""
+    menu_snapshot.invalidate()
+
 # ===================== Категории =====================
 
 @menu_bp.route('/categories', methods=['GET', 'OPTIONS'])
@@ -17,16 +41,7 @@ def get_categories():
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
         return response, 200
     
-    categories = DishCategory.query.all()
-    
-    result = []
-    for category in categories:
-        result.append({
-            'id': category.id,
-            'name': category.name
-        })
-    
-    return jsonify(result), 200
+    return snapshot_response(menu_snapshot.categories())
 
 @menu_bp.route('/categories', methods=['POST', 'OPTIONS'])
 @jwt_required()
@@ -47,7 +62,11 @@ def create_category():
     new_category = DishCategory(name=data['name'])
     
     db.session.add(new_category)
+    db.session.flush()
+    log_menu_change('category', new_category.id, 'create')
     db.session.commit()
+    reference_cache.invalidate()
+    menu_changed()
     
     return jsonify({
         'message': 'Категория создана успешно',
@@ -75,7 +94,10 @@ def update_category(category_id):
     if 'name' in data:
         category.name = data['name']
     
+    log_menu_change('category', category.id, 'update')
     db.session.commit()
+    reference_cache.invalidate()
+    menu_changed()
     
     return jsonify({'message': 'Категория обновлена успешно'}), 200
 
@@ -101,10 +123,36 @@ def delete_category(category_id):
         return jsonify({'error': 'Нельзя удалить категорию, в которой есть блюда'}), 400
     
     db.session.delete(category)
+    log_menu_change('category', category_id, 'delete')
     db.session.commit()
+    reference_cache.invalidate()
+    menu_changed()
     
     return jsonify({'message': 'Категория удалена успешно'}), 200
 
+# ===================== Синхронизация =====================
+
+@menu_bp.route('/changes', methods=['GET', 'OPTIONS'])
+def get_menu_changes():
+    """Изменения меню после версии since (версия - из X-Menu-Version или прошлого ответа)"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'CORS preflight'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+        return response, 200
+    
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'Параметр since обязателен (неотрицательное число)'}), 400
+    
+    version = current_menu_version()
+    if since > version:
+        # Версия клиента из другой базы (например, после восстановления) - нужна полная загрузка
+        return jsonify({'error': 'Неизвестная версия меню, загрузите меню заново', 'version': version}), 409
+    
+    return jsonify(menu_changes(since, version)), 200
+
 # ===================== Блюда =====================
 
 @menu_bp.route('/dishes', methods=['GET', 'OPTIONS'])
@@ -119,29 +167,23 @@ def get_dishes():
     
     category_id = request.args.get('category_id', type=int)
     
-    query = Dish.query
-    
-    if category_id:
-        query = query.filter_by(category_id=category_id)
-    
-    dishes = query.all()
-    
-    result = []
-    for dish in dishes:
-        category = DishCategory.query.get(dish.category_id)
-        
-        result.append({
-            'id': dish.id,
-            'name': dish.name,
-            'composition': dish.composition,
-            'price': float(dish.price) if dish.price else 0,
-            'category_id': dish.category_id,
-            'category_name': category.name if category else None,
-            'weight_grams': dish.weight_grams,
-            'is_available': dish.is_available
-        })
-    
-    return jsonify(result), 200
+    return snapshot_response(menu_snapshot.dishes(category_id))
+
+@menu_bp.route('/dishes/search', methods=['GET', 'OPTIONS'])
+def search_dishes():
+    """Поиск блюд по началу слов названия и состава, с опечатками"""
+    if request.method == 'OPTIONS':
+        response = jsonify({'message': 'CORS preflight'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+        return response, 200
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Параметр q обязателен'}), 400
+    
+    return jsonify(menu_snapshot.search(query, get_page_limit(default=20, maximum=100))), 200
 
 @menu_bp.route('/dishes', methods=['POST', 'OPTIONS'])
 @jwt_required()
@@ -161,7 +203,7 @@ def create_dish():
         if field not in data:
             return jsonify({'error': f'Поле {field} обязательно'}), 400
     
-    # Проверка существования категории
+    # Проверка существования категории (по БД: кэш другого воркера может отставать)
     category = DishCategory.query.get(data['category_id'])
     if not category:
         return jsonify({'error': 'Категория не найдена'}), 404
@@ -176,7 +218,10 @@ def create_dish():
     )
     
     db.session.add(new_dish)
+    db.session.flush()
+    log_menu_change('dish', new_dish.id, 'create')
     db.session.commit()
+    menu_changed()
     
     return jsonify({
         'message': 'Блюдо создано успешно',
@@ -198,18 +243,7 @@ def get_dish(dish_id):
     if not dish:
         return jsonify({'error': 'Блюдо не найдено'}), 404
     
-    category = DishCategory.query.get(dish.category_id)
-    
-    return jsonify({
-        'id': dish.id,
-        'name': dish.name,
-        'composition': dish.composition,
-        'price': float(dish.price) if dish.price else 0,
-        'category_id': dish.category_id,
-        'category_name': category.name if category else None,
-        'weight_grams': dish.weight_grams,
-        'is_available': dish.is_available
-    }), 200
+    return jsonify(serialize_dish(dish, reference_cache.categories())), 200
 
 @menu_bp.route('/dishes/<int:dish_id>', methods=['PUT', 'OPTIONS'])
 @jwt_required()
@@ -246,7 +280,9 @@ def update_dish(dish_id):
     if 'is_available' in data:
         dish.is_available = data['is_available']
     
+    log_menu_change('dish', dish.id, 'update')
     db.session.commit()
+    menu_changed()
     
     return jsonify({'message': 'Блюдо обновлено успешно'}), 200
 
@@ -269,7 +305,9 @@ def delete_dish(dish_id):
     # TODO: Проверка, есть ли это блюдо в активных заказах
     
     db.session.delete(dish)
+    log_menu_change('dish', dish_id, 'delete')
     db.session.commit()
+    menu_changed()
     
     return jsonify({'message': 'Блюдо удалено успешно'}), 200
 
@@ -290,7 +328,9 @@ def toggle_dish_availability(dish_id):
         return jsonify({'error': 'Блюдо не найдено'}), 404
     
     dish.is_available = not dish.is_available
+    log_menu_change('dish', dish.id, 'update')
     db.session.commit()
+    menu_changed()
     
     return jsonify({
         'message': 'Доступность блюда изменена',
@@ -3,40 +3,178 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from models import Order, Sale, Dish, Table, Employee
 from database import db
 from datetime import datetime
+from decimal import Decimal
+from kitchen import publish_order_items, publish_order_closed
+from sales_rollup import rollup_order
+from routes.utils import encode_cursor, decode_cursor, get_page_limit, day_window
 
 orders_bp = Blueprint('orders', __name__)
 
+def resolve_order_items(items):
+    """Свести позиции заказа к {dish_id: quantity} и загрузить доступные блюда одним IN-запросом"""
+    quantities = {}
+    for item in items:
+        # Позиция - объект {dish_id, quantity}; иное - ошибка формата (400)
+        if not isinstance(item, dict):
+            raise ValueError('Позиция заказа должна быть объектом')
+        if not item.get('dish_id'):
+            continue
+        
+        # Некорректные значения -> ValueError/TypeError, обрабатывается в маршруте
+        dish_id = int(item['dish_id'])
+        quantity = int(item.get('quantity', 1))
+        
+        if quantity <= 0:
+            continue
+        
+        # Повторяющиеся строки с одним блюдом объединяем
+        quantities[dish_id] = quantities.get(dish_id, 0) + quantity
+    
+    if not quantities:
+        return quantities, {}
+    
+    dishes = Dish.query.filter(
+        Dish.id.in_(quantities.keys()),
+        Dish.is_available == True
+    ).all()
+    
+    return quantities, {dish.id: dish for dish in dishes}
+
+def build_sale_rows(quantities, dishes):
+    """Строки для вставки в sale и точная сумма в Decimal (недоступные блюда пропускаются)"""
+    rows = []
+    total_amount = Decimal('0.00')
+    
+    for dish_id, quantity in quantities.items():
+        dish = dishes.get(dish_id)
+        if not dish:
+            continue
+        
+        # Цена фиксируется в продаже: последующее изменение меню не меняет заказ
+        line_total = Decimal(dish.price) * quantity
+        rows.append({
+            'dish_id': dish_id,
+            'quantity': quantity,
+            'is_ready': False,
+            'unit_price': dish.price,
+            'line_total': line_total
+        })
+        total_amount += line_total
+    
+    return rows, total_amount
+
+def order_lines(order_id):
+    """Позиции заказа по ценам на момент заказа; из dish берется только название"""
+    return orders_lines([order_id]).get(order_id, [])
+
+def orders_lines(order_ids):
+    """Позиции нескольких заказов одним запросом: {order_id: [позиции]}"""
+    sales = db.session.query(
+            Sale.order_id,
+            Sale.dish_id,
+            Dish.name,
+            Sale.quantity,
+            Sale.unit_price,
+            Sale.line_total
+        )\
+        .join(Dish, Sale.dish_id == Dish.id)\
+        .filter(Sale.order_id.in_(order_ids))\
+        .order_by(Sale.order_id, Sale.id)\
+        .all()
+    
+    lines = {}
+    for order_id, dish_id, dish_name, quantity, unit_price, line_total in sales:
+        lines.setdefault(order_id, []).append({
+            'dish_id': dish_id,
+            'dish_name': dish_name,
+            'quantity': quantity,
+            'price': Decimal(unit_price or 0),
+            'subtotal': Decimal(line_total or 0)
+        })
+    return lines
+
+def increment_order_total(order_id, delta):
+    """total_amount = total_amount + delta одним UPDATE, чтобы параллельные добавления не терялись.
+
+    Обновляет только открытый заказ и возвращает число строк: 0 - заказ уже закрыт.
+    Строка заказа остается заблокированной до commit, поэтому параллельное закрытие
+    дождется добавления и учтет его продажи в своде.
+    """
+    return Order.query\
+        .filter(Order.id == order_id, Order.is_active == True)\
+        .update(
+            {Order.total_amount: db.func.coalesce(Order.total_amount, 0) + delta},
+            synchronize_session=False
+        )
+
 @orders_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_orders():
-    """Получить все заказы"""
-    current_user = get_jwt_identity()
-    
-    query = Order.query
+    """Получить заказы постранично (курсор по order_datetime, id)"""
+    claims = get_jwt()
+    user_id = int(get_jwt_identity())
+    limit = get_page_limit()
+    
+    # Количество блюд считаем в SQL, чтобы не подгружать order.sales для каждого заказа
+    item_count = db.select(db.func.coalesce(db.func.sum(Sale.quantity), 0))\
+        .where(Sale.order_id == Order.id)\
+        .scalar_subquery()
+    
+    # Стол и официант подтягиваются тем же запросом
+    query = db.session.query(
+        Order,
+        Table.id.label('table_number'),
+        Employee.full_name.label('employee_name'),
+        item_count.label('item_count')
+    )\
+        .outerjoin(Table, Order.table_id == Table.id)\
+        .outerjoin(Employee, Order.employee_id == Employee.id)
     
     # Если пользователь не администратор, показываем только его заказы
-    if current_user.get('position') != 'Администратор':
-        query = query.filter_by(employee_id=current_user['id'])
-    
-    orders = query.order_by(Order.order_datetime.desc()).all()
+    if claims.get('position') != 'Администратор':
+        query = query.filter(Order.employee_id == user_id)
+    
+    # Keyset-пагинация: следующая страница начинается строго после последней записи
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_datetime, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Неверный курсор'}), 400
+        query = query.filter(db.or_(
+            Order.order_datetime < cursor_datetime,
+            db.and_(Order.order_datetime == cursor_datetime, Order.id < cursor_id)
+        ))
+    
+    rows = query.order_by(Order.order_datetime.desc(), Order.id.desc())\
+        .limit(limit + 1)\
+        .all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
     result = []
-    for order in orders:
-        table = Table.query.get(order.table_id)
-        employee = Employee.query.get(order.employee_id)
-        
+    for order, table_number, employee_name, order_item_count in rows:
         result.append({
             'id': order.id,
             'table_id': order.table_id,
-            'table_number': table.id if table else None,
+            'table_number': table_number,
             'employee_id': order.employee_id,
-            'employee_name': employee.full_name if employee else None,
+            'employee_name': employee_name,
             'order_datetime': order.order_datetime.isoformat() if order.order_datetime else None,
             'total_amount': float(order.total_amount) if order.total_amount else None,
-            'item_count': sum(sale.quantity for sale in order.sales)
+            'item_count': int(order_item_count)
         })
     
-    return jsonify(result), 200
+    next_cursor = None
+    if has_more:
+        last_order = rows[-1][0]
+        next_cursor = encode_cursor(last_order.order_datetime, last_order.id)
+    
+    return jsonify({
+        'orders': result,
+        'next_cursor': next_cursor
+    }), 200
 
 @orders_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -60,50 +198,38 @@ def create_order():
     if not data['items'] or len(data['items']) == 0:
         return jsonify({'error': 'Заказ должен содержать хотя бы одно блюдо'}), 400
     
+    # Все блюда заказа одним запросом
+    try:
+        quantities, dishes = resolve_order_items(data['items'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Неверный формат позиций заказа'}), 400
+    sale_rows, total_amount = build_sale_rows(quantities, dishes)
+    
     # Создание заказа
     new_order = Order(
         table_id=data['table_id'],
-        employee_id=current_user
+        employee_id=current_user,
+        total_amount=total_amount
     )
     
     db.session.add(new_order)
     db.session.flush()  # Получаем ID заказа
     
-    total_amount = 0
-    
-    # Добавляем блюда в заказ
-    for item in data['items']:
-        dish_id = item.get('dish_id')
-        quantity = item.get('quantity', 1)
-        
-        if not dish_id:
-            continue
-        
-        dish = Dish.query.get(dish_id)
-        if not dish or not dish.is_available:
-            continue
-        
-        # Создаем запись о продаже
-        sale = Sale(
-            order_id=new_order.id,
-            dish_id=dish_id,
-            quantity=quantity
-        )
-        
-        db.session.add(sale)
-        
-        # Считаем общую сумму
-        total_amount += float(dish.price) * quantity
-    
-    # Обновляем общую сумму заказа
-    new_order.total_amount = total_amount
+    # Добавляем блюда в заказ одной вставкой
+    if sale_rows:
+        for row in sale_rows:
+            row['order_id'] = new_order.id
+        db.session.execute(db.insert(Sale), sale_rows)
     
     db.session.commit()
     
+    if sale_rows:
+        publish_order_items(new_order.id)
+    
     return jsonify({
         'message': 'Заказ создан успешно',
         'order_id': new_order.id,
-        'total_amount': total_amount
+        'total_amount': float(total_amount)
     }), 201
 
 @orders_bp.route('/<int:order_id>', methods=['GET'])
@@ -115,26 +241,21 @@ def get_order(order_id):
     if not order:
         return jsonify({'error': 'Заказ не найден'}), 404
     
-    # Проверка прав доступа
-    current_user = get_jwt_identity()
-    if current_user.get('position') != 'Администратор' and order.employee_id != current_user['id']:
+    # Проверка прав доступа (identity - строка с id, должность - в claims)
+    if get_jwt().get('position') != 'Администратор' and order.employee_id != int(get_jwt_identity()):
         return jsonify({'error': 'Доступ запрещен'}), 403
     
     table = Table.query.get(order.table_id)
     employee = Employee.query.get(order.employee_id)
     
-    # Получаем блюда в заказе
-    order_items = []
-    for sale in order.sales:
-        dish = Dish.query.get(sale.dish_id)
-        if dish:
-            order_items.append({
-                'dish_id': dish.id,
-                'dish_name': dish.name,
-                'price': float(dish.price) if dish.price else None,
-                'quantity': sale.quantity,
-                'subtotal': float(dish.price) * sale.quantity if dish.price else None
-            })
+    # Получаем блюда в заказе одним запросом, по ценам на момент заказа
+    order_items = [{
+        'dish_id': line['dish_id'],
+        'dish_name': line['dish_name'],
+        'price': float(line['price']),
+        'quantity': line['quantity'],
+        'subtotal': float(line['subtotal'])
+    } for line in order_lines(order.id)]
     
     return jsonify({
         'id': order.id,
@@ -151,18 +272,25 @@ def get_order(order_id):
 @jwt_required()
 def close_order(order_id):
     """Закрыть заказ (для печати чека)"""
+    # Условный UPDATE: при повторном или одновременном закрытии продажи
+    # не попадут в свод дважды. Он идет первым, до любого чтения: если заказ
+    # сейчас дополняется, UPDATE дождется commit, и свод увидит новые продажи
+    closed = Order.query\
+        .filter(Order.id == order_id, Order.is_active == True)\
+        .update({Order.is_active: False}, synchronize_session=False)
+    
     order = Order.query.get(order_id)
     
     if not order:
         return jsonify({'error': 'Заказ не найден'}), 404
     
-    order.is_active = False
-    
-    # Здесь будет логика генерации PDF чека
-    # Пока просто возвращаем успех
+    if closed:
+        rollup_order(order.id, order.order_datetime)
     
     db.session.commit()
     
+    publish_order_closed(order.id)
+    
     return jsonify({
         'message': 'Заказ закрыт успешно',
         'order_id': order.id,
@@ -182,6 +310,9 @@ def add_item_to_order(order_id):
     if not data or not data.get('dish_id'):
         return jsonify({'error': 'ID блюда обязательно'}), 400
     
+    if not order.is_active:
+        return jsonify({'error': 'Заказ уже закрыт'}), 400
+    
     dish_id = data['dish_id']
     quantity = data.get('quantity', 1)
     
@@ -189,26 +320,89 @@ def add_item_to_order(order_id):
     if not dish or not dish.is_available:
         return jsonify({'error': 'Блюдо не найдено или недоступно'}), 404
     
-    # Добавляем блюдо в заказ
+    # Сумма меняется атомарно в SQL и только у открытого заказа: закрытие могло
+    # пройти после проверки выше, тогда продажа не попала бы в свод
+    line_total = Decimal(dish.price) * quantity
+    if not increment_order_total(order.id, line_total):
+        db.session.rollback()
+        return jsonify({'error': 'Заказ уже закрыт'}), 400
+    
+    # Добавляем блюдо в заказ по текущей цене
     sale = Sale(
         order_id=order.id,
         dish_id=dish_id,
-        quantity=quantity
+        quantity=quantity,
+        unit_price=dish.price,
+        line_total=line_total
     )
     
     db.session.add(sale)
-    
-    # Обновляем общую сумму
-    order.total_amount = (float(order.total_amount) if order.total_amount else 0) + (float(dish.price) * quantity)
-    
     db.session.commit()
     
+    publish_order_items(order.id)
+    
     return jsonify({
         'message': 'Блюдо добавлено в заказ',
         'order_id': order.id,
         'dish_name': dish.name,
         'quantity': quantity,
-        'added_amount': float(dish.price) * quantity
+        'added_amount': float(line_total)
+    }), 200
+
+@orders_bp.route('/<int:order_id>/items', methods=['POST'])
+@jwt_required()
+def add_items_to_order(order_id):
+    """Добавить несколько блюд в открытый заказ одной транзакцией"""
+    data = request.get_json()
+    order = Order.query.get(order_id)
+    
+    if not order:
+        return jsonify({'error': 'Заказ не найден'}), 404
+    
+    if not order.is_active:
+        return jsonify({'error': 'Заказ уже закрыт'}), 400
+    
+    if not data or not data.get('items'):
+        return jsonify({'error': 'Список блюд обязателен'}), 400
+    
+    try:
+        quantities, dishes = resolve_order_items(data['items'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Неверный формат позиций заказа'}), 400
+    
+    if not quantities:
+        return jsonify({'error': 'Список блюд обязателен'}), 400
+    
+    # Всё или ничего: если хотя бы одно блюдо недоступно, заказ не меняется
+    missing_ids = [dish_id for dish_id in quantities if dish_id not in dishes]
+    if missing_ids:
+        return jsonify({
+            'error': 'Блюдо не найдено или недоступно',
+            'dish_ids': missing_ids
+        }), 404
+    
+    sale_rows, added_amount = build_sale_rows(quantities, dishes)
+    for row in sale_rows:
+        row['order_id'] = order.id
+    
+    # Закрытие могло пройти после проверки выше: сумма меняется только у открытого заказа
+    if not increment_order_total(order.id, added_amount):
+        db.session.rollback()
+        return jsonify({'error': 'Заказ уже закрыт'}), 400
+    
+    db.session.execute(db.insert(Sale), sale_rows)
+    db.session.commit()
+    
+    publish_order_items(order.id)
+    
+    total_amount = db.session.query(Order.total_amount).filter_by(id=order.id).scalar()
+    
+    return jsonify({
+        'message': 'Блюда добавлены в заказ',
+        'order_id': order.id,
+        'added_count': len(sale_rows),
+        'added_amount': float(added_amount),
+        'total_amount': float(total_amount)
     }), 200
 
 @orders_bp.route('/active', methods=['GET'])
@@ -229,9 +423,10 @@ def get_active_orders():
         query = query.filter_by(employee_id=user_id)
     
     # Заказы за сегодня
-    today = datetime.now().date()
+    day_start, day_end = day_window(datetime.now().date())
     orders = query.filter(
-        db.func.DATE(Order.order_datetime) == today
+        Order.order_datetime >= day_start,
+        Order.order_datetime < day_end
     ).order_by(Order.order_datetime.desc()).all()
     
     result = []
@@ -0,0 +1,92 @@
+from flask import Blueprint, request, jsonify, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from models import Order
+from database import db
+from routes.reports import parse_report_period, sales_report_data, queue_full_response
+from routes.receipts import can_view_order, receipt_data
+from pdf_jobs import pdf_job_queue, QueueFull
+
+pdf_jobs_bp = Blueprint('pdf_jobs', __name__)
+
+# Дольше держать соединение при опросе не даем
+MAX_WAIT_SECONDS = 30
+
+def job_response(meta):
+    job = dict(meta)
+    job['status_url'] = url_for('pdf_jobs.get_job', job_id=meta['id'])
+    job['download_url'] = url_for('pdf_jobs.download_job', job_id=meta['id']) if meta['status'] == 'done' else None
+    return job
+
+def find_job(job_id, wait=0):
+    """Задача и ошибка доступа (ответ) - одно из двух"""
+    meta = pdf_job_queue.get(job_id, wait=wait)
+    if not meta:
+        return None, (jsonify({'error': 'Задача не найдена'}), 404)
+    if get_jwt().get('position') != 'Администратор' and meta['owner_id'] != int(get_jwt_identity()):
+        return None, (jsonify({'error': 'Доступ запрещен'}), 403)
+    return meta, None
+
+@pdf_jobs_bp.route('/', methods=['POST'])
+@jwt_required()
+def create_job():
+    """Поставить PDF в очередь: отчет по продажам или чек.
+
+    {"kind": "sales_report", "start_date": ..., "end_date": ...}
+    {"kind": "receipt", "order_id": ...}
+    """
+    data = request.get_json() or {}
+    kind = data.get('kind')
+
+    if kind == 'sales_report':
+        try:
+            start_date, end_date = parse_report_period(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        render_data = sales_report_data(start_date, end_date)
+        filename = f'отчет_продаж_{start_date}_{end_date}.pdf'
+    elif kind == 'receipt':
+        order = db.session.get(Order, data.get('order_id') or 0)
+        if not order:
+            return jsonify({'error': 'Заказ не найден'}), 404
+        if not can_view_order(order):
+            return jsonify({'error': 'Доступ запрещен'}), 403
+        render_data = receipt_data(order)
+        filename = f'чек_{order.id}.pdf'
+    else:
+        return jsonify({'error': 'Поле kind должно быть sales_report или receipt'}), 400
+
+    try:
+        meta = pdf_job_queue.submit(kind, render_data, filename, owner_id=int(get_jwt_identity()))
+    except QueueFull:
+        return queue_full_response()
+
+    job = job_response(meta)
+    response = jsonify(job)
+    response.headers['Location'] = job['status_url']
+    return response, 202
+
+@pdf_jobs_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Статус задачи; ?wait=N - подождать завершения до N секунд"""
+    wait = max(0, min(request.args.get('wait', 0, type=int), MAX_WAIT_SECONDS))
+    meta, error = find_job(job_id, wait=wait)
+    if error:
+        return error
+    return jsonify(job_response(meta)), 200
+
+@pdf_jobs_bp.route('/<job_id>/file', methods=['GET'])
+@jwt_required()
+def download_job(job_id):
+    """Скачать готовый PDF"""
+    meta, error = find_job(job_id)
+    if error:
+        return error
+    if meta['status'] != 'done':
+        return jsonify({'error': 'Документ еще не готов', 'status': meta['status']}), 409
+    return send_file(
+        pdf_job_queue.file_path(job_id),
+        as_attachment=True,
+        download_name=meta['filename'],
+        mimetype='application/pdf'
+    )
@@ -1,250 +1,251 @@
-from flask import Blueprint, send_file, jsonify
+from flask import Blueprint, request, send_file, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from models import Order, Sale, Dish, Table as RestaurantTable, Employee
+from models import Order, Table as RestaurantTable, Employee
+from routes.orders import order_lines, orders_lines
+from routes.utils import day_window
+from routes.reports import queue_full_response
+from pdf_jobs import pdf_job_queue, QueueFull
+from receipt_cache import receipt_cache, receipt_digest
+from thermal_receipt import render_text, render_escpos
+from zip_stream import stream_zip, file_chunks
 from database import db
+from collections import deque
 from datetime import datetime
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.fonts import addMapping
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import os
+import time
 
 receipts_bp = Blueprint('receipts', __name__)
 
-# Регистрируем русские шрифты
-def register_russian_fonts():
-    try:
-        font_paths = [
-            'C:/Windows/Fonts/arial.ttf',
-            'C:/Windows/Fonts/arialbd.ttf',
-            'C:/Windows/Fonts/tahoma.ttf',
-            'C:/Windows/Fonts/tahomabd.ttf', 
-        ]
-        
-        registered = False
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    # Регистрируем обычный шрифт
-                    pdfmetrics.registerFont(TTFont('Arial', font_path))
-                    
-                    # Пробуем найти bold версию
-                    base_path = os.path.splitext(font_path)[0]
-                    bold_path = base_path + 'bd.ttf'  # arialbd.ttf
-                    if os.path.exists(bold_path):
-                        pdfmetrics.registerFont(TTFont('Arial-Bold', bold_path))
-                        addMapping('Arial', 0, 0, 'Arial')
-                        addMapping('Arial', 1, 0, 'Arial-Bold')
-                    else:
-                        # Если нет отдельного bold файла, используем тот же
-                        pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
-                        addMapping('Arial', 0, 0, 'Arial')
-                        addMapping('Arial', 1, 0, 'Arial-Bold')
-                    
-                    registered = True
-                    break
-                    
-                except Exception as e:
-                    continue
-        return registered
-        
-    except Exception as e:
-        return False
+# Предел заказов в одной пакетной выгрузке
+BATCH_MAX_ORDERS = 2000
+# Заказов на одну страницу выборки при потоковой выгрузке
+BATCH_PAGE_ORDERS = 100
+
+def can_view_order(order):
+    """Администратор видит все заказы, официант - только свои"""
+    return get_jwt().get('position') == 'Администратор' or order.employee_id == int(get_jwt_identity())
+
+def receipt_data(order, lines=None):
+    """Данные чека для рендереров (только простые типы); lines - уже загруженные позиции"""
+    table = db.session.get(RestaurantTable, order.table_id)
+    employee = db.session.get(Employee, order.employee_id)
 
-# Регистрируем шрифты
-register_russian_fonts()
+    # Блюда заказа по ценам на момент заказа
+    order_items = [{
+        'name': line['dish_name'],
+        'quantity': line['quantity'],
+        'price': float(line['price']),
+        'subtotal': float(line['subtotal'])
+    } for line in (order_lines(order.id) if lines is None else lines)]
+
+    return {
+        'order_id': order.id,
+        'table_number': table.id if table else None,
+        'employee_name': employee.full_name if employee else None,
+        'order_datetime': order.order_datetime.isoformat(),
+        'total_amount': float(sum(item['subtotal'] for item in order_items)),
+        'items': order_items
+    }
 
 @receipts_bp.route('/<int:order_id>', methods=['GET'])
 @jwt_required()
 def generate_receipt(order_id):
-    """Сгенерировать PDF чек для заказа"""
+    """Чек заказа: PDF (по умолчанию) или для термопринтера - ?format=text|escpos"""
+    receipt_format = request.args.get('format', 'pdf')
+    if receipt_format not in ('pdf', 'text', 'escpos'):
+        return jsonify({'error': 'Параметр format должен быть pdf, text или escpos'}), 400
+
     try:
         # Получаем заказ
-        order = Order.query.get(order_id)
-        
+        order = db.session.get(Order, order_id)
+
         if not order:
             return jsonify({'error': 'Заказ не найден'}), 404
-        
-        # Проверка прав доступа
-        current_user_id = int(get_jwt_identity())
-        claims = get_jwt()
-        
+
         # Для официантов показываем только их заказы
-        if claims.get('position') != 'Администратор' and order.employee_id != current_user_id:
+        if not can_view_order(order):
             return jsonify({'error': 'Доступ запрещен'}), 403
-        
-        # Получаем данные
-        table = RestaurantTable.query.get(order.table_id)
-        employee = Employee.query.get(order.employee_id)
-        
-        # Получаем блюда заказа
-        order_items = []
-        total_amount = 0
-        
-        for sale in order.sales:
-            dish = Dish.query.get(sale.dish_id)
-            if dish:
-                price = float(dish.price) if dish.price else 0
-                subtotal = price * sale.quantity
-                total_amount += subtotal
-                order_items.append({
-                    'name': dish.name,
-                    'quantity': sale.quantity,
-                    'price': price,
-                    'subtotal': subtotal
-                })
-        
-        # Создаем PDF в памяти
-        buffer = io.BytesIO()
-        
-        # Используем SimpleDocTemplate
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            leftMargin=40,
-            rightMargin=40,
-            topMargin=40,
-            bottomMargin=40
-        )
-        
-        # Создаем пользовательские стили с русскими шрифтами
-        styles = getSampleStyleSheet()
-        
-        # Стиль для заголовка
-        styles.add(ParagraphStyle(
-            name='RussianTitle',
-            parent=styles['Title'],
-            fontName='Arial-Bold',
-            fontSize=16,
-            alignment=1,  # center
-            spaceAfter=20
-        ))
-        
-        # Стиль для текста
-        styles.add(ParagraphStyle(
-            name='RussianNormal',
-            parent=styles['Normal'],
-            fontName='Arial',
-            fontSize=10,
-            spaceAfter=5
-        ))
-        
-        # Стиль для подвала
-        styles.add(ParagraphStyle(
-            name='RussianFooter',
-            parent=styles['Normal'],
-            fontName='Arial',
-            fontSize=8,
-            alignment=1,  # center
-            textColor=colors.grey
-        ))
-        
-        # Создаем элементы документа
-        elements = []
-        
-        # Заголовок
-        elements.append(Paragraph("РЕСТОРАН", styles['RussianTitle']))
-        elements.append(Paragraph("КАССОВЫЙ ЧЕК", styles['RussianTitle']))
-        
-        elements.append(Spacer(1, 20))
-        
-        # Информация о заказе
-        elements.append(Paragraph(f"Чек №: {order.id}", styles['RussianNormal']))
-        elements.append(Paragraph(f"Стол: {table.id if table else 'N/A'}", styles['RussianNormal']))
-        elements.append(Paragraph(f"Официант: {employee.full_name if employee else 'N/A'}", styles['RussianNormal']))
-        elements.append(Paragraph(f"Дата: {order.order_datetime.strftime('%d.%m.%Y %H:%M')}", styles['RussianNormal']))
-        
-        elements.append(Spacer(1, 20))
-        
-        # Таблица с блюдами
-        if order_items:
-            table_data = [['№', 'Наименование', 'Кол-во', 'Цена', 'Сумма']]
-            
-            for i, item in enumerate(order_items, 1):
-                table_data.append([
-                    str(i),
-                    item['name'],
-                    str(item['quantity']),
-                    f"{item['price']:.2f}",
-                    f"{item['subtotal']:.2f}"
-                ])
-            
-            # Итоговая строка
-            table_data.append(['', '', '', 'ИТОГО:', f"{total_amount:.2f} руб."])
-            
-            # Создаем таблицу
-            pdf_table = Table(table_data, colWidths=[30, 220, 50, 60, 70])
-            
-            # Проверяем доступные шрифты
-            available_fonts = pdfmetrics.getRegisteredFontNames()
-            print(f"Доступные шрифты для таблицы: {available_fonts}")
-            
-            # Используем 'Arial' если он зарегистрирован, иначе 'Helvetica'
-            font_name = 'Arial' if 'Arial' in available_fonts else 'Helvetica'
-            font_name_bold = 'Arial-Bold' if 'Arial-Bold' in available_fonts else 'Helvetica-Bold'
-            
-            print(f"Используем шрифты: {font_name} (обычный), {font_name_bold} (жирный)")
-            
-            # Стили таблицы с правильными шрифтами
-            table_style = TableStyle([
-                # Заголовок
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                
-                # Данные
-                ('ALIGN', (0, 1), (-1, -2), 'CENTER'),
-                ('ALIGN', (1, 1), (1, -2), 'LEFT'),
-                ('FONTNAME', (0, 1), (-1, -2), font_name),
-                ('FONTSIZE', (0, 1), (-1, -2), 9),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#F8F9FA')),
-                
-                # Итог
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#2C3E50')),
-                ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-                ('FONTNAME', (0, -1), (-1, -1), font_name_bold),
-                ('FONTSIZE', (0, -1), (-1, -1), 11),
-                
-                # Границы
-                ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#DDDDDD')),
-                ('BOX', (0, 0), (-1, -1), 1, colors.black),
-            ])
-            
-            pdf_table.setStyle(table_style)
-            elements.append(pdf_table)
-        else:
-            # Если нет блюд в заказе
-            elements.append(Paragraph("Заказ пуст", styles['RussianNormal']))
-        
-        elements.append(Spacer(1, 30))
-        
-        # Подпись
-        elements.append(Paragraph("Спасибо за посещение!", styles['RussianFooter']))
-        elements.append(Paragraph("Чек действителен для налоговой отчетности", styles['RussianFooter']))
-        elements.append(Paragraph(f"© Ресторан {datetime.now().year}", styles['RussianFooter']))
-        
-        # Генерируем PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        # Отправляем файл
+
+        data = receipt_data(order)
+
+        # Термопринтер: текст по готовому шаблону, без ReportLab и пула
+        if receipt_format == 'text':
+            return Response(render_text(data), mimetype='text/plain; charset=utf-8')
+        if receipt_format == 'escpos':
+            return Response(render_escpos(data), mimetype='application/octet-stream')
+
         filename = f'чек_{order_id}.pdf'
-        return send_file(
-            buffer,
+        timeout = current_app.config['PDF_RENDER_TIMEOUT_SECONDS']
+
+        if order.is_active:
+            # Открытый заказ еще меняется - рендерим каждый раз
+            content = pdf_job_queue.render('receipt', data, timeout=timeout)
+            return send_file(
+                io.BytesIO(content),
+                as_attachment=True,
+                download_name=filename,
+                mimetype='application/pdf'
+            )
+
+        # Закрытый заказ неизменен: чек рендерится один раз и отдается с диска
+        digest, cached = cached_receipt(order.id, data, timeout)
+
+        response = send_file(
+            cached,
             as_attachment=True,
             download_name=filename,
-            mimetype='application/pdf'
+            mimetype='application/pdf',
+            etag=digest,
+            conditional=True
         )
-        
+        # Чек доступен только по токену: браузер хранит его сам и сверяет по ETag
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    except QueueFull:
+        return queue_full_response()
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return jsonify({'error': f'Ошибка генерации чека: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Ошибка генерации чека: {str(e)}'}), 500
+
+def open_rendered(order_id, digest, data, timeout):
+    """Открыть только что отрендеренный в кэш чек; если его уже вытеснили - рендер в память"""
+    cached = receipt_cache.open(order_id, digest)
+    if cached is None:
+        cached = io.BytesIO(pdf_job_queue.render('receipt', data, timeout=timeout))
+    return cached
+
+def cached_receipt(order_id, data, timeout):
+    """Хеш и открытый файл чека закрытого заказа; при промахе чек рендерится в кэш"""
+    digest = receipt_digest(data)
+    cached = receipt_cache.open(order_id, digest)
+    if cached is None:
+        pdf_job_queue.render_to_file('receipt', data, receipt_cache.path(order_id, digest), timeout=timeout)
+        # Открываем до вытеснения: stored() и другие запросы могут удалить файл
+        cached = open_rendered(order_id, digest, data, timeout)
+        receipt_cache.stored(order_id, digest)
+    return digest, cached
+
+def start_receipt(order_id, is_active, data):
+    """Открытый файл из кэша или запущенный рендер: (имя в архиве, данные, файл, future, ключ кэша)"""
+    name = f'чек_{order_id}.pdf'
+    if is_active:
+        # Открытый заказ не кэшируется - байты PDF вернет future
+        return name, data, None, pdf_job_queue.start('receipt', data), None
+
+    digest = receipt_digest(data)
+    cached = receipt_cache.open(order_id, digest)
+    if cached is not None:
+        return name, data, cached, None, None
+    path = receipt_cache.path(order_id, digest)
+    return name, data, None, pdf_job_queue.start('receipt', data, path), (order_id, digest)
+
+def finish_receipt(receipt, timeout, rendered):
+    """Дождаться рендера и вернуть запись архива (имя, части содержимого)"""
+    name, data, cached, future, cache_key = receipt
+    if future is not None:
+        try:
+            content = future.result(timeout=timeout)
+            if cache_key is None:
+                return name, [content]
+            cached = open_rendered(*cache_key, data, timeout)
+        except Exception as e:
+            # Один сбойный чек не обрывает весь архив
+            return f'{name}.error.txt', [f'Ошибка генерации чека: {e}'.encode('utf-8')]
+        rendered.append(cache_key)
+    return name, file_chunks(cached)
+
+def render_receipts(receipts, timeout):
+    """Записи архива по порядку; в пуле одновременно рендерится до workers * 2 чеков"""
+    window = pdf_job_queue.workers * 2
+    pending = deque()
+    rendered = []
+
+    for order_id, is_active, data in receipts:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                pending.append(start_receipt(order_id, is_active, data))
+                break
+            except QueueFull:
+                # Очередь занята: сначала отдаем свои готовые чеки, иначе ждем
+                if pending:
+                    yield finish_receipt(pending.popleft(), timeout, rendered)
+                elif time.monotonic() < deadline:
+                    time.sleep(0.1)
+                else:
+                    # Ответ уже начат: вместо обрыва архива - запись с ошибкой
+                    error = 'Ошибка генерации чека: очередь рендеринга занята'
+                    yield f'чек_{order_id}.pdf.error.txt', [error.encode('utf-8')]
+                    break
+        while len(pending) >= window:
+            yield finish_receipt(pending.popleft(), timeout, rendered)
+
+    while pending:
+        yield finish_receipt(pending.popleft(), timeout, rendered)
+    receipt_cache.stored_many(rendered)
+
+def batch_receipts(query):
+    """(order_id, открыт ли, данные чека) по заказам запроса, страницами по BATCH_PAGE_ORDERS.
+
+    Страницы выбираются по ключу id последнего заказа уже во время отдачи
+    архива: в памяти не больше одной страницы при любом числе заказов.
+    """
+    query = query.order_by(Order.id)
+    page = query.limit(BATCH_PAGE_ORDERS).all()
+    while page:
+        lines = orders_lines([order.id for order in page])
+        for order in page:
+            yield order.id, bool(order.is_active), receipt_data(order, lines.get(order.id, []))
+        if len(page) < BATCH_PAGE_ORDERS:
+            return
+        page = query.filter(Order.id > page[-1].id).limit(BATCH_PAGE_ORDERS).all()
+
+@receipts_bp.route('/batch', methods=['GET'])
+@jwt_required()
+def receipts_batch():
+    """ZIP с чеками за день (?date=YYYY-MM-DD) или по списку заказов (?order_ids=1,2,3).
+
+    Официант получает только свои заказы. Архив отдается потоком по мере рендера.
+    """
+    query = Order.query
+
+    if request.args.get('order_ids'):
+        try:
+            order_ids = [int(value) for value in request.args['order_ids'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'order_ids - список номеров заказов через запятую'}), 400
+        query = query.filter(Order.id.in_(order_ids))
+        label = 'orders'
+    elif request.args.get('date'):
+        try:
+            day = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Неверный формат даты. Используйте YYYY-MM-DD'}), 400
+        day_start, day_end = day_window(day)
+        query = query.filter(Order.order_datetime >= day_start, Order.order_datetime < day_end)
+        label = day.isoformat()
+    else:
+        return jsonify({'error': 'Укажите date или order_ids'}), 400
+
+    if get_jwt().get('position') != 'Администратор':
+        query = query.filter(Order.employee_id == int(get_jwt_identity()))
+
+    found = query.with_entities(Order.id).limit(BATCH_MAX_ORDERS + 1).count()
+    if not found:
+        return jsonify({'error': 'Заказы не найдены'}), 404
+    if found > BATCH_MAX_ORDERS:
+        return jsonify({'error': f'Не больше {BATCH_MAX_ORDERS} заказов в одной выгрузке'}), 400
+
+    # После начала потока код ответа уже не поменять: занятость пула проверяем заранее
+    if pdf_job_queue.pending() >= pdf_job_queue.max_pending:
+        return queue_full_response()
+
+    timeout = current_app.config['PDF_RENDER_TIMEOUT_SECONDS']
+
+    # stream_with_context: заказы выбираются страницами, пока отдается архив
+    receipts = render_receipts(batch_receipts(query), timeout)
+    response = Response(stream_with_context(stream_zip(receipts)), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=receipts_{label}.zip'
+    return response
@@ -1,114 +1,79 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required
 from database import db
+from models import Dish, Order, Sale
 from datetime import datetime
+import csv
 import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.fonts import addMapping
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import json
 from sqlalchemy import text
-import os
+from routes.utils import day_window
+from sales_rollup import sales_by_dish
+from pdf_jobs import pdf_job_queue, QueueFull
 
 reports_bp = Blueprint('reports', __name__)
 
-# Регистрируем русские шрифты
-def register_russian_fonts():
+# Выгрузка продаж: строк в одной странице запроса и в одном куске ответа
+EXPORT_BATCH_ROWS = 1000
+EXPORT_COLUMNS = ['order_id', 'order_datetime', 'table_id', 'employee_id', 'sale_id',
+                  'dish_id', 'dish_name', 'quantity', 'unit_price', 'line_total']
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+def parse_report_period(args=None):
+    """start_date и end_date из параметров запроса. Бросает ValueError с текстом ошибки"""
+    args = request.args if args is None else args
+    start_date_str = args.get('start_date')
+    end_date_str = args.get('end_date')
+    
+    if not start_date_str or not end_date_str:
+        raise ValueError('Параметры start_date и end_date обязательны')
+    
     try:
-        # Попробуем найти стандартные шрифты Windows
-        font_paths = [
-            'C:/Windows/Fonts/arial.ttf',
-            'C:/Windows/Fonts/tahoma.ttf',
-        ]
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                pdfmetrics.registerFont(TTFont('Arial', font_path))
-                pdfmetrics.registerFont(TTFont('Arial-Bold', font_path))
-                addMapping('Arial', 0, 0, 'Arial')
-                addMapping('Arial', 1, 0, 'Arial-Bold')
-                return True
-        
-        # Если не нашли, используем дефолтный
-        return False
-        
-    except Exception as e:
-        return False
+        # Простое преобразование дат
+        start_date = datetime.strptime(start_date_str.split('T')[0], '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str.split('T')[0], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Неверный формат даты. Используйте YYYY-MM-DD')
+    
+    return start_date, end_date
+
+def sales_report_data(start_date, end_date):
+    """Данные отчета по продажам для JSON и PDF (только простые типы)"""
+    # Полные дни - из свода daily_dish_sales, сегодня - по живым таблицам
+    result = sales_by_dish(start_date, end_date)
+    
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'total_period_revenue': float(sum(revenue for dish_name, quantity, revenue in result)),
+        'rows': [[dish_name, int(quantity), float(revenue)] for dish_name, quantity, revenue in result]
+    }
 
-# Регистрируем шрифты при импорте
-register_russian_fonts()
+def queue_full_response():
+    response = jsonify({'error': 'Сервер формирует слишком много документов, повторите через несколько секунд'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
 @reports_bp.route('/sales', methods=['GET'])
 @jwt_required()
 def get_sales_report():
     """Отчет по продажам за период"""
     
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    
-    if not start_date_str or not end_date_str:
-        return jsonify({'error': 'Параметры start_date и end_date обязательны'}), 400
-    
     try:
-        # Простое преобразование дат
-        start_date = datetime.strptime(start_date_str.split('T')[0], '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date_str.split('T')[0], '%Y-%m-%d').date()
-        
+        start_date, end_date = parse_report_period()
     except ValueError as e:
-        return jsonify({'error': f'Неверный формат даты. Используйте YYYY-MM-DD'}), 400
+        return jsonify({'error': str(e)}), 400
     
     try:
-        # Улучшенный запрос с проверкой наличия данных
-        query = text("""
-        SELECT 
-            d.name as dish_name,
-            COALESCE(SUM(s.quantity), 0) as quantity_sold,
-            COALESCE(SUM(s.quantity * d.price), 0) as total_revenue
-        FROM dish d
-        LEFT JOIN sale s ON d.id = s.dish_id
-        LEFT JOIN restaurant_order o ON s.order_id = o.id 
-            AND DATE(o.order_datetime) BETWEEN :start_date AND :end_date
-        WHERE EXISTS (
-            SELECT 1 FROM sale s2 
-            JOIN restaurant_order o2 ON s2.order_id = o2.id
-            WHERE s2.dish_id = d.id 
-            AND DATE(o2.order_datetime) BETWEEN :start_date AND :end_date
-        )
-        GROUP BY d.id, d.name
-        ORDER BY total_revenue DESC
-        """)
-        
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
-        
-        # Общая выручка за период
-        total_revenue_query = text("""
-        SELECT COALESCE(SUM(total_amount), 0) as total_period_revenue
-        FROM restaurant_order
-        WHERE DATE(order_datetime) BETWEEN :start_date AND :end_date
-        """)
-        
-        total_revenue_result = db.session.execute(total_revenue_query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchone()
-        
-        total_period_revenue = float(total_revenue_result[0]) if total_revenue_result and total_revenue_result[0] else 0.0
+        data = sales_report_data(start_date, end_date)
+        total_period_revenue = data['total_period_revenue']
         
         # Формируем отчет
         report = []
-        for row in result:
-            dish_name, quantity_sold, total_revenue = row
-            
-            quantity_sold = int(quantity_sold) if quantity_sold else 0
-            total_revenue = float(total_revenue) if total_revenue else 0.0
-            
+        for dish_name, quantity_sold, total_revenue in data['rows']:
             revenue_share = (total_revenue / total_period_revenue * 100) if total_period_revenue > 0 else 0
             
             report.append({
@@ -120,8 +85,8 @@ def get_sales_report():
         
         return jsonify({
             'period': {
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat()
+                'start_date': data['start_date'],
+                'end_date': data['end_date']
             },
             'total_period_revenue': round(total_period_revenue, 2),
             'report': report,
@@ -136,242 +101,131 @@ def get_sales_report():
 @reports_bp.route('/sales/pdf', methods=['GET'])
 @jwt_required()
 def get_sales_report_pdf():
-    """PDF отчет по продажам с русскими шрифтами"""
-    
-    start_date_str = request.args.get('start_date')
-    end_date_str = request.args.get('end_date')
-    
-    if not start_date_str or not end_date_str:
-        return jsonify({'error': 'Параметры start_date и end_date обязательны'}), 400
+    """PDF отчет по продажам (рендер в пуле процессов; для больших периодов - /api/pdf-jobs)"""
     
     try:
-        start_date = datetime.strptime(start_date_str.split('T')[0], '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date_str.split('T')[0], '%Y-%m-%d').date()
-        
+        start_date, end_date = parse_report_period()
     except ValueError as e:
-        return jsonify({'error': f'Неверный формат даты: {str(e)}'}), 400
+        return jsonify({'error': str(e)}), 400
     
     try:
-        # Получаем данные
-        query = text("""
-        SELECT 
-            d.name as dish_name,
-            COALESCE(SUM(s.quantity), 0) as quantity_sold,
-            COALESCE(SUM(s.quantity * d.price), 0) as total_revenue
-        FROM dish d
-        LEFT JOIN sale s ON d.id = s.dish_id
-        LEFT JOIN restaurant_order o ON s.order_id = o.id 
-            AND DATE(o.order_datetime) BETWEEN :start_date AND :end_date
-        WHERE EXISTS (
-            SELECT 1 FROM sale s2 
-            JOIN restaurant_order o2 ON s2.order_id = o2.id
-            WHERE s2.dish_id = d.id 
-            AND DATE(o2.order_datetime) BETWEEN :start_date AND :end_date
-        )
-        GROUP BY d.id, d.name
-        ORDER BY total_revenue DESC
-        """)
-        
-        result = db.session.execute(query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
-        
-        # Общая выручка
-        total_revenue_query = text("""
-        SELECT COALESCE(SUM(total_amount), 0) as total_period_revenue
-        FROM restaurant_order
-        WHERE DATE(order_datetime) BETWEEN :start_date AND :end_date
-        """)
-        
-        total_revenue_result = db.session.execute(total_revenue_query, {
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchone()
-        
-        total_period_revenue = float(total_revenue_result[0]) if total_revenue_result and total_revenue_result[0] else 0.0
-        
-        # Создаем PDF с русскими шрифтами
-        buffer = io.BytesIO()
-        
-        # Создаем пользовательские стили
-        styles = getSampleStyleSheet()
-        
-        # Добавляем русские стили
-        styles.add(ParagraphStyle(
-            name='RussianTitle',
-            parent=styles['Title'],
-            fontName='Arial-Bold',
-            fontSize=18,
-            alignment=1,  # центрирование
-            spaceAfter=30
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='RussianHeading',
-            parent=styles['Heading2'],
-            fontName='Arial-Bold',
-            fontSize=14,
-            textColor=colors.HexColor('#2C3E50')
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='RussianNormal',
-            parent=styles['Normal'],
-            fontName='Arial',
-            fontSize=10
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='RussianTableHeader',
-            parent=styles['Normal'],
-            fontName='Arial-Bold',
-            fontSize=10,
-            textColor=colors.white,
-            alignment=1
-        ))
-        
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        elements = []
-        
-        # Заголовок
-        title = Paragraph(f"ОТЧЕТ О ПРОДАЖАХ", styles['RussianTitle'])
-        elements.append(title)
-        
-        # Период
-        period_text = Paragraph(
-            f"Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}", 
-            styles['RussianHeading']
-        )
-        elements.append(period_text)
-        
-        elements.append(Spacer(1, 12))
-        
-        # Информация о отчете
-        info_text = Paragraph(
-            f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}<br/>"
-            f"Общая выручка: {total_period_revenue:.2f} руб.<br/>"
-            f"Количество позиций: {len(result)}",
-            styles['RussianNormal']
-        )
-        elements.append(info_text)
-        
-        elements.append(Spacer(1, 20))
-        
-        # Таблица с данными
-        if result and len(result) > 0:
-            # Заголовки таблицы
-            table_data = [
-                ['№', 'Наименование блюда', 'Количество', 'Выручка, руб.', 'Доля, %']
-            ]
-            
-            total_quantity = 0
-            for i, row in enumerate(result, 1):
-                dish_name, quantity_sold, total_revenue = row
-                
-                quantity_sold = int(quantity_sold) if quantity_sold else 0
-                total_revenue = float(total_revenue) if total_revenue else 0.0
-                total_quantity += quantity_sold
-                
-                revenue_share = (total_revenue / total_period_revenue * 100) if total_period_revenue > 0 else 0
-                
-                table_data.append([
-                    str(i),
-                    dish_name,
-                    str(quantity_sold),
-                    f"{total_revenue:.2f}",
-                    f"{revenue_share:.2f}"
-                ])
-            
-            # Итоговая строка
-            table_data.append([
-                "   ИТОГО",
-                "",
-                str(total_quantity),
-                f"{total_period_revenue:.2f}",
-                "100.00"
-            ])
-            
-            # Создаем таблицу
-            pdf_table = Table(table_data, colWidths=[30, 200, 60, 70, 50])
-            pdf_table.setStyle(TableStyle([
-                # Заголовок
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('FONTNAME', (0, 0), (-1, 0), 'Arial-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                
-                # Тело таблицы
-                ('FONTNAME', (0, 1), (-1, -2), 'Arial'),
-                ('FONTSIZE', (0, 1), (-1, -2), 9),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('ALIGN', (1, 1), (1, -2), 'LEFT'),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.HexColor('#F8F9FA')),
-                ('GRID', (0, 0), (-1, -2), 0.5, colors.HexColor('#DDDDDD')),
-                
-                # Итоговая строка
-                ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#2C3E50')),
-                ('TEXTCOLOR', (0, -1), (-1, -1), colors.white),
-                ('FONTNAME', (0, -1), (-1, -1), 'Arial-Bold'),
-                ('FONTSIZE', (0, -1), (-1, -1), 10),
-                
-                # Границы
-                ('BOX', (0, 0), (-1, -1), 1, colors.black),
-                ('LINEABOVE', (0, -1), (-1, -1), 1, colors.white),
-            ]))
-            
-            elements.append(pdf_table)
-        else:
-            # Сообщение об отсутствии данных
-            no_data = Paragraph(
-                "НЕТ ДАННЫХ ДЛЯ ОТЧЕТА<br/><br/>"
-                f"За период с {start_date.strftime('%d.%m.%Y')} по {end_date.strftime('%d.%m.%Y')} "
-                "продажи отсутствуют.",
-                ParagraphStyle(
-                    name='NoData',
-                    fontName='Arial',
-                    fontSize=12,
-                    textColor=colors.HexColor('#E74C3C'),
-                    alignment=1
-                )
-            )
-            elements.append(no_data)
-        
-        # Подпись
-        elements.append(Spacer(1, 30))
-        
-        footer = Paragraph(
-            "Отчет сформирован автоматически системой управления рестораном<br/>"
-            f"© {datetime.now().year} Ресторан",
-            ParagraphStyle(
-                name='Footer',
-                fontName='Arial',
-                fontSize=8,
-                textColor=colors.HexColor('#7F8C8D'),
-                alignment=1
-            )
-        )
-        elements.append(footer)
-        
-        # Генерация PDF
-        doc.build(elements)
-        buffer.seek(0)
-        
-        # Отправляем файл
-        filename = f'отчет_продаж_{start_date}_{end_date}.pdf'
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
-        
+        content = pdf_job_queue.render('sales_report', sales_report_data(start_date, end_date),
+                                       timeout=current_app.config['PDF_RENDER_TIMEOUT_SECONDS'])
+    except QueueFull:
+        return queue_full_response()
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Ошибка генерации PDF: {str(e)}'}), 500
+    
+    # Отправляем файл
+    filename = f'отчет_продаж_{start_date}_{end_date}.pdf'
+    return send_file(
+        io.BytesIO(content),
+        as_attachment=True,
+        download_name=filename,
+        mimetype='application/pdf'
+    )
+
+def export_rows(start_date, end_date):
+    """Строки продаж за период страницами по EXPORT_BATCH_ROWS.
+
+    Драйвер mysql-connector буферизует весь результат запроса (серверного
+    курсора у него нет, yield_per не помогает), поэтому выгрузка идет
+    короткими запросами с ключом (order_datetime, sale.id) последней строки:
+    в памяти не больше одной страницы при любом размере периода.
+    """
+    period_start, period_end = day_window(start_date, end_date)
+    query = db.session.query(
+            Sale.order_id,
+            Order.order_datetime,
+            Order.table_id,
+            Order.employee_id,
+            Sale.id,
+            Sale.dish_id,
+            Dish.name,
+            Sale.quantity,
+            Sale.unit_price,
+            Sale.line_total
+        )\
+        .join(Order, Sale.order_id == Order.id)\
+        .join(Dish, Sale.dish_id == Dish.id)\
+        .filter(Order.order_datetime >= period_start, Order.order_datetime < period_end)\
+        .order_by(Order.order_datetime, Sale.id)
+
+    page = query.limit(EXPORT_BATCH_ROWS).all()
+    while page:
+        yield from page
+        if len(page) < EXPORT_BATCH_ROWS:
+            return
+        last = page[-1]
+        page = query.filter(db.or_(
+                Order.order_datetime > last.order_datetime,
+                db.and_(Order.order_datetime == last.order_datetime, Sale.id > last.id)
+            ))\
+            .limit(EXPORT_BATCH_ROWS)\
+            .all()
+
+def export_values(row):
+    """Строка выгрузки в простых типах"""
+    order_id, order_datetime, table_id, employee_id, sale_id, dish_id, dish_name, quantity, unit_price, line_total = row
+    return [
+        order_id,
+        order_datetime.isoformat() if order_datetime else None,
+        table_id,
+        employee_id,
+        sale_id,
+        dish_id,
+        dish_name,
+        quantity,
+        float(unit_price) if unit_price is not None else None,
+        float(line_total) if line_total is not None else None
+    ]
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(export_values(row))
+        if i % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_ndjson(rows):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(EXPORT_COLUMNS, export_values(row))), ensure_ascii=False))
+        if len(batch) == EXPORT_BATCH_ROWS:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+@reports_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_sales():
+    """Построчная выгрузка продаж за период потоком: ?format=csv|ndjson"""
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Параметр format должен быть csv или ndjson'}), 400
+
+    try:
+        start_date, end_date = parse_report_period()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows = export_rows(start_date, end_date)
+    generate = export_csv if export_format == 'csv' else export_ndjson
+
+    # stream_with_context: сессия БД и курсор живут, пока отдается ответ
+    response = Response(stream_with_context(generate(rows)), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename=sales_{start_date}_{end_date}.{export_format}'
+    return response
 
 @reports_bp.route('/check-data', methods=['GET'])
 def check_data():
@@ -388,20 +242,21 @@ def check_data():
             COUNT(*) as orders_count,
             COALESCE(SUM(total_amount), 0) as total_amount
         FROM restaurant_order 
-        WHERE DATE(order_datetime) = :today
+        WHERE order_datetime >= :day_start AND order_datetime < :day_end
         """)
         
-        result = db.session.execute(query, {'today': today}).fetchone()
+        day_start, day_end = day_window(today)
+        result = db.session.execute(query, {'day_start': day_start, 'day_end': day_end}).fetchone()
         
         # Проверяем продажи
         sales_query = text("""
         SELECT COUNT(*) as sales_count
         FROM sale s
         JOIN restaurant_order o ON s.order_id = o.id
-        WHERE DATE(o.order_datetime) = :today
+        WHERE o.order_datetime >= :day_start AND o.order_datetime < :day_end
         """)
         
-        sales_result = db.session.execute(sales_query, {'today': today}).fetchone()
+        sales_result = db.session.execute(sales_query, {'day_start': day_start, 'day_end': day_end}).fetchone()
         
         # Проверяем блюда
         dishes_query = text("SELECT COUNT(*) as dishes_count FROM dish")
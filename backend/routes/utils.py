@@ -1,4 +1,9 @@
+from flask import request
 from flask_jwt_extended import get_jwt_identity, get_jwt
+from datetime import datetime, time, timedelta
+import base64
+import binascii
+import json
 
 def get_current_user():
     try:
@@ -24,4 +29,43 @@ def check_admin_access(user_data):
     if not user_data:
         return False
     
-    return user_data.get('position') == 'Администратор'
\ No newline at end of file
+    return user_data.get('position') == 'Администратор'
+
+def parse_datetime(value):
+    """ISO-строка в datetime без часового пояса (как хранится в БД). Бросает ValueError"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def encode_cursor(*values):
+    """Упаковать значения ключа последней записи страницы в непрозрачный токен"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковать токен курсора в (datetime, id). При ошибке бросает ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw_datetime, raw_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(raw_datetime), int(raw_id)
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError('Неверный курсор')
+
+
+def get_page_limit(default=50, maximum=200):
+    """Размер страницы из параметра limit, ограниченный сверху"""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+
+def day_window(start_date, end_date=None):
+    """Календарные дни [start_date, end_date] как полуинтервал [start, end) по datetime.
+
+    Фильтр вида column >= start AND column < end может использовать индекс,
+    в отличие от DATE(column) = ...
+    """
+    end_date = end_date or start_date
+    return (
+        datetime.combine(start_date, time.min),
+        datetime.combine(end_date + timedelta(days=1), time.min)
+    )
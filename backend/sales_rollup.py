@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import db
+from models import DailyDishSales, Dish, Order, Sale
+from routes.utils import day_window
+
+
+def closed_orders_filter():
+    # is_active = NULL - заказы, созданные до появления колонки; считаем их закрытыми
+    return or_(Order.is_active == False, Order.is_active.is_(None))
+
+
+def dish_totals(*filters):
+    """[(dish_id, количество, выручка)] по продажам заказов, подходящих под filters.
+
+    Выручка - по ценам на момент заказа (sale.line_total), без соединения с dish.
+    """
+    return db.session.query(
+            Sale.dish_id,
+            func.sum(Sale.quantity),
+            func.coalesce(func.sum(Sale.line_total), 0)
+        )\
+        .join(Order, Sale.order_id == Order.id)\
+        .filter(*filters)\
+        .group_by(Sale.dish_id)\
+        .all()
+
+
+def upsert_daily_sales(day, totals):
+    """Прибавить продажи к строкам дня одним INSERT ... ON DUPLICATE KEY / ON CONFLICT"""
+    rows = [{'date': day, 'dish_id': dish_id, 'quantity': quantity, 'revenue': revenue}
+            for dish_id, quantity, revenue in totals]
+    if not rows:
+        return
+
+    table = DailyDishSales.__table__
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            quantity=table.c.quantity + stmt.inserted.quantity,
+            revenue=table.c.revenue + stmt.inserted.revenue
+        )
+    else:
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['date', 'dish_id'],
+            set_={
+                'quantity': table.c.quantity + stmt.excluded.quantity,
+                'revenue': table.c.revenue + stmt.excluded.revenue
+            }
+        )
+    db.session.execute(stmt)
+
+
+def rollup_order(order_id, order_datetime):
+    """Добавить продажи закрываемого заказа в свод (в транзакции закрытия)"""
+    upsert_daily_sales(order_datetime.date(), dish_totals(Sale.order_id == order_id))
+
+
+def rebuild_rollup(start_date, end_date):
+    """Пересчитать свод за дни [start_date, end_date] по закрытым заказам, по дню на транзакцию"""
+    day = start_date
+    while day <= end_date:
+        day_start, day_end = day_window(day)
+        DailyDishSales.query.filter(DailyDishSales.date == day).delete()
+        upsert_daily_sales(day, dish_totals(
+            Order.order_datetime >= day_start,
+            Order.order_datetime < day_end,
+            closed_orders_filter()
+        ))
+        db.session.commit()
+        day += timedelta(days=1)
+
+
+def sales_by_dish(start_date, end_date):
+    """Продажи блюд за период по всем заказам, закрытым и открытым.
+
+    Закрытые заказы прошлых дней берутся из свода, незакрытые заказы прошлых
+    дней и весь сегодняшний день - из живых таблиц (их мало, выборка по индексу
+    с is_active). Возвращает [(dish_name, quantity, revenue)] по убыванию выручки.
+    """
+    today = date.today()
+    totals = {}  # dish_id -> [количество, выручка]
+
+    def add(rows):
+        for dish_id, quantity, revenue in rows:
+            total = totals.setdefault(dish_id, [0, Decimal('0')])
+            total[0] += int(quantity)
+            total[1] += Decimal(revenue)
+
+    last_full_day = min(end_date, today - timedelta(days=1))
+    if start_date <= last_full_day:
+        add(db.session.query(
+                DailyDishSales.dish_id,
+                func.sum(DailyDishSales.quantity),
+                func.sum(DailyDishSales.revenue)
+            )
+            .filter(DailyDishSales.date >= start_date, DailyDishSales.date <= last_full_day)
+            .group_by(DailyDishSales.dish_id)
+            .all())
+
+        # Заказы, которые так и не закрыли, в свод не попадают
+        period_start, period_end = day_window(start_date, last_full_day)
+        add(dish_totals(Order.is_active == True,
+                        Order.order_datetime >= period_start,
+                        Order.order_datetime < period_end))
+
+    if start_date <= today <= end_date:
+        # Сегодня - все заказы, включая еще открытые
+        day_start, day_end = day_window(today)
+        add(dish_totals(Order.order_datetime >= day_start, Order.order_datetime < day_end))
+
+    if not totals:
+        return []
+
+    names = dict(db.session.query(Dish.id, Dish.name).filter(Dish.id.in_(totals)))
+    report = [(names.get(dish_id), quantity, revenue)
+              for dish_id, (quantity, revenue) in totals.items() if quantity]
+    return sorted(report, key=lambda row: row[2], reverse=True)
+
+
+@click.command('rebuild-sales-rollup')
+@click.option('--start', 'start_date', help='Первый день (YYYY-MM-DD), по умолчанию - первый заказ')
+@click.option('--end', 'end_date', help='Последний день (YYYY-MM-DD), по умолчанию - вчера')
+@with_appcontext
+def rebuild_sales_rollup_command(start_date, end_date):
+    """Пересчитать таблицу daily_dish_sales по закрытым заказам"""
+    if start_date:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+    else:
+        first_order = db.session.query(func.min(Order.order_datetime)).scalar()
+        if first_order is None:
+            click.echo('Заказов нет, пересчитывать нечего')
+            return
+        start_date = first_order.date()
+
+    if end_date:
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    else:
+        end_date = date.today() - timedelta(days=1)
+
+    rebuild_rollup(start_date, end_date)
+    click.echo(f'Свод продаж пересчитан: {start_date} - {end_date}')
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app import create_app
+from database import db
+import reference_cache
+from menu_snapshot import menu_snapshot
+from models import BookingStatus, Hall, Table, Position, Employee, DishCategory, Dish
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def seed(app):
+    """Минимальный набор данных: статусы броней, зал, столы, официант, блюда"""
+    db.session.add_all([BookingStatus(name=name) for name in
+                        ('Новый', 'Подтвержден', 'Отменен', 'Завершен')])
+
+    hall = Hall(name='Основной', table_count=2)
+    db.session.add(hall)
+    db.session.flush()
+
+    tables = [Table(hall_id=hall.id, capacity=2), Table(hall_id=hall.id, capacity=6)]
+    db.session.add_all(tables)
+
+    admin_position = Position(name='Администратор')
+    waiter_position = Position(name='Официант')
+    db.session.add_all([admin_position, waiter_position])
+    db.session.flush()
+
+    waiter = Employee(full_name='Иван Петров', login='waiter', password='x',
+                      position_id=waiter_position.id)
+    db.session.add(waiter)
+
+    category = DishCategory(name='Супы')
+    db.session.add(category)
+    db.session.flush()
+
+    dishes = [
+        Dish(category_id=category.id, name='Борщ', price='350.50', weight_grams=300),
+        Dish(category_id=category.id, name='Солянка', price='420.10', weight_grams=300),
+    ]
+    db.session.add_all(dishes)
+    db.session.commit()
+    # Справочники добавлены в обход маршрутов: перечитываем заранее
+    reload_reference_cache()
+    menu_snapshot.invalidate()
+
+    return {'hall': hall, 'tables': tables, 'waiter': waiter, 'dishes': dishes}
+
+
+def auth_headers(user_id, position='Администратор'):
+    token = create_access_token(identity=str(user_id),
+                                additional_claims={'position': position})
+    return {'Authorization': f'Bearer {token}'}
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def reload_reference_cache():
+    reference_cache.invalidate()
+    reference_cache.halls()
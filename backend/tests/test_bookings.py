@@ -0,0 +1,326 @@
+import base64
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import create_app
+from availability import AvailabilityIndex
+from config import TestingConfig
+from conftest import auth_headers, count_queries, reload_reference_cache
+from database import db
+import reference_cache
+from models import Booking, BookingStatus, Hall, Table
+
+
+def book(table, at, status_id=1, people_count=2):
+    booking = Booking(table_id=table.id, status_id=status_id, datetime=at,
+                      guest_name='Гость', guest_phone='+79990000000', people_count=people_count)
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def test_availability_index_intervals():
+    index = AvailabilityIndex(timedelta(hours=2))
+    evening = datetime(2025, 5, 1, 18, 0)
+    index.add(1, evening)
+    index.add(1, evening + timedelta(hours=3))
+
+    assert index.is_free(1, evening - timedelta(hours=2))
+    assert not index.is_free(1, evening - timedelta(hours=1, minutes=59))
+    assert not index.is_free(1, evening + timedelta(hours=1, minutes=30))
+    assert index.is_free(1, evening + timedelta(hours=5))
+    assert index.is_free(2, evening)
+
+    # 18:00-20:00 и 21:00-23:00 заняты: ближайшая посадка на 2 часа - в 23:00
+    assert index.next_free(1, evening + timedelta(minutes=30)) == evening + timedelta(hours=5)
+    assert index.next_free(1, evening, until=evening + timedelta(hours=4)) is None
+
+
+def test_available_tables_at_time(client, seed):
+    small, large = seed['tables']
+    book(small, datetime(2025, 5, 1, 18, 0))
+    headers = auth_headers(1)
+
+    response = client.get('/api/bookings/available-tables?date=2025-05-01T19:30:00', headers=headers)
+    assert [table['id'] for table in response.get_json()] == [large.id]
+
+    # Тот же стол свободен вечером после окончания брони
+    response = client.get('/api/bookings/available-tables?date=2025-05-01T20:00:00', headers=headers)
+    assert [table['id'] for table in response.get_json()] == [small.id, large.id]
+
+    response = client.get('/api/halls/tables/available?date=2025-05-01T19:30:00&people_count=4')
+    assert response.get_json() == [{'id': large.id, 'hall_id': seed['hall'].id,
+                                    'hall_name': 'Основной', 'capacity': 6}]
+
+
+def test_available_tables_whole_day_and_next_free(client, seed):
+    small, large = seed['tables']
+    book(small, datetime(2025, 5, 1, 18, 0))
+    book(large, datetime(2025, 5, 1, 18, 0), status_id=3)  # отменена
+
+    response = client.get('/api/halls/tables/available?date=2025-05-01')
+    assert [table['id'] for table in response.get_json()] == [large.id]
+
+    response = client.get('/api/halls/tables/available?date=2025-05-01T19:30:00&include_busy=true')
+    by_id = {table['id']: table for table in response.get_json()}
+    assert by_id[small.id]['available'] is False
+    assert by_id[small.id]['next_free_at'] == '2025-05-01T20:00:00'
+    assert by_id[large.id]['available'] is True
+
+
+def test_available_tables_constant_queries(client, seed):
+    hall = Hall(name='Веранда')
+    db.session.add(hall)
+    db.session.flush()
+    for _ in range(20):
+        db.session.add(Table(hall_id=hall.id, capacity=4))
+    db.session.commit()
+    reload_reference_cache()
+
+    with count_queries() as statements:
+        response = client.get('/api/halls/tables/available?date=2025-05-01T19:00:00')
+    assert len(response.get_json()) == 22
+    assert len(statements) == 2
+
+
+def decode_mask(encoded, slot_count):
+    raw = int.from_bytes(base64.b64decode(encoded), 'little')
+    return [bool(raw >> i & 1) for i in range(slot_count)]
+
+
+def test_availability_grid_matches_point_queries(client, seed):
+    small, large = seed['tables']
+    book(small, datetime(2025, 5, 1, 18, 0))
+    book(small, datetime(2025, 5, 2, 12, 15))
+    book(large, datetime(2025, 5, 3, 9, 0), status_id=3)
+
+    with count_queries() as statements:
+        response = client.get('/api/bookings/availability-grid?from=2025-05-01&to=2025-05-03&slot=30m',
+                              headers=auth_headers(1))
+    grid = response.get_json()
+    assert len(statements) == 2
+    assert grid['slot_count'] == 3 * 48
+
+    start = datetime(2025, 5, 1)
+    for table in grid['tables']:
+        free = decode_mask(table['free'], grid['slot_count'])
+        expected = []
+        for i in range(grid['slot_count']):
+            at = (start + timedelta(minutes=30 * i)).isoformat()
+            tables = client.get(f'/api/halls/tables/available?date={at}').get_json()
+            expected.append(table['id'] in [t['id'] for t in tables])
+        assert free == expected
+
+    small_grid = next(t for t in grid['tables'] if t['id'] == small.id)
+    # 18:00 бронь на 2 часа: заняты посадки 16:30..19:30 (7 слотов), 12:15: 10:30..14:00 (8 слотов)
+    assert small_grid['free_count'] == 3 * 48 - 15
+
+
+def test_availability_grid_validation(client, seed):
+    headers = auth_headers(1)
+    assert client.get('/api/bookings/availability-grid?from=2025-05-01', headers=headers).status_code == 400
+    assert client.get('/api/bookings/availability-grid?from=2025-05-01&to=2025-07-01',
+                      headers=headers).status_code == 400
+    assert client.get('/api/bookings/availability-grid?from=2025-05-01&to=2025-05-02&slot=1m',
+                      headers=headers).status_code == 400
+
+
+def auto_booking(client, at, people_count, **extra):
+    return client.post('/api/bookings/', headers=auth_headers(1), json=dict({
+        'auto_assign': True,
+        'guest_name': 'Гость',
+        'guest_phone': '+79990000000',
+        'people_count': people_count,
+        'datetime': at
+    }, **extra))
+
+
+def test_auto_assign_picks_best_fit(client, seed):
+    small, large = seed['tables']
+
+    response = auto_booking(client, '2025-05-01T19:00:00', 2)
+    assert response.status_code == 201
+    assert response.get_json()['table_id'] == small.id
+
+    response = auto_booking(client, '2025-05-01T19:30:00', 2)
+    assert response.get_json()['table_id'] == large.id
+
+    response = auto_booking(client, '2025-05-01T20:00:00', 2)
+    assert response.status_code == 409
+
+
+def test_auto_assign_prefers_tight_packing(client, seed):
+    hall = seed['hall']
+    twins = [Table(hall_id=hall.id, capacity=4), Table(hall_id=hall.id, capacity=4)]
+    db.session.add_all(twins)
+    db.session.commit()
+    book(twins[1], datetime(2025, 5, 1, 17, 0))
+
+    # Оба стола свободны в 19:00, но у второго бронь заканчивается ровно в 19:00
+    response = auto_booking(client, '2025-05-01T19:00:00', 3)
+    assert response.get_json()['table_id'] == twins[1].id
+
+
+def manual_booking(client, table_id, at, people_count=2):
+    return client.post('/api/bookings/', headers=auth_headers(1), json={
+        'table_id': table_id,
+        'guest_name': 'Гость',
+        'guest_phone': '+79990000000',
+        'people_count': people_count,
+        'datetime': at
+    })
+
+
+def test_create_booking_conflict(client, seed):
+    small, large = seed['tables']
+    first = manual_booking(client, small.id, '2025-05-01T19:00:00')
+    assert first.status_code == 201
+
+    response = manual_booking(client, small.id, '2025-05-01T20:30:00')
+    assert response.status_code == 409
+    assert response.get_json()['conflict_booking_id'] == first.get_json()['booking_id']
+
+    assert manual_booking(client, small.id, '2025-05-01T21:00:00').status_code == 201
+
+
+def test_update_booking_conflict(client, seed):
+    small, large = seed['tables']
+    manual_booking(client, small.id, '2025-05-01T19:00:00')
+    other_id = manual_booking(client, large.id, '2025-05-01T19:00:00').get_json()['booking_id']
+
+    response = client.put(f'/api/bookings/{other_id}', headers=auth_headers(1),
+                          json={'table_id': small.id})
+    assert response.status_code == 409
+    assert db.session.get(Booking, other_id).table_id == large.id
+
+    # Отмененная бронь стол не занимает
+    response = client.put(f'/api/bookings/{other_id}', headers=auth_headers(1),
+                          json={'table_id': small.id, 'status_id': 3})
+    assert response.status_code == 200
+
+
+def test_concurrent_bookings_never_overlap(tmp_path, monkeypatch):
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI',
+                        f"sqlite:///{tmp_path / 'bookings.db'}?timeout=60")
+    app = create_app('testing')
+    with app.app_context():
+        db.session.add(BookingStatus(name='Новый'))
+        hall = Hall(name='Основной')
+        db.session.add(hall)
+        db.session.flush()
+        table_ids = []
+        for _ in range(3):
+            table = Table(hall_id=hall.id, capacity=4)
+            db.session.add(table)
+            db.session.flush()
+            table_ids.append(table.id)
+        db.session.commit()
+        reference_cache.invalidate()
+        token_headers = auth_headers(1)
+
+    rng = random.Random(7)
+    attempts = [
+        (rng.choice(table_ids), f'2025-05-01T{rng.randrange(17, 22)}:{rng.choice(["00", "15", "30", "45"])}:00')
+        for _ in range(200)
+    ] + [(None, f'2025-05-01T{rng.randrange(17, 22)}:30:00') for _ in range(100)]
+
+    def attempt(args):
+        table_id, at = args
+        with app.app_context():
+            payload = {'guest_name': 'Гость', 'guest_phone': '+7', 'people_count': 2, 'datetime': at}
+            if table_id:
+                payload['table_id'] = table_id
+            else:
+                payload['auto_assign'] = True
+            return app.test_client().post('/api/bookings/', headers=token_headers, json=payload).status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(attempt, attempts))
+
+    assert set(statuses) <= {201, 409}
+    assert statuses.count(201) > 0
+
+    # Вторая волна: переносы существующих броней (PUT) вперемешку с новыми
+    with app.app_context():
+        booking_ids = [booking.id for booking in Booking.query]
+
+    def move(args):
+        booking_id, table_id, at = args
+        with app.app_context():
+            return app.test_client().put(f'/api/bookings/{booking_id}', headers=token_headers,
+                                         json={'table_id': table_id, 'datetime': at}).status_code
+
+    moves = [
+        (rng.choice(booking_ids), rng.choice(table_ids),
+         f'2025-05-01T{rng.randrange(17, 22)}:{rng.choice(["00", "15", "30", "45"])}:00')
+        for _ in range(200)
+    ]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        move_results = pool.map(move, moves)
+        create_results = pool.map(attempt, attempts[:100])
+        move_statuses, create_statuses = list(move_results), list(create_results)
+
+    assert set(move_statuses) <= {200, 409}
+    assert move_statuses.count(200) > 0
+    assert set(create_statuses) <= {201, 409}
+
+    with app.app_context():
+        duration = timedelta(minutes=app.config['BOOKING_DURATION_MINUTES'])
+        bookings = Booking.query.order_by(Booking.table_id, Booking.datetime).all()
+        assert len(bookings) == statuses.count(201) + create_statuses.count(201)
+        for previous, current in zip(bookings, bookings[1:]):
+            if previous.table_id == current.table_id:
+                assert current.datetime >= previous.datetime + duration
+        db.session.remove()
+        db.drop_all()
+
+
+def test_get_bookings_filters_and_cursor(client, seed):
+    small, large = seed['tables']
+    other_hall = Hall(name='Веранда')
+    db.session.add(other_hall)
+    db.session.flush()
+    terrace = Table(hall_id=other_hall.id, capacity=4)
+    db.session.add(terrace)
+    db.session.commit()
+    reload_reference_cache()
+
+    for day in range(1, 6):
+        book(small, datetime(2025, 5, day, 12, 0))
+        book(large, datetime(2025, 5, day, 12, 0), status_id=2)
+        book(terrace, datetime(2025, 5, day, 18, 0))
+    headers = auth_headers(1)
+    hall_id = seed['hall'].id
+
+    ids, cursor = [], None
+    with count_queries() as statements:
+        while True:
+            url = '/api/bookings/?from=2025-05-02&to=2025-05-04&hall_id=%d&limit=2' % hall_id
+            body = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers).get_json()
+            ids.extend(booking['id'] for booking in body['bookings'])
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+    # Одна выборка на страницу, без запросов на каждую бронь
+    assert len(statements) == 3
+
+    expected = Booking.query.join(Table).filter(
+        Table.hall_id == hall_id,
+        Booking.datetime >= datetime(2025, 5, 2),
+        Booking.datetime < datetime(2025, 5, 5)
+    ).order_by(Booking.datetime, Booking.id)
+    assert ids == [booking.id for booking in expected]
+
+    body = client.get('/api/bookings/?status_id=2', headers=headers).get_json()
+    assert {b['status_name'] for b in body['bookings']} == {'Подтвержден'}
+    assert {b['hall_name'] for b in body['bookings']} == {'Основной'}
+    assert len(body['bookings']) == 5
+
+
+def test_get_booking_details(client, seed):
+    booking = book(seed['tables'][0], datetime(2025, 5, 1, 12, 0))
+    body = client.get(f'/api/bookings/{booking.id}', headers=auth_headers(1)).get_json()
+    assert body['hall_name'] == 'Основной'
+    assert body['status_name'] == 'Новый'
+    assert client.get('/api/bookings/999', headers=auth_headers(1)).status_code == 404
@@ -0,0 +1,197 @@
+import json
+
+from conftest import auth_headers, count_queries
+from database import db
+from kitchen import kitchen_queue
+from models import Order, Sale
+
+
+def make_order(seed):
+    order = Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id)
+    db.session.add(order)
+    db.session.flush()
+    sales = [Sale(order_id=order.id, dish_id=dish.id, quantity=1) for dish in seed['dishes']]
+    db.session.add_all(sales)
+    db.session.commit()
+    # Данные добавлены в обход маршрутов: перечитываем очередь, как при старте
+    kitchen_queue.load()
+    return order.id, [sale.id for sale in sales]
+
+
+def parse_sse(chunk):
+    lines = chunk.decode().strip().split('\n')
+    return lines[0][len('event: '):], json.loads(lines[1][len('data: '):])
+
+
+def test_get_chef_orders(client, seed):
+    order_id, sale_ids = make_order(seed)
+
+    response = client.get('/api/chef/orders', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert [item['id'] for item in response.get_json()] == sale_ids
+    assert response.get_json()[0]['dish_name'] == 'Борщ'
+
+
+def test_chef_orders_forbidden_for_waiter(client, seed):
+    response = client.get('/api/chef/orders', headers=auth_headers(1, position='Официант'))
+    assert response.status_code == 403
+
+
+def test_stream_sends_snapshot_then_changes(app, client, seed):
+    app.config['SSE_KEEPALIVE_SECONDS'] = 0.05
+    order_id, sale_ids = make_order(seed)
+    headers = auth_headers(1)
+
+    response = client.get('/api/chef/orders/stream', headers=headers, buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+
+    event, data = parse_sse(next(stream))
+    assert event == 'snapshot'
+    assert [item['id'] for item in data] == sale_ids
+
+    client.post(f'/api/chef/orders/{sale_ids[0]}/ready', headers=headers)
+    assert parse_sse(next(stream)) == ('sale_ready', {'order_id': order_id, 'sale_id': sale_ids[0]})
+
+    client.post('/api/orders/', headers=headers, json={
+        'table_id': seed['tables'][1].id,
+        'items': [{'dish_id': seed['dishes'][1].id, 'quantity': 2}]
+    })
+    event, data = parse_sse(next(stream))
+    assert event == 'order_items'
+    assert [(item['dish_name'], item['quantity']) for item in data['items']] == [('Солянка', 2)]
+
+    client.post(f'/api/chef/orders/{order_id}/all-ready', headers=headers)
+    assert parse_sse(next(stream)) == ('order_ready', {'order_id': order_id})
+
+    # Без событий поток отдает keepalive-комментарии
+    assert next(stream) == b': keepalive\n\n'
+    response.close()
+
+
+def test_stream_accepts_token_in_query_string(client, seed):
+    token = auth_headers(1)['Authorization'].split()[1]
+    response = client.get(f'/api/chef/orders/stream?jwt={token}', buffered=False)
+    assert response.status_code == 200
+    assert parse_sse(next(iter(response.response)))[0] == 'snapshot'
+    response.close()
+
+
+def test_broker_drops_slow_subscriber():
+    from events import InProcessBroker
+
+    broker = InProcessBroker(maxsize=2)
+    subscription = broker.subscribe('kitchen')
+    for i in range(3):
+        broker.publish('kitchen', 'sale_ready', {'sale_id': i})
+
+    assert subscription.closed
+    assert subscription.get(timeout=0) == ('sale_ready', {'sale_id': 0})
+
+
+def test_chef_orders_served_from_memory(client, seed):
+    make_order(seed)
+    headers = auth_headers(1)
+
+    with count_queries() as statements:
+        response = client.get('/api/chef/orders', headers=headers)
+    assert len(response.get_json()) == 2
+    assert statements == []
+
+
+def test_kitchen_queue_loads_on_first_request(client, seed):
+    order_id, sale_ids = make_order(seed)
+    # Как после create_app: очередь еще не читалась из БД
+    kitchen_queue.reset()
+    assert kitchen_queue.snapshot() == []
+
+    response = client.get('/api/chef/orders', headers=auth_headers(1))
+    assert [item['id'] for item in response.get_json()] == sale_ids
+    assert kitchen_queue.metrics()['drift_count'] == 0
+
+
+def test_kitchen_queue_follows_write_paths(client, seed):
+    headers = auth_headers(1)
+    order_id, sale_ids = make_order(seed)
+
+    client.post(f'/api/chef/orders/{sale_ids[0]}/ready', headers=headers)
+    assert [item['id'] for item in kitchen_queue.snapshot()] == sale_ids[1:]
+
+    client.post(f'/api/orders/{order_id}/items', headers=headers,
+                json={'items': [{'dish_id': seed['dishes'][0].id, 'quantity': 3}]})
+    assert [item['quantity'] for item in kitchen_queue.snapshot()] == [1, 3]
+
+    client.post(f'/api/orders/{order_id}/close', headers=headers)
+    assert kitchen_queue.snapshot() == []
+    assert kitchen_queue.reconcile() is False
+
+
+def test_kitchen_queue_reconcile_detects_drift(client, seed):
+    order_id, sale_ids = make_order(seed)
+
+    # Изменение в обход очереди (например, другим воркером)
+    db.session.get(Sale, sale_ids[0]).is_ready = True
+    db.session.commit()
+
+    assert kitchen_queue.reconcile() is True
+    assert [item['id'] for item in kitchen_queue.snapshot()] == sale_ids[1:]
+
+    metrics = client.get('/api/chef/orders/metrics', headers=auth_headers(1)).get_json()
+    assert metrics['pending_items'] == 1
+    assert metrics['pending_orders'] == 1
+    assert metrics['drift_count'] >= 1
+    assert metrics['seconds_since_reconcile'] < 5
+
+
+def test_mark_all_ready_single_update(client, seed):
+    order_id, sale_ids = make_order(seed)
+
+    with count_queries() as statements:
+        response = client.post(f'/api/chef/orders/{order_id}/all-ready', headers=auth_headers(1))
+    assert response.get_json()['marked_count'] == 2
+    assert len([s for s, _ in statements if s.startswith('UPDATE sale')]) == 1
+    assert not [s for s, _ in statements if s.lstrip().startswith('SELECT') and 'FROM sale' in s]
+
+    response = client.post(f'/api/chef/orders/{order_id}/all-ready', headers=auth_headers(1))
+    assert response.status_code == 400
+
+
+def test_mark_many_ready_by_orders_and_sales(client, seed):
+    first_id, first_sales = make_order(seed)
+    second_id, second_sales = make_order(seed)
+    third_id, third_sales = make_order(seed)
+
+    response = client.post('/api/chef/orders/ready', headers=auth_headers(1), json={
+        'order_ids': [first_id, second_id],
+        'sale_ids': [third_sales[0]]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['marked_count'] == 5
+
+    pending = [sale.id for sale in Sale.query.filter_by(is_ready=False)]
+    assert pending == third_sales[1:]
+    assert [item['id'] for item in kitchen_queue.snapshot()] == third_sales[1:]
+
+
+def test_mark_many_ready_skips_closed_orders(client, seed):
+    order_id, sale_ids = make_order(seed)
+    db.session.get(Order, order_id).is_active = False
+    db.session.commit()
+
+    response = client.post('/api/chef/orders/ready', headers=auth_headers(1),
+                           json={'sale_ids': sale_ids})
+    assert response.get_json()['marked_count'] == 0
+
+    response = client.post('/api/chef/orders/ready', headers=auth_headers(1), json={})
+    assert response.status_code == 400
+
+
+def test_mark_many_ready_rejects_malformed_body(client, seed):
+    order_id, sale_ids = make_order(seed)
+
+    for body in ({'order_ids': str(order_id)}, {'sale_ids': [str(sale_ids[0])]},
+                 {'order_ids': [True]}, [order_id], 'order_ids'):
+        response = client.post('/api/chef/orders/ready', headers=auth_headers(1), json=body)
+        assert response.status_code == 400, body
+
+    assert Sale.query.filter_by(is_ready=True).count() == 0
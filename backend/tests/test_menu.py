@@ -0,0 +1,168 @@
+from sqlalchemy import event
+
+from conftest import auth_headers, count_queries
+from database import db
+from menu_snapshot import bump_menu_version
+from models import DishCategory, MenuChange
+
+
+def test_dishes_take_category_names_from_cache(client, seed):
+    with count_queries() as statements:
+        response = client.get('/api/menu/dishes')
+
+    assert response.status_code == 200
+    assert {dish['category_name'] for dish in response.get_json()} == {'Супы'}
+    # Версия журнала и блюда, без поиска категории на каждое блюдо
+    assert len(statements) == 2
+
+
+def test_category_changes_invalidate_cache(client, seed):
+    response = client.post('/api/menu/categories', json={'name': 'Десерты'},
+                           headers=auth_headers(1))
+    assert response.status_code == 201
+    category_id = response.get_json()['category_id']
+
+    names = {item['name'] for item in client.get('/api/menu/categories').get_json()}
+    assert names == {'Супы', 'Десерты'}
+
+    client.put(f'/api/menu/categories/{category_id}', json={'name': 'Сладкое'},
+               headers=auth_headers(1))
+    names = {item['name'] for item in client.get('/api/menu/categories').get_json()}
+    assert names == {'Супы', 'Сладкое'}
+
+
+def test_dish_accepts_category_missing_from_cache(client, seed):
+    # Категория создана другим воркером: кэш этого процесса о ней еще не знает
+    category = DishCategory(name='Десерты')
+    db.session.add(category)
+    db.session.commit()
+
+    response = client.post('/api/menu/dishes', headers=auth_headers(1),
+                           json={'name': 'Торт', 'price': '200.00', 'category_id': category.id})
+    assert response.status_code == 201
+
+    response = client.post('/api/menu/dishes', headers=auth_headers(1),
+                           json={'name': 'Торт', 'price': '200.00', 'category_id': 999})
+    assert response.status_code == 404
+
+
+def test_dishes_etag_and_not_modified(client, seed):
+    first = client.get('/api/menu/dishes')
+    etag = first.headers['ETag']
+    assert first.status_code == 200
+    assert not etag.startswith('W/')
+
+    with count_queries() as statements:
+        cached = client.get('/api/menu/dishes', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert statements == []
+
+
+def test_dish_writes_change_etag(client, seed):
+    dish_id = seed['dishes'][0].id
+    etag = client.get('/api/menu/dishes').headers['ETag']
+
+    response = client.put(f'/api/menu/dishes/{dish_id}/toggle_availability', headers=auth_headers(1))
+    assert response.status_code == 200
+
+    response = client.get('/api/menu/dishes', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    borscht = next(dish for dish in response.get_json() if dish['id'] == dish_id)
+    assert borscht['is_available'] is False
+
+
+def test_dishes_by_category(client, seed):
+    category_id = client.get('/api/menu/categories').get_json()[0]['id']
+
+    response = client.get(f'/api/menu/dishes?category_id={category_id}')
+    assert [dish['name'] for dish in response.get_json()] == ['Борщ', 'Солянка']
+
+    response = client.get('/api/menu/dishes?category_id=999')
+    assert response.get_json() == []
+
+
+def test_menu_changes_since_version(client, seed):
+    borscht, solyanka = seed['dishes']
+    version = int(client.get('/api/menu/dishes').headers['X-Menu-Version'])
+
+    client.put(f'/api/menu/dishes/{borscht.id}/toggle_availability', headers=auth_headers(1))
+    client.put(f'/api/menu/dishes/{borscht.id}', json={'price': 360}, headers=auth_headers(1))
+    client.delete(f'/api/menu/dishes/{solyanka.id}', headers=auth_headers(1))
+    category_id = client.post('/api/menu/categories', json={'name': 'Десерты'},
+                              headers=auth_headers(1)).get_json()['category_id']
+
+    response = client.get(f'/api/menu/changes?since={version}')
+    assert response.status_code == 200
+    changes = response.get_json()
+    assert changes['version'] == version + 4
+    assert [(dish['id'], dish['price'], dish['is_available']) for dish in changes['dishes']] == \
+        [(borscht.id, 360.0, False)]
+    assert changes['deleted_dishes'] == [solyanka.id]
+    assert changes['categories'] == [{'id': category_id, 'name': 'Десерты'}]
+    assert changes['deleted_categories'] == []
+
+    # Клиент догнал текущую версию
+    response = client.get(f"/api/menu/changes?since={changes['version']}")
+    assert response.get_json()['dishes'] == []
+    assert response.get_json()['deleted_dishes'] == []
+
+
+def test_menu_changes_follow_commit_order_not_ids(client, seed):
+    borscht, solyanka = seed['dishes']
+    # Транзакция A получила меньший id журнала, но подтвердилась позже транзакции B
+    db.session.add(MenuChange(id=100, version=bump_menu_version(), entity='dish',
+                              entity_id=borscht.id, action='update'))
+    db.session.commit()
+    synced = client.get('/api/menu/changes?since=0').get_json()['version']
+
+    db.session.add(MenuChange(id=50, version=bump_menu_version(), entity='dish',
+                              entity_id=solyanka.id, action='update'))
+    db.session.commit()
+
+    changes = client.get(f'/api/menu/changes?since={synced}').get_json()
+    assert changes['version'] == synced + 1
+    assert [dish['id'] for dish in changes['dishes']] == [solyanka.id]
+
+
+def test_first_bump_survives_concurrent_counter_insert(app, seed):
+    # Другой воркер вставляет строку счетчика между нашими UPDATE и INSERT
+    def insert_counter(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SAVEPOINT') and not inserted:
+            inserted.append(True)
+            cursor.execute('INSERT INTO menu_version (id, version) VALUES (1, 5)')
+    inserted = []
+    event.listen(db.engine, 'before_cursor_execute', insert_counter)
+    try:
+        assert bump_menu_version() == 6
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', insert_counter)
+    db.session.commit()
+    assert bump_menu_version() == 7
+
+
+def test_menu_changes_validation(client, seed):
+    assert client.get('/api/menu/changes').status_code == 400
+    assert client.get('/api/menu/changes?since=abc').status_code == 400
+    assert client.get('/api/menu/changes?since=100').status_code == 409
+
+
+def test_search_dishes_prefix_and_typos(client, seed):
+    borscht, solyanka = seed['dishes']
+    client.put(f'/api/menu/dishes/{solyanka.id}', json={'composition': 'Мясо, оливки, лимон'},
+               headers=auth_headers(1))
+
+    def search(q):
+        response = client.get('/api/menu/dishes/search', query_string={'q': q})
+        assert response.status_code == 200
+        return [dish['id'] for dish in response.get_json()]
+
+    assert search('бор') == [borscht.id]
+    assert search('Солянка') == [solyanka.id]
+    assert search('олив') == [solyanka.id]       # по составу
+    assert search('солняка') == [solyanka.id]    # опечатка
+    assert search('бощр') == [borscht.id]
+    assert search('солянка лимон') == [solyanka.id]
+    assert search('солянка сыр') == []
+    assert client.get('/api/menu/dishes/search').status_code == 400
@@ -0,0 +1,281 @@
+from datetime import datetime, timedelta
+
+from conftest import auth_headers, count_queries
+from database import db
+from models import Order, Sale
+from routes.utils import day_window
+
+
+def make_orders(seed, count):
+    for _ in range(count):
+        order = Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id)
+        db.session.add(order)
+        db.session.flush()
+        for dish in seed['dishes']:
+            db.session.add(Sale(order_id=order.id, dish_id=dish.id, quantity=2))
+    db.session.commit()
+
+
+def test_get_orders_query_count_is_constant(client, seed):
+    headers = auth_headers(seed['waiter'].id)
+
+    make_orders(seed, 2)
+    with count_queries() as small:
+        response = client.get('/api/orders/', headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()['orders']) == 2
+
+    make_orders(seed, 30)
+    with count_queries() as large:
+        response = client.get('/api/orders/?limit=100', headers=headers)
+    assert response.status_code == 200
+    assert len(response.get_json()['orders']) == 32
+
+    assert len(small) == len(large) == 1
+
+
+def test_get_orders_payload(client, seed):
+    make_orders(seed, 1)
+
+    response = client.get('/api/orders/', headers=auth_headers(seed['waiter'].id))
+    order = response.get_json()['orders'][0]
+
+    assert order['table_number'] == seed['tables'][0].id
+    assert order['employee_name'] == 'Иван Петров'
+    assert order['item_count'] == 4
+
+
+def test_get_orders_waiter_sees_only_own(client, seed):
+    make_orders(seed, 3)
+
+    response = client.get('/api/orders/', headers=auth_headers(999, position='Официант'))
+    assert response.get_json()['orders'] == []
+
+    response = client.get('/api/orders/', headers=auth_headers(seed['waiter'].id, position='Официант'))
+    assert len(response.get_json()['orders']) == 3
+
+
+def fetch_all_pages(client, headers, limit):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/orders/?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url, headers=headers).get_json()
+        ids.extend(order['id'] for order in body['orders'])
+        cursor = body['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_get_orders_keyset_pagination(client, seed):
+    started = datetime(2025, 1, 1, 12, 0)
+    # Часть заказов с одинаковым временем, чтобы проверить разрешение по id
+    for i in range(7):
+        db.session.add(Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id,
+                             order_datetime=started + timedelta(minutes=i // 2)))
+    db.session.commit()
+
+    headers = auth_headers(seed['waiter'].id)
+    ids = fetch_all_pages(client, headers, limit=3)
+
+    expected = [order.id for order in
+                Order.query.order_by(Order.order_datetime.desc(), Order.id.desc())]
+    assert ids == expected
+
+
+def test_get_orders_pages_stable_when_new_orders_arrive(client, seed):
+    started = datetime(2025, 1, 1, 12, 0)
+    for i in range(4):
+        db.session.add(Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id,
+                             order_datetime=started + timedelta(minutes=i)))
+    db.session.commit()
+
+    headers = auth_headers(seed['waiter'].id)
+    first_page = client.get('/api/orders/?limit=2', headers=headers).get_json()
+
+    db.session.add(Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id,
+                         order_datetime=started + timedelta(hours=1)))
+    db.session.commit()
+
+    second_page = client.get(f"/api/orders/?limit=2&cursor={first_page['next_cursor']}",
+                             headers=headers).get_json()
+
+    seen = [o['id'] for o in first_page['orders'] + second_page['orders']]
+    assert len(set(seen)) == 4
+    assert second_page['next_cursor'] is None
+
+
+def test_get_orders_invalid_cursor(client, seed):
+    response = client.get('/api/orders/?cursor=garbage', headers=auth_headers(seed['waiter'].id))
+    assert response.status_code == 400
+
+
+def test_day_window_is_half_open():
+    start, end = day_window(datetime(2025, 3, 1).date(), datetime(2025, 3, 3).date())
+    assert start == datetime(2025, 3, 1)
+    assert end == datetime(2025, 3, 4)
+
+
+def test_get_active_orders_only_today(client, seed):
+    now = datetime.now()
+    db.session.add_all([
+        Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id, order_datetime=now),
+        Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id,
+              order_datetime=now - timedelta(days=1)),
+    ])
+    db.session.commit()
+
+    response = client.get('/api/orders/active',
+                          headers=auth_headers(seed['waiter'].id, position='Официант'))
+    assert len(response.get_json()) == 1
+
+
+def test_get_active_orders_uses_composite_index(client, seed):
+    headers = auth_headers(seed['waiter'].id, position='Официант')
+    with count_queries() as statements:
+        client.get('/api/orders/active', headers=headers)
+
+    statement, parameters = next(s for s in statements if 'FROM restaurant_order' in s[0])
+    plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    details = ' '.join(row[-1] for row in plan)
+
+    assert 'ix_restaurant_order_active_employee_datetime' in details
+    assert 'DATE(' not in statement
+
+
+def test_pending_sales_lookup_uses_composite_index(app, seed):
+    plan = db.session.connection().exec_driver_sql(
+        'EXPLAIN QUERY PLAN SELECT id FROM sale WHERE order_id = ? AND is_ready = 0', (1,)
+    ).fetchall()
+    assert 'ix_sale_order_id_is_ready' in ' '.join(row[-1] for row in plan)
+
+
+def test_create_order_batches_dishes_and_sales(client, seed):
+    borsch, solyanka = seed['dishes']
+    items = [{'dish_id': borsch.id, 'quantity': 1} for _ in range(20)]
+    items += [{'dish_id': solyanka.id, 'quantity': 3}, {'dish_id': 999, 'quantity': 1}]
+
+    with count_queries() as statements:
+        response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id),
+                               json={'table_id': seed['tables'][0].id, 'items': items})
+    assert response.status_code == 201
+
+    dish_selects = [s for s, _ in statements if s.lstrip().startswith('SELECT') and 'FROM dish' in s]
+    sale_inserts = [s for s, _ in statements if s.startswith('INSERT INTO sale')]
+    assert len(dish_selects) == 1
+    assert len(sale_inserts) == 1
+
+    order_id = response.get_json()['order_id']
+    sales = {sale.dish_id: sale.quantity for sale in Sale.query.filter_by(order_id=order_id)}
+    assert sales == {borsch.id: 20, solyanka.id: 3}
+
+
+def test_create_order_total_is_exact(client, seed):
+    borsch, solyanka = seed['dishes']
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id), json={
+        'table_id': seed['tables'][0].id,
+        'items': [{'dish_id': borsch.id, 'quantity': 3}, {'dish_id': solyanka.id, 'quantity': 7}]
+    })
+
+    # 3 * 350.50 + 7 * 420.10
+    assert response.get_json()['total_amount'] == 3992.2
+    order = db.session.get(Order, response.get_json()['order_id'])
+    assert str(order.total_amount) == '3992.20'
+
+
+def test_create_order_rejects_malformed_items(client, seed):
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id), json={
+        'table_id': seed['tables'][0].id,
+        'items': [{'dish_id': seed['dishes'][0].id, 'quantity': 'много'}]
+    })
+    assert response.status_code == 400
+
+    for items in ([1, 2], {'dish_id': seed['dishes'][0].id}):
+        response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id),
+                               json={'table_id': seed['tables'][0].id, 'items': items})
+        assert response.status_code == 400
+
+    order_id = make_open_order(seed)
+    response = client.post(f'/api/orders/{order_id}/items', headers=auth_headers(seed['waiter'].id),
+                           json={'items': ['борщ']})
+    assert response.status_code == 400
+
+
+def make_open_order(seed, total='100.00'):
+    order = Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id, total_amount=total)
+    db.session.add(order)
+    db.session.commit()
+    return order.id
+
+
+def test_add_items_to_order(client, seed):
+    borsch, solyanka = seed['dishes']
+    order_id = make_open_order(seed)
+
+    with count_queries() as statements:
+        response = client.post(f'/api/orders/{order_id}/items', headers=auth_headers(seed['waiter'].id),
+                               json={'items': [{'dish_id': borsch.id, 'quantity': 2},
+                                               {'dish_id': solyanka.id}]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['added_count'] == 2
+    assert body['added_amount'] == 1121.1
+    assert body['total_amount'] == 1221.1
+
+    # Сумма меняется выражением в SQL, а не перезаписью прочитанного значения
+    updates = [s for s, _ in statements if s.startswith('UPDATE restaurant_order')]
+    assert len(updates) == 1
+    assert 'total_amount' in updates[0].split('SET', 1)[1].split('=', 1)[1]
+
+
+def test_add_items_to_order_is_all_or_nothing(client, seed):
+    order_id = make_open_order(seed)
+
+    response = client.post(f'/api/orders/{order_id}/items', headers=auth_headers(seed['waiter'].id),
+                           json={'items': [{'dish_id': seed['dishes'][0].id}, {'dish_id': 999}]})
+    assert response.status_code == 404
+    assert response.get_json()['dish_ids'] == [999]
+    assert Sale.query.filter_by(order_id=order_id).count() == 0
+
+
+def test_add_items_to_closed_order(client, seed):
+    order_id = make_open_order(seed)
+    db.session.get(Order, order_id).is_active = False
+    db.session.commit()
+
+    response = client.post(f'/api/orders/{order_id}/items', headers=auth_headers(seed['waiter'].id),
+                           json={'items': [{'dish_id': seed['dishes'][0].id}]})
+    assert response.status_code == 400
+
+
+def test_add_items_when_order_closes_mid_request(client, seed, monkeypatch):
+    import routes.orders
+    headers = auth_headers(seed['waiter'].id)
+    dish_id = seed['dishes'][0].id
+
+    # Заказ закрывают после проверки is_active в маршруте, но до изменения суммы
+    increment_order_total = routes.orders.increment_order_total
+
+    def close_then_increment(order_id, delta):
+        assert client.post(f'/api/orders/{order_id}/close', headers=auth_headers(1)).status_code == 200
+        return increment_order_total(order_id, delta)
+    monkeypatch.setattr(routes.orders, 'increment_order_total', close_then_increment)
+
+    for url, body in (('items', {'items': [{'dish_id': dish_id}]}), ('add-item', {'dish_id': dish_id})):
+        order_id = make_open_order(seed)
+        response = client.post(f'/api/orders/{order_id}/{url}', headers=headers, json=body)
+        assert response.status_code == 400
+
+        # Продажа не повисла на закрытом заказе мимо свода
+        assert Sale.query.filter_by(order_id=order_id).count() == 0
+        db.session.expire_all()
+        assert str(db.session.get(Order, order_id).total_amount) == '100.00'
+
+
+def test_add_item_to_order_increments_total(client, seed):
+    order_id = make_open_order(seed)
+
+    response = client.post(f'/api/orders/{order_id}/add-item', headers=auth_headers(seed['waiter'].id),
+                           json={'dish_id': seed['dishes'][0].id, 'quantity': 2})
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert str(db.session.get(Order, order_id).total_amount) == '801.00'
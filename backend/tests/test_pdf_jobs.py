@@ -0,0 +1,99 @@
+from datetime import date
+import os
+import time
+
+from conftest import auth_headers
+from pdf_jobs import pdf_job_queue
+from pdf_render import BUNDLED_FONT, load_theme, register_russian_fonts, render_receipt, theme
+
+
+def create_order(client, seed):
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id, 'Официант'),
+                           json={'table_id': seed['tables'][0].id,
+                                 'items': [{'dish_id': seed['dishes'][0].id, 'quantity': 2}]})
+    return response.get_json()['order_id']
+
+
+def test_receipt_job_renders_in_background(client, seed):
+    order_id = create_order(client, seed)
+    waiter = auth_headers(seed['waiter'].id, 'Официант')
+
+    response = client.post('/api/pdf-jobs/', headers=waiter, json={'kind': 'receipt', 'order_id': order_id})
+    assert response.status_code == 202
+    job = response.get_json()
+    assert response.headers['Location'] == job['status_url']
+
+    response = client.get(job['status_url'], headers=waiter, query_string={'wait': 30})
+    assert response.status_code == 200
+    job = response.get_json()
+    assert job['status'] == 'done', job
+
+    response = client.get(job['download_url'], headers=waiter)
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+    # Чужая задача недоступна другому официанту
+    assert client.get(job['status_url'], headers=auth_headers(999, 'Официант')).status_code == 403
+    assert client.get('/api/pdf-jobs/unknown', headers=waiter).status_code == 404
+
+
+def test_sales_report_job_validates_period(client, seed):
+    response = client.post('/api/pdf-jobs/', headers=auth_headers(1),
+                           json={'kind': 'sales_report', 'start_date': 'вчера', 'end_date': 'сегодня'})
+    assert response.status_code == 400
+
+    today = date.today().isoformat()
+    response = client.post('/api/pdf-jobs/', headers=auth_headers(1),
+                           json={'kind': 'sales_report', 'start_date': today, 'end_date': today})
+    assert response.status_code == 202
+
+
+def test_full_queue_returns_503(client, seed):
+    max_pending = pdf_job_queue.max_pending
+    pdf_job_queue.max_pending = 0
+    try:
+        response = client.get('/api/reports/sales/pdf', headers=auth_headers(1),
+                              query_string={'start_date': date.today().isoformat(),
+                                            'end_date': date.today().isoformat()})
+    finally:
+        pdf_job_queue.max_pending = max_pending
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_receipt_pdf_is_rendered_on_pool(client, seed):
+    order_id = create_order(client, seed)
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+
+def test_fonts_fall_back_to_bundled_dejavu():
+    assert register_russian_fonts(['/nonexistent/arial.ttf']) == BUNDLED_FONT
+    styles = load_theme(['/nonexistent/arial.ttf'])
+    assert styles is theme()
+    assert render_receipt({'order_id': 1, 'table_number': None, 'employee_name': 'Иван',
+                           'order_datetime': '2026-10-18T12:00:00', 'total_amount': 0.0,
+                           'items': []}).startswith(b'%PDF')
+
+
+def test_pool_recovers_after_worker_dies(client, seed):
+    order_id = create_order(client, seed)
+    waiter = auth_headers(seed['waiter'].id, 'Официант')
+
+    # Процесс пула умирает (как при OOM); задача за ним в очереди тоже теряется.
+    # sleep держит процесс занятым, пока задача не встанет в очередь
+    pdf_job_queue._submit(time.sleep, 1)
+    crash = pdf_job_queue._submit(os._exit, 1)
+    job = client.post('/api/pdf-jobs/', headers=waiter,
+                      json={'kind': 'receipt', 'order_id': order_id}).get_json()
+    crash.exception(timeout=30)
+
+    job = client.get(job['status_url'], headers=waiter, query_string={'wait': 30}).get_json()
+    assert job['status'] == 'failed'
+
+    # Следующий рендер идет уже в новом пуле
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+    assert pdf_job_queue.pending() == 0
@@ -0,0 +1,192 @@
+from datetime import date
+import io
+import os
+import zipfile
+
+from conftest import auth_headers
+from pdf_jobs import pdf_job_queue, QueueFull
+from database import db
+from receipt_cache import ReceiptCache, receipt_cache
+
+
+def closed_order(client, seed):
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id, 'Официант'),
+                           json={'table_id': seed['tables'][0].id,
+                                 'items': [{'dish_id': seed['dishes'][1].id, 'quantity': 3}]})
+    order_id = response.get_json()['order_id']
+    assert client.post(f'/api/orders/{order_id}/close', headers=auth_headers(1)).status_code == 200
+    return order_id
+
+
+def test_closed_order_receipt_is_rendered_once(client, seed, monkeypatch):
+    order_id = closed_order(client, seed)
+
+    first = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert first.status_code == 200
+    assert first.data.startswith(b'%PDF')
+    etag = first.headers['ETag']
+
+    def render_to_file(*args, **kwargs):
+        raise AssertionError('чек закрытого заказа должен браться с диска')
+    monkeypatch.setattr(pdf_job_queue, 'render_to_file', render_to_file)
+
+    second = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert second.status_code == 200
+    assert second.data == first.data
+
+    response = client.get(f'/api/receipts/{order_id}',
+                          headers={**auth_headers(1), 'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_changed_receipt_data_replaces_cached_file(app, client, seed):
+    order_id = closed_order(client, seed)
+    etag = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1)).headers['ETag']
+
+    seed['waiter'].full_name = 'Иван Сидоров'
+    db.session.commit()
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+    versions = [name for name in os.listdir(receipt_cache.folder) if name.startswith(f'{order_id}-')]
+    assert len(versions) == 1
+
+
+def test_receipt_cache_evicts_oldest_over_size(tmp_path):
+    cache = ReceiptCache()
+    cache.configure(str(tmp_path), max_bytes=25, max_age=3600)
+
+    for order_id, mtime in ((1, 100), (2, 300), (3, 200)):
+        path = cache.path(order_id, 'abc')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        os.utime(path, (mtime, mtime))
+    # Возраст здесь не важен - только размер
+    cache.max_age = 10 ** 12
+
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ['2-abc.pdf', '3-abc.pdf']
+
+    cache.max_age = 1
+    cache.evict()
+    assert os.listdir(tmp_path) == []
+
+
+def test_thermal_receipt_formats(client, seed):
+    order_id = closed_order(client, seed)
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1),
+                          query_string={'format': 'text'})
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'Солянка' in text
+    assert '  3 x 420.10' in text
+    assert max(len(line) for line in text.splitlines()) <= 48
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1),
+                          query_string={'format': 'escpos'})
+    assert response.status_code == 200
+    assert response.data.startswith(b'\x1b@')
+    assert 'Солянка'.encode('cp866') in response.data
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1),
+                          query_string={'format': 'docx'})
+    assert response.status_code == 400
+
+
+def test_batch_receipts_stream_zip(client, seed, monkeypatch):
+    closed = closed_order(client, seed)
+    cached = client.get(f'/api/receipts/{closed}', headers=auth_headers(1)).data
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id, 'Официант'),
+                           json={'table_id': seed['tables'][1].id,
+                                 'items': [{'dish_id': seed['dishes'][0].id, 'quantity': 1}]})
+    open_order = response.get_json()['order_id']
+
+    started = []
+    start = pdf_job_queue.start
+    monkeypatch.setattr(pdf_job_queue, 'start', lambda *args: started.append(args) or start(*args))
+
+    response = client.get('/api/receipts/batch', headers=auth_headers(1),
+                          query_string={'date': date.today().isoformat()})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == [f'чек_{closed}.pdf', f'чек_{open_order}.pdf']
+    assert archive.read(f'чек_{closed}.pdf') == cached
+    assert archive.read(f'чек_{open_order}.pdf').startswith(b'%PDF')
+    # Закрытый заказ взят из кэша, рендерился только открытый
+    assert len(started) == 1
+
+    # Официант получает только свои заказы
+    response = client.get('/api/receipts/batch', headers=auth_headers(999, 'Официант'),
+                          query_string={'order_ids': f'{closed},{open_order}'})
+    assert response.status_code == 404
+
+    assert client.get('/api/receipts/batch', headers=auth_headers(1)).status_code == 400
+
+
+def test_receipt_survives_concurrent_eviction(client, seed, monkeypatch):
+    order_id = closed_order(client, seed)
+    expected = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1)).data
+
+    # Другой запрос вытесняет файл сразу после того, как этот его открыл
+    open_cached = receipt_cache.open
+
+    def open_then_evict(order_id, digest):
+        cached = open_cached(order_id, digest)
+        if cached is not None:
+            os.remove(receipt_cache.path(order_id, digest))
+        return cached
+    monkeypatch.setattr(receipt_cache, 'open', open_then_evict)
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.data == expected
+
+    # Файл вытеснен между рендером и открытием - чек рендерится в память
+    monkeypatch.setattr(receipt_cache, 'open', open_cached)
+    render_to_file = pdf_job_queue.render_to_file
+
+    def render_then_evict(kind, data, path, timeout):
+        render_to_file(kind, data, path, timeout)
+        os.remove(path)
+    monkeypatch.setattr(pdf_job_queue, 'render_to_file', render_then_evict)
+
+    response = client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
+
+
+def test_batch_receipts_page_orders_and_check_capacity(app, client, seed, monkeypatch):
+    import routes.receipts
+    order_ids = [closed_order(client, seed) for _ in range(3)]
+    # Чеки уже в кэше: ниже таймаут рендера нулевой
+    for order_id in order_ids:
+        client.get(f'/api/receipts/{order_id}', headers=auth_headers(1))
+    monkeypatch.setattr(routes.receipts, 'BATCH_PAGE_ORDERS', 2)
+
+    # Пул занят до начала ответа - 503, а не оборванный архив
+    monkeypatch.setattr(pdf_job_queue, 'max_pending', 0)
+    response = client.get('/api/receipts/batch', headers=auth_headers(1),
+                          query_string={'date': date.today().isoformat()})
+    assert response.status_code == 503
+
+    # Очередь заполнилась уже во время отдачи: архив цел, вместо чека - ошибка
+    monkeypatch.setattr(pdf_job_queue, 'max_pending', 20)
+    start_receipt = routes.receipts.start_receipt
+
+    def busy_for_second(order_id, is_active, data):
+        if order_id == order_ids[1]:
+            raise QueueFull()
+        return start_receipt(order_id, is_active, data)
+    monkeypatch.setattr(routes.receipts, 'start_receipt', busy_for_second)
+    app.config['PDF_RENDER_TIMEOUT_SECONDS'] = 0
+
+    response = client.get('/api/receipts/batch', headers=auth_headers(1),
+                          query_string={'date': date.today().isoformat()})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == [f'чек_{order_ids[0]}.pdf', f'чек_{order_ids[1]}.pdf.error.txt',
+                                  f'чек_{order_ids[2]}.pdf']
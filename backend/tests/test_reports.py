@@ -0,0 +1,159 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import csv
+import io
+import json
+
+from conftest import auth_headers, count_queries
+from database import db
+from models import DailyDishSales, Order, Sale
+import routes.reports
+
+
+def make_order(seed, order_datetime, quantities):
+    order = Order(table_id=seed['tables'][0].id, employee_id=seed['waiter'].id,
+                  order_datetime=order_datetime)
+    db.session.add(order)
+    db.session.flush()
+    for dish, quantity in zip(seed['dishes'], quantities):
+        db.session.add(Sale(order_id=order.id, dish_id=dish.id, quantity=quantity,
+                            unit_price=dish.price, line_total=Decimal(dish.price) * quantity))
+    db.session.commit()
+    return order.id
+
+
+def sales_report(client, start_date, end_date):
+    response = client.get('/api/reports/sales', headers=auth_headers(1),
+                          query_string={'start_date': start_date.isoformat(),
+                                        'end_date': end_date.isoformat()})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_close_order_updates_rollup_once(client, seed):
+    yesterday = date.today() - timedelta(days=1)
+    first = make_order(seed, datetime.combine(yesterday, time(13)), [2, 1])
+    second = make_order(seed, datetime.combine(yesterday, time(19)), [1, 0])
+
+    for order_id in (first, second, first):
+        assert client.post(f'/api/orders/{order_id}/close', headers=auth_headers(1)).status_code == 200
+
+    rows = {row.dish_id: (row.quantity, float(row.revenue))
+            for row in DailyDishSales.query.filter_by(date=yesterday)}
+    borscht, solyanka = seed['dishes']
+    assert rows == {borscht.id: (3, 1051.5), solyanka.id: (1, 420.1)}
+
+
+def test_report_combines_rollup_and_today(client, seed):
+    yesterday = date.today() - timedelta(days=1)
+    closed = make_order(seed, datetime.combine(yesterday, time(13)), [2, 1])
+    client.post(f'/api/orders/{closed}/close', headers=auth_headers(1))
+    # Сегодняшний открытый заказ берется из живых таблиц
+    make_order(seed, datetime.now(), [1, 0])
+
+    report = sales_report(client, yesterday, date.today())
+    assert [(row['dish_name'], row['quantity_sold'], row['total_revenue'])
+            for row in report['report']] == [('Борщ', 3, 1051.5), ('Солянка', 1, 420.1)]
+    assert report['total_period_revenue'] == 1471.6
+
+    report = sales_report(client, yesterday, yesterday)
+    assert report['total_period_revenue'] == 1121.1
+
+
+def test_rebuild_sales_rollup_command(app, client, seed):
+    day = date.today() - timedelta(days=3)
+    order_id = make_order(seed, datetime.combine(day, time(12)), [1, 2])
+    # Заказ закрыт в обход маршрута: в своде его еще нет
+    db.session.get(Order, order_id).is_active = False
+    db.session.commit()
+    assert sales_report(client, day, day)['report'] == []
+
+    result = app.test_cli_runner().invoke(args=['rebuild-sales-rollup', '--start', day.isoformat()])
+    assert result.exit_code == 0, result.output
+
+    report = sales_report(client, day, day)
+    assert report['total_period_revenue'] == 1190.7
+
+    # Повторный пересчет не удваивает суммы
+    app.test_cli_runner().invoke(args=['rebuild-sales-rollup', '--start', day.isoformat()])
+    assert sales_report(client, day, day)['total_period_revenue'] == 1190.7
+
+
+def test_report_uses_price_at_order_time(client, seed):
+    borscht = seed['dishes'][0]
+    response = client.post('/api/orders/', headers=auth_headers(seed['waiter'].id),
+                           json={'table_id': seed['tables'][0].id,
+                                 'items': [{'dish_id': borscht.id, 'quantity': 2}]})
+    order_id = response.get_json()['order_id']
+
+    client.put(f'/api/menu/dishes/{borscht.id}', json={'price': 500}, headers=auth_headers(1))
+
+    report = sales_report(client, date.today(), date.today())
+    assert report['report'][0]['total_revenue'] == 701.0
+
+    response = client.get(f'/api/orders/{order_id}', headers=auth_headers(1))
+    assert response.status_code == 200
+    assert response.get_json()['items'] == [{'dish_id': borscht.id, 'dish_name': 'Борщ', 'price': 350.5,
+                                             'quantity': 2, 'subtotal': 701.0}]
+
+
+def test_export_streams_sale_lines(client, seed, monkeypatch):
+    monkeypatch.setattr(routes.reports, 'EXPORT_BATCH_ROWS', 1)
+    yesterday = date.today() - timedelta(days=1)
+    first = make_order(seed, datetime.combine(yesterday, time(13)), [2, 1])
+    make_order(seed, datetime.combine(yesterday - timedelta(days=5), time(13)), [1, 1])
+    period = {'start_date': yesterday.isoformat(), 'end_date': date.today().isoformat()}
+
+    response = client.get('/api/reports/export', headers=auth_headers(1),
+                          query_string={**period, 'format': 'csv'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('\ufeff'))))
+    assert rows[0][:2] == ['order_id', 'order_datetime']
+    assert [(row[0], row[6], row[7], row[9]) for row in rows[1:]] == [
+        (str(first), 'Борщ', '2', '701.0'), (str(first), 'Солянка', '1', '420.1')]
+
+    response = client.get('/api/reports/export', headers=auth_headers(1),
+                          query_string={**period, 'format': 'ndjson'})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line['dish_name'], line['line_total']) for line in lines] == [('Борщ', 701.0), ('Солянка', 420.1)]
+
+    response = client.get('/api/reports/export', headers=auth_headers(1),
+                          query_string={**period, 'format': 'xlsx'})
+    assert response.status_code == 400
+
+
+def test_report_keeps_never_closed_past_orders(client, seed):
+    yesterday = date.today() - timedelta(days=1)
+    closed = make_order(seed, datetime.combine(yesterday, time(13)), [1, 0])
+    client.post(f'/api/orders/{closed}/close', headers=auth_headers(1))
+    # Заказ прошлого дня, который забыли закрыть, в отчете остается
+    forgotten = make_order(seed, datetime.combine(yesterday, time(20)), [1, 1])
+
+    assert sales_report(client, yesterday, yesterday)['total_period_revenue'] == 1121.1
+
+    # После закрытия заказ переходит в свод и не считается дважды
+    client.post(f'/api/orders/{forgotten}/close', headers=auth_headers(1))
+    assert sales_report(client, yesterday, yesterday)['total_period_revenue'] == 1121.1
+
+
+def test_export_reads_in_bounded_keyset_pages(client, seed, monkeypatch):
+    monkeypatch.setattr(routes.reports, 'EXPORT_BATCH_ROWS', 2)
+    yesterday = date.today() - timedelta(days=1)
+    # Два заказа в одну секунду: страница обрывается внутри одинакового order_datetime
+    same_time = datetime.combine(yesterday, time(13))
+    for quantities in ([1, 1], [2, 1], [1]):
+        make_order(seed, same_time, quantities)
+
+    with count_queries() as statements:
+        response = client.get('/api/reports/export', headers=auth_headers(1),
+                              query_string={'start_date': yesterday.isoformat(),
+                                            'end_date': yesterday.isoformat(), 'format': 'ndjson'})
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [line['sale_id'] for line in lines] == sorted(line['sale_id'] for line in lines)
+    assert len(lines) == 5
+    # 5 строк по 2 на страницу: три запроса с LIMIT, а не один на весь период
+    pages = [statement for statement, parameters in statements if 'FROM sale' in statement]
+    assert len(pages) == 3
+    assert all('LIMIT' in statement for statement in pages)
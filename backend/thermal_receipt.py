@@ -0,0 +1,76 @@
+# thermal_receipt.py
+# Чек для 80-мм термопринтеров: моноширинный текст или поток команд ESC/POS.
+# Принимает те же данные, что и render_receipt из pdf_render (см. receipt_data).
+from datetime import datetime
+
+# 80 мм, шрифт A - 48 символов в строке
+WIDTH = 48
+RULE = '-' * WIDTH
+DOUBLE_RULE = '=' * WIDTH
+
+TITLE = ('РЕСТОРАН', 'КАССОВЫЙ ЧЕК')
+FOOTER = ('Спасибо за посещение!', 'Чек действителен для налоговой отчетности')
+
+# Неизменные части шаблона собираются один раз при импорте
+TEXT_HEADER = '\n'.join(line.center(WIDTH).rstrip() for line in TITLE) + '\n' + RULE + '\n'
+TEXT_FOOTER = DOUBLE_RULE + '\n' + '\n'.join(line.center(WIDTH).rstrip() for line in FOOTER) + '\n'
+
+# Команды ESC/POS; кириллица - кодовая страница PC866 (ESC t 17)
+ENCODING = 'cp866'
+INIT = b'\x1b@' + b'\x1bt\x11'
+ALIGN_LEFT = b'\x1ba\x00'
+ALIGN_CENTER = b'\x1ba\x01'
+BOLD_ON = b'\x1bE\x01'
+BOLD_OFF = b'\x1bE\x00'
+DOUBLE_HEIGHT = b'\x1d!\x01'
+NORMAL_SIZE = b'\x1d!\x00'
+FEED_AND_CUT = b'\x1bd\x04' + b'\x1dV\x42\x00'
+
+ESCPOS_HEADER = (INIT + ALIGN_CENTER + BOLD_ON + DOUBLE_HEIGHT
+                 + '\n'.join(TITLE).encode(ENCODING) + b'\n'
+                 + NORMAL_SIZE + BOLD_OFF + ALIGN_LEFT + RULE.encode(ENCODING) + b'\n')
+ESCPOS_FOOTER = (DOUBLE_RULE.encode(ENCODING) + b'\n' + ALIGN_CENTER
+                 + '\n'.join(FOOTER).encode(ENCODING) + b'\n' + FEED_AND_CUT)
+
+
+def columns(left, right):
+    """Строка с текстом слева и суммой, прижатой к правому краю"""
+    return left + right.rjust(WIDTH - len(left))
+
+
+def body_lines(data):
+    """Реквизиты и позиции чека - общая часть текстового и ESC/POS вариантов"""
+    order_datetime = datetime.fromisoformat(data['order_datetime'])
+    lines = [
+        f"Чек №: {data['order_id']}",
+        f"Стол: {data['table_number'] or 'N/A'}",
+        f"Официант: {(data['employee_name'] or 'N/A')[:WIDTH - 10]}",
+        f"Дата: {order_datetime:%d.%m.%Y %H:%M}",
+        RULE
+    ]
+    if data['items']:
+        for item in data['items']:
+            lines.append(item['name'][:WIDTH])
+            lines.append(columns(f"  {item['quantity']} x {item['price']:.2f}", f"{item['subtotal']:.2f}"))
+    else:
+        lines.append('Заказ пуст')
+    lines.append(RULE)
+    return lines
+
+
+def total_line(data):
+    return columns('ИТОГО:', f"{data['total_amount']:.2f} руб.")
+
+
+def render_text(data):
+    """Чек моноширинным текстом (UTF-8)"""
+    return TEXT_HEADER + '\n'.join(body_lines(data)) + '\n' + total_line(data) + '\n' + TEXT_FOOTER
+
+
+def render_escpos(data):
+    """Чек потоком ESC/POS для отправки на принтер как есть"""
+    body = '\n'.join(body_lines(data)) + '\n'
+    return (ESCPOS_HEADER
+            + body.encode(ENCODING, errors='replace')
+            + BOLD_ON + total_line(data).encode(ENCODING) + b'\n' + BOLD_OFF
+            + ESCPOS_FOOTER)
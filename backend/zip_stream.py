@@ -0,0 +1,63 @@
+import io
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Поток только на запись: zipfile пишет сюда, генератор забирает накопленное.
+
+    tell/seek не поддерживаются, поэтому zipfile пишет записи с дескриптором
+    данных после содержимого и не возвращается назад - архив можно отдавать
+    по частям, не держа его в памяти.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def file_chunks(f):
+    """Содержимое открытого файла частями по CHUNK_SIZE; файл закрывается в конце"""
+    with f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def stream_zip(entries):
+    """ZIP-архив частями по мере готовности записей.
+
+    entries - итератор (имя файла, итератор байтовых частей). В памяти
+    находится только текущая часть, сколько бы записей ни было.
+    Содержимое не сжимается: PDF уже сжат.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, chunks in entries:
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield from _pending(buffer)
+            yield from _pending(buffer)
+    # Центральный каталог пишется при закрытии архива
+    yield from _pending(buffer)
+
+
+def _pending(buffer):
+    data = buffer.take()
+    if data:
+        yield data
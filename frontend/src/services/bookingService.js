@@ -25,8 +25,17 @@ export const bookingService = {
     // Получить все бронирования
     getAllBookings: async () => {
         try {
-            const response = await api.get('/bookings/');
-            return response.data;
+            // Список отдается постранично: проходим по курсорам до конца
+            const bookings = [];
+            let cursor = null;
+            do {
+                const params = { limit: 200 };
+                if (cursor) params.cursor = cursor;
+                const response = await api.get('/bookings/', { params });
+                bookings.push(...response.data.bookings);
+                cursor = response.data.next_cursor;
+            } while (cursor);
+            return bookings;
         } catch (error) {
             throw error.response?.data || error;
         }
@@ -17,22 +17,40 @@ export const reportService = {
         }
     },
 
-    // Получить PDF отчет по продажам
+    // Получить PDF отчет по продажам (фоновая задача: постановка, ожидание, скачивание)
     getSalesReportPDF: async (startDate, endDate) => {
         try {
-            const response = await api.get(
-                `/reports/sales/pdf?start_date=${startDate}&end_date=${endDate}`,
-                {
-                    responseType: 'blob',
-                    timeout: 30000 // 30 секунд таймаут
+            const created = await api.post('/pdf-jobs/', {
+                kind: 'sales_report',
+                start_date: startDate,
+                end_date: endDate
+            });
+            let job = created.data;
+
+            // Сервер держит запрос до готовности (до 25 секунд), поэтому опросов немного
+            for (let attempt = 0; job.status === 'queued' || job.status === 'running'; attempt++) {
+                if (attempt >= 10) {
+                    throw { error: 'PDF формируется слишком долго, попробуйте позже' };
                 }
-            );
+                const status = await api.get(`/pdf-jobs/${job.id}?wait=25`, { timeout: 30000 });
+                job = status.data;
+            }
+            if (job.status !== 'done') {
+                throw { error: job.error || 'Ошибка генерации PDF' };
+            }
+
+            const response = await api.get(`/pdf-jobs/${job.id}/file`, {
+                responseType: 'blob',
+                timeout: 30000 // 30 секунд таймаут
+            });
             return response.data;
         } catch (error) {
             if (error.response) {
                 throw error.response.data;
             } else if (error.request) {
                 throw { error: 'Нет ответа от сервера при загрузке PDF' };
+            } else if (error.error) {
+                throw error;
             } else {
                 throw { error: error.message };
             }